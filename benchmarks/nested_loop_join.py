@@ -0,0 +1,191 @@
+"""
+Allocation benchmark for filters and fields on a nested-loop join.
+
+When SQLite joins two virtual tables it runs a nested loop, calling ``Filter`` on
+the inner table once for every row of the outer table. Each call builds new filters
+(and their endpoints), and every value that crosses the backend is converted by a
+field. This script runs such a join and reports how many of these objects were
+created, and how much memory they take compared to dict-backed objects.
+
+Run with::
+
+    python benchmarks/nested_loop_join.py [NUMBER_OF_ROWS]
+
+"""
+
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Optional
+
+from shillelagh.adapters.base import Adapter
+from shillelagh.adapters.registry import registry
+from shillelagh.backends.apsw.db import connect
+from shillelagh.fields import Field, Integer, Order, String
+from shillelagh.filters import Endpoint, Equal, Filter, Operator, Range, Side
+from shillelagh.lib import filter_data
+from shillelagh.typing import RequestedOrder, Row
+
+NUMBER_OF_ROWS = 2000
+
+
+class MemoryTable(Adapter):
+    """
+    A simple in-memory table with filterable columns.
+    """
+
+    safe = True
+
+    number_of_rows = NUMBER_OF_ROWS
+
+    id = Integer(filters=[Equal, Range], order=Order.ANY, exact=True)
+    parent_id = Integer(filters=[Equal, Range], order=Order.ANY, exact=True)
+    name = String(filters=[Equal], order=Order.ANY, exact=True)
+
+    @staticmethod
+    def supports(uri: str, fast: bool = True, **kwargs: Any) -> Optional[bool]:
+        return uri in {"parents", "children"}
+
+    @staticmethod
+    def parse_uri(uri: str) -> tuple[str]:
+        return (uri,)
+
+    def __init__(self, table: str):
+        super().__init__()
+        self.data = [
+            {"rowid": i, "id": i, "parent_id": i // 2, "name": f"{table}_{i}"}
+            for i in range(self.number_of_rows)
+        ]
+
+    def get_cost(
+        self,
+        filtered_columns: list[tuple[str, Operator]],
+        order: list[tuple[str, RequestedOrder]],
+    ) -> float:
+        # make sure SQLite pushes the join condition down to the inner table
+        return self.number_of_rows / (len(filtered_columns) + 1)
+
+    def get_data(
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+        **kwargs: Any,
+    ) -> Iterator[Row]:
+        yield from filter_data(iter(self.data), bounds, order)
+
+
+@contextmanager
+def count_instances(classes: list[type]) -> Iterator[Counter]:
+    """
+    Count how many instances of each class are created.
+    """
+    counter: Counter = Counter()
+    originals = {class_: class_.__init__ for class_ in classes}
+
+    def counting(class_: type, init: Callable[..., None]) -> Callable[..., None]:
+        @wraps(init)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> None:
+            counter[type(self) if class_ is Field else class_] += 1
+            init(self, *args, **kwargs)
+
+        return wrapper
+
+    for class_, init in originals.items():
+        class_.__init__ = counting(class_, init)  # type: ignore
+    try:
+        yield counter
+    finally:
+        for class_, init in originals.items():
+            class_.__init__ = init  # type: ignore
+
+
+def instance_size(instance: Any) -> int:
+    """
+    Size of an instance, including its ``__dict__`` (if any).
+    """
+    size = sys.getsizeof(instance)
+    if hasattr(instance, "__dict__"):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+class DictBacked:  # pylint: disable=too-few-public-methods
+    """
+    A plain object, with its attributes stored in a ``__dict__``.
+    """
+
+
+def dict_backed_size(instance: Any) -> int:
+    """
+    Size the instance would have if its attributes were stored in a ``__dict__``.
+
+    This is how filters and fields were represented before using ``__slots__``.
+    """
+    copy = DictBacked()
+    for class_ in type(instance).__mro__:
+        for name in getattr(class_, "__slots__", ()):
+            if hasattr(instance, name):
+                setattr(copy, name, getattr(instance, name))
+    return instance_size(copy)
+
+
+def main() -> None:  # pylint: disable=too-many-locals
+    """
+    Run the join and report allocations.
+    """
+    registry.add("memorytable", MemoryTable)
+    connection = connect(":memory:", ["memorytable"])
+    cursor = connection.cursor()
+
+    sql = """
+        SELECT p.name, c.name
+        FROM parents AS p
+        JOIN children AS c ON c.parent_id = p.id
+    """
+    # create the virtual tables before measuring
+    cursor.execute("SELECT 1 FROM parents, children LIMIT 1").fetchall()
+
+    shared_calls = 0
+    original_shared = Field.shared.__func__  # type: ignore
+
+    def counting_shared(cls: type[Field], *args: Any, **kwargs: Any) -> Field:
+        nonlocal shared_calls
+        shared_calls += 1
+        return original_shared(cls, *args, **kwargs)
+
+    Field.shared = classmethod(counting_shared)  # type: ignore
+    with count_instances([Equal, Range, Endpoint, Field]) as counter:
+        start = time.perf_counter()
+        rows = cursor.execute(sql).fetchall()
+        elapsed = time.perf_counter() - start
+    Field.shared = classmethod(original_shared)  # type: ignore
+
+    print(f"Joined {len(rows)} rows in {elapsed:.2f} seconds\n")
+
+    samples: dict[type, Any] = {
+        Equal: Equal(1),
+        Range: Range(1, 2, True, False),
+        Endpoint: Endpoint(1, True, Side.LEFT),
+    }
+    print(f"{'class':<20}{'instances':>12}{'slots (B)':>12}{'dict (B)':>12}")
+    saved = 0
+    for class_, count in counter.most_common():
+        sample = samples.get(class_) or class_()
+        slots_size = instance_size(sample)
+        dict_size = dict_backed_size(sample)
+        saved += count * (dict_size - slots_size)
+        print(f"{class_.__name__:<20}{count:>12}{slots_size:>12}{dict_size:>12}")
+
+    print(f"\nBytes saved by ``__slots__``: {saved}")
+    print(f"Field allocations avoided by ``Field.shared``: {shared_calls}")
+    cells = sum(len(row) for row in rows)
+    print(f"Field allocations avoided by the cursor (one per cell before): {cells}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        MemoryTable.number_of_rows = int(sys.argv[1])
+    main()
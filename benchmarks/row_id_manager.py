@@ -0,0 +1,96 @@
+"""
+Benchmark for ``RowIDManager`` with scattered deletes.
+
+Adapters like the CSV adapter mark deleted rows in a ``RowIDManager``. This script
+deletes random rows from a large table, and compares the current implementation
+with the previous one, which stored a list of ranges and scanned it linearly on
+every operation. Since the previous implementation is quadratic it only deletes a
+tenth of the rows.
+
+Run with::
+
+    python benchmarks/row_id_manager.py [NUMBER_OF_DELETES]
+
+"""
+
+import random
+import sys
+import time
+from typing import Callable
+
+from shillelagh.lib import DELETED, RowIDManager
+
+NUMBER_OF_ROWS = 1_000_000
+NUMBER_OF_DELETES = 100_000
+
+
+class ListRowIDManager:  # pylint: disable=too-few-public-methods
+    """
+    The previous ``RowIDManager``, storing a list of ranges.
+    """
+
+    def __init__(self, ranges: list[range]):
+        self.ranges = ranges
+
+    def delete(self, row_id: int) -> None:
+        """
+        Mark a given row ID as deleted.
+        """
+        for i, range_ in enumerate(self.ranges):
+            if range_.start <= row_id < range_.stop:
+                if range_.start == range_.stop - 1:
+                    self.ranges[i] = DELETED
+                elif row_id == range_.start:
+                    self.ranges[i] = range(range_.start + 1, range_.stop)
+                    self.ranges.insert(i, DELETED)
+                elif row_id == range_.stop - 1:
+                    self.ranges[i] = range(range_.start, range_.stop - 1)
+                    self.ranges.insert(i + 1, DELETED)
+                else:
+                    self.ranges[i] = range(range_.start, row_id)
+                    self.ranges.insert(i + 1, range(row_id + 1, range_.stop))
+                    self.ranges.insert(i + 1, DELETED)
+                return
+
+
+def run(delete: Callable[[int], object], row_ids: list[int]) -> float:
+    """
+    Delete rows, returning the elapsed time.
+    """
+    start = time.perf_counter()
+    for row_id in row_ids:
+        delete(row_id)
+    return time.perf_counter() - start
+
+
+def main(number_of_deletes: int) -> None:
+    """
+    Delete random rows with both implementations and report the timings.
+    """
+    row_ids = random.Random(42).sample(range(NUMBER_OF_ROWS), number_of_deletes)
+    print(f"Deleting rows from a table with {NUMBER_OF_ROWS} rows\n")
+    print(f"{'implementation':<20}{'deletes':>12}{'total (s)':>12}{'per op (us)':>14}")
+
+    manager = RowIDManager([range(NUMBER_OF_ROWS)])
+    elapsed = run(manager.delete, row_ids)
+    per_op = elapsed / number_of_deletes * 1e6
+    print(f"{'RowIDManager':<20}{number_of_deletes:>12}{elapsed:>12.2f}{per_op:>14.2f}")
+
+    start = time.perf_counter()
+    live = sum(1 for row_id in manager if row_id != -1)
+    print(f"\nIterated over {live} live rows in {time.perf_counter() - start:.2f}s\n")
+
+    baseline = ListRowIDManager([range(NUMBER_OF_ROWS)])
+    sample = row_ids[: max(number_of_deletes // 10, 1)]
+    elapsed = run(baseline.delete, sample)
+    per_op = elapsed / len(sample) * 1e6
+    print(f"{'list of ranges':<20}{len(sample):>12}{elapsed:>12.2f}{per_op:>14.2f}")
+
+    # both implementations should agree
+    manager = RowIDManager([range(NUMBER_OF_ROWS)])
+    run(manager.delete, sample)
+    assert manager.ranges == baseline.ranges
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_DELETES)
@@ -4,13 +4,22 @@ An adapter for fetching JSON data.
 
 # pylint: disable=invalid-name
 
+import codecs
+import itertools
+import json
 import logging
-from collections.abc import Iterator
+import math
+import re
+import urllib.parse
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
-from typing import Any, Optional, Union
+from typing import Any, Optional, Union, cast
 
 import jsonpath
 import prison
+import requests
 from yarl import URL
 
 from shillelagh.adapters.base import Adapter
@@ -25,12 +34,165 @@ _logger = logging.getLogger(__name__)
 SUPPORTED_PROTOCOLS = {"http", "https"}
 AVERAGE_NUMBER_OF_ROWS = 100
 REQUEST_HEADERS_KEY = "_s_headers"
+PAGINATION_KEY = "_s_pagination"
 CACHE_EXPIRATION = timedelta(minutes=3)
 
+# number of rows used to infer the schema
+SAMPLE_SIZE = 1000
 
-class GenericJSONAPI(Adapter):
+# size of the chunks read from streamed responses, in bytes
+CHUNK_SIZE = 64 * 1024
+
+# paths starting with this iterate over a top-level array, and can be streamed
+STREAMING_PREFIX = "$[*]"
+
+# supported pagination styles
+PAGINATION_TYPES = {"link", "cursor", "offset", "page"}
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# characters that can continue a number
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+DECODER = json.JSONDecoder()
+
+
+class JSONArrayReader:  # pylint: disable=too-few-public-methods
+    """
+    An incremental parser for the elements of a top-level JSON array.
+
+    The document is read in chunks, and only the element being parsed (and the
+    current chunk) is kept in memory, so arrays larger than the available memory can
+    be iterated over:
+
+        >>> list(JSONArrayReader([b'[{"a": 1}, ', b'{"a": 2}]']))
+        [{'a': 1}, {'a': 2}]
+
+    Like ``$[*]``, if the document is an object its values are returned instead;
+    other values return nothing.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read(self, size: int) -> None:
+        """
+        Read at least ``size`` more characters, discarding the ones consumed.
+        """
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+        target = len(self.buffer) + size
+        while len(self.buffer) < target and not self.eof:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                self.buffer += self.decoder.decode(b"", final=True)
+            else:
+                self.buffer += self.decoder.decode(chunk)
+
+    def _peek(self) -> str:
+        """
+        Skip whitespace and return the next character, or an empty string at the end.
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()  # type: ignore
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position : self.position + 1]
+            self._read(1)
+
+    def _decode(self) -> Any:
+        """
+        Decode the next value, reading more data until it's complete.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # a number at the end of the buffer might continue in the next chunk,
+                # eg, ``2.`` followed by ``5e3``
+                if (
+                    self.eof
+                    or not isinstance(value, (int, float))
+                    or NUMBER_TAIL.match(self.buffer, end).end() < len(self.buffer)  # type: ignore
+                ):
+                    self.position = end
+                    return value
+
+            # double the data available, so that large values are not parsed many
+            # times
+            self._read(max(len(self.buffer) - self.position, 1))
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._peek() != "[":
+            document = self._decode()
+            if isinstance(document, dict):
+                yield from document.values()
+            return
+
+        self.position += 1
+        if self._peek() == "]":
+            return
+
+        while True:
+            yield self._decode()
+            delimiter = self._peek()
+            self.position += 1
+            if delimiter == "]":
+                return
+            if delimiter != ",":
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter",
+                    self.buffer,
+                    self.position - 1,
+                )
+
+
+def validate_pagination(pagination: Any) -> None:
+    """
+    Check that a pagination configuration is valid.
+    """
+    if (
+        not isinstance(pagination, dict)
+        or pagination.get("type") not in PAGINATION_TYPES
+    ):
+        raise ProgrammingError(f"Invalid pagination: {pagination!r}")
+    if pagination["type"] == "cursor" and "path" not in pagination:
+        raise ProgrammingError("Cursor pagination requires a path")
+
+
+class GenericJSONAPI(Adapter):  # pylint: disable=too-many-instance-attributes
     """
     An adapter for fetching JSON data.
+
+    Responses can be paginated by passing a ``pagination`` dictionary, either as an
+    adapter argument or RISON-encoded in the ``_s_pagination`` query parameter. The
+    ``type`` key is one of:
+
+    - ``link``: follow the ``Link: <...>; rel="next"`` response header.
+    - ``cursor``: read the next cursor from the JSONPath in ``path``, and pass it in
+      the query parameter ``param``; without ``param`` the cursor is the next URL.
+    - ``offset``: pass the offset of the first row in the query parameter ``param``
+      (default ``offset``).
+    - ``page``: pass the page number, starting at ``start`` (default 1), in the query
+      parameter ``param`` (default ``page``).
+
+    For offset and page pagination ``size`` and ``size_param`` set the page size; if
+    not set the size of the first page is used, and pages are read until a shorter
+    page is returned. If the response has the total number of pages (or rows, for
+    offset pagination) it can be read from the JSONPath in ``total_path``, and
+    ``prefetch`` pages are then downloaded concurrently.
+
+    Pages are only requested as rows are consumed.
+
+    The HTTP cache can be configured with ``cache_options``, a dictionary with the
+    ``backend`` (``sqlite``, ``memory`` or ``filesystem``), its ``max_size`` in bytes,
+    and ``stale_while_revalidate`` in seconds.
     """
 
     safe = True
@@ -38,6 +200,7 @@ class GenericJSONAPI(Adapter):
     supports_limit = False
     supports_offset = False
     supports_requested_columns = True
+    supports_pagination = True
 
     content_type = "application/json"
     default_path = "$[*]"
@@ -51,13 +214,18 @@ class GenericJSONAPI(Adapter):
         if fast:
             return Maybe
 
-        if REQUEST_HEADERS_KEY in parsed.query:
-            request_headers = prison.loads(parsed.query[REQUEST_HEADERS_KEY])
-            parsed = parsed.with_query(
-                {k: v for k, v in parsed.query.items() if k != REQUEST_HEADERS_KEY},
-            )
+        query = dict(parsed.query)
+        if REQUEST_HEADERS_KEY in query:
+            request_headers = prison.loads(query[REQUEST_HEADERS_KEY])
         else:
             request_headers = kwargs.get("request_headers", {})
+        parsed = parsed.with_query(
+            {
+                k: v
+                for k, v in parsed.query.items()
+                if k not in {REQUEST_HEADERS_KEY, PAGINATION_KEY}
+            },
+        )
 
         cache_expiration = kwargs.get(
             "cache_expiration",
@@ -67,6 +235,7 @@ class GenericJSONAPI(Adapter):
             request_headers,
             cls.cache_name,
             timedelta(seconds=cache_expiration),
+            **kwargs.get("cache_options", {}),
         )
         response = session.head(str(parsed))
         return cls.content_type in response.headers.get("content-type", "")
@@ -90,72 +259,320 @@ class GenericJSONAPI(Adapter):
 
         return str(parsed), path
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
         uri: str,
         path: Optional[str] = None,
         request_headers: Optional[dict[str, str]] = None,
         cache_expiration: float = CACHE_EXPIRATION.total_seconds(),
+        pagination: Optional[dict[str, Any]] = None,
+        cache_options: Optional[dict[str, Any]] = None,
     ):
+        parsed = URL(uri)
+        query = dict(parsed.query)
+        if PAGINATION_KEY in query:
+            pagination = prison.loads(query[PAGINATION_KEY])
+            uri = str(
+                parsed.with_query(
+                    {k: v for k, v in parsed.query.items() if k != PAGINATION_KEY},
+                ),
+            )
+        if pagination is not None:
+            if not self.supports_pagination:
+                raise ProgrammingError(
+                    f"Pagination is not supported by {self.__class__.__name__}",
+                )
+            validate_pagination(pagination)
+
         super().__init__()
 
         self.uri = uri
         self.path = path or self.default_path
+        self.pagination = pagination
+
+        # JSONPath expressions are compiled only once
+        self._compile_path()
+        self._cursor_path = (
+            jsonpath.compile(pagination["path"])
+            if pagination and "path" in pagination
+            else None
+        )
+        self._total_path = (
+            jsonpath.compile(pagination["total_path"])
+            if pagination and "total_path" in pagination
+            else None
+        )
+
+        # elements read while inferring the schema, reused by the first scan
+        self._pending: Optional[tuple[list[Any], Iterator[Any]]] = None
 
         self._session = get_session(
             request_headers or {},
             self.cache_name,
             timedelta(seconds=cache_expiration),
+            **(cache_options or {}),
         )
 
         self._set_columns()
 
     def _set_columns(self) -> None:
-        rows = list(self.get_data({}, []))
+        elements = self._get_elements()
+        sample = list(itertools.islice(elements, SAMPLE_SIZE))
+        self._pending = (sample, elements)
+
+        rows = list(self._get_rows(sample))
         column_names = list(rows[0].keys()) if rows else []
 
         _, order, types = analyze(iter(rows))
 
+        # the order can only be trusted if the sample has all the rows
+        complete = len(sample) < SAMPLE_SIZE
+
         self.columns = {
             column_name: types[column_name](
                 filters=[],
-                order=order.get(column_name, Order.NONE),
+                order=order.get(column_name, Order.NONE) if complete else Order.NONE,
                 exact=False,
             )
             for column_name in column_names
             if column_name != "rowid"
         }
 
+    def _compile_path(self) -> None:
+        """
+        Compile the path used to extract elements from the payload.
+
+        When streaming, the part after ``$[*]`` is applied to each array element.
+        """
+        self._path = jsonpath.compile(self.path)
+        rest = self.path[len(STREAMING_PREFIX) :]
+        self._element_path = (
+            jsonpath.compile(f"${rest}")
+            if rest and self.path.startswith(STREAMING_PREFIX)
+            else None
+        )
+
     def get_columns(self) -> dict[str, Field]:
         return self.columns
 
     get_cost = SimpleCostModel(AVERAGE_NUMBER_OF_ROWS)
 
-    def get_data(  # pylint: disable=unused-argument, too-many-arguments
-        self,
-        bounds: dict[str, Filter],
-        order: list[tuple[str, RequestedOrder]],
-        requested_columns: Optional[set[str]] = None,
-        **kwargs: Any,
-    ) -> Iterator[Row]:
-        response = self._session.get(self.uri)
+    def _get_elements(self) -> Iterator[Any]:
+        """
+        Download the document, yielding the values matched by the JSONPath.
+
+        Paths that iterate over a top-level array (``$[*]``, ``$[*].data``, etc.) are
+        parsed incrementally from a streamed response, unless the API is paginated.
+        """
+        if self.pagination is not None:
+            yield from self._get_paginated_elements()
+        elif self.path.startswith(STREAMING_PREFIX):
+            yield from self._stream_elements()
+        else:
+            _, payload = self._get_payload(self.uri)
+            yield from self._path.findall(payload)
+
+    def _get_payload(self, url: str) -> tuple[requests.Response, Any]:
+        """
+        Download and decode a JSON document.
+        """
+        response = self._session.get(url)
         payload = response.json()
         if not response.ok:
-            raise ProgrammingError(f'Error: {payload["error"]["message"]}')
+            raise ProgrammingError(f"Error: {payload['error']['message']}")
+
+        return response, payload
+
+    def _stream_elements(self) -> Iterator[Any]:
+        """
+        Stream the elements of a top-level array.
+
+        Note that the body is only read incrementally when the cache is disabled,
+        since responses are read completely before being cached.
+        """
+        response = self._session.get(self.uri, stream=True)
+        if not response.ok:
+            payload = response.json()
+            raise ProgrammingError(f"Error: {payload['error']['message']}")
+
+        try:
+            for element in JSONArrayReader(response.iter_content(CHUNK_SIZE)):
+                if self._element_path is None:
+                    yield element
+                else:
+                    yield from self._element_path.findall(element)
+        finally:
+            response.close()
+
+    def _get_page_elements(self, url: str) -> list[Any]:
+        """
+        Download a page, returning the values matched by the JSONPath.
+        """
+        _, payload = self._get_payload(url)
+        return cast(list[Any], self._path.findall(payload))
+
+    def _get_next_url(
+        self,
+        url: str,
+        response: requests.Response,
+        payload: Any,
+    ) -> Optional[str]:
+        """
+        Return the URL of the next page for link and cursor pagination.
+        """
+        pagination = cast(dict[str, Any], self.pagination)
+        if pagination["type"] == "link":
+            next_ = response.links.get("next", {}).get("url")
+            return urllib.parse.urljoin(url, next_) if next_ else None
+
+        cursors = cast(Any, self._cursor_path).findall(payload)
+        if not cursors or cursors[0] in {None, ""}:
+            return None
+        if "param" in pagination:
+            return str(URL(self.uri).update_query({pagination["param"]: cursors[0]}))
+        return urllib.parse.urljoin(url, str(cursors[0]))
+
+    def _get_page_url(self, page: int, page_size: int) -> str:
+        """
+        Return the URL of a given page, for offset and page pagination.
+        """
+        pagination = cast(dict[str, Any], self.pagination)
+        if pagination["type"] == "offset":
+            params = {pagination.get("param", "offset"): page * page_size}
+        else:
+            params = {
+                pagination.get("param", "page"): pagination.get("start", 1) + page
+            }
+        if "size" in pagination and "size_param" in pagination:
+            params[pagination["size_param"]] = pagination["size"]
+
+        return str(URL(self.uri).update_query(params))
+
+    def _get_total_pages(self, payload: Any, page_size: int) -> Optional[int]:
+        """
+        Return the number of pages, if the response has it.
+        """
+        if self._total_path is None:
+            return None
+
+        totals = self._total_path.findall(payload)
+        if not totals:
+            return None
+
+        total = int(cast(int, totals[0]))
+        if cast(dict[str, Any], self.pagination)["type"] == "offset":
+            return math.ceil(total / page_size)
+        return total
 
-        for i, row in enumerate(jsonpath.findall(self.path, payload)):
-            if isinstance(row, list):
-                row = {f"col_{i}": value for i, value in enumerate(row)}
-            elif isinstance(row, str):
-                row = {"col_0": row}
-            elif row is None:
-                row = {}
+    def _get_paginated_elements(self) -> Iterator[Any]:
+        """
+        Download all the pages, yielding the values matched by the JSONPath.
+        """
+        pagination = cast(dict[str, Any], self.pagination)
 
+        if pagination["type"] in {"link", "cursor"}:
+            url: Optional[str] = self.uri
+            while url is not None:
+                response, payload = self._get_payload(url)
+                yield from self._path.findall(payload)
+                url = self._get_next_url(url, response, payload)
+            return
+
+        _, payload = self._get_payload(self._get_page_url(0, 0))
+        elements = self._path.findall(payload)
+        yield from elements
+        if not elements:
+            return
+
+        page_size = pagination.get("size") or len(elements)
+        total_pages = self._get_total_pages(payload, page_size)
+        if total_pages is not None:
+            urls = (
+                self._get_page_url(page, page_size) for page in range(1, total_pages)
+            )
+            yield from self._get_pages(urls, pagination.get("prefetch", 0))
+            return
+
+        # without the total, read pages until a shorter one is returned
+        page = 1
+        while len(elements) >= page_size:
+            elements = self._get_page_elements(self._get_page_url(page, page_size))
+            yield from elements
+            page += 1
+
+    def _get_pages(self, urls: Iterator[str], prefetch: int) -> Iterator[Any]:
+        """
+        Download pages, optionally fetching up to ``prefetch`` pages concurrently.
+
+        Pages are returned in order, and at most ``prefetch`` pages are downloaded
+        ahead of the rows being consumed.
+        """
+        if not prefetch:
+            for url in urls:
+                yield from self._get_page_elements(url)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        pending: deque[Future] = deque()
+
+        def submit(count: int) -> None:
+            for url in itertools.islice(urls, count):
+                pending.append(executor.submit(self._get_page_elements, url))
+
+        try:
+            submit(prefetch)
+            while pending:
+                elements = pending.popleft().result()
+                submit(1)
+                yield from elements
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_row(self, element: Any) -> Row:
+        """
+        Convert a value matched by the JSONPath into a row.
+        """
+        if isinstance(element, list):
+            return {f"col_{i}": value for i, value in enumerate(element)}
+        if isinstance(element, str):
+            return {"col_0": element}
+        if element is None:
+            return {}
+        return cast(Row, element)
+
+    def _get_rows(
+        self,
+        elements: Iterable[Any],
+        requested_columns: Optional[set[str]] = None,
+    ) -> Iterator[Row]:
+        """
+        Convert elements into flattened rows, with only the requested columns.
+        """
+        for i, element in enumerate(elements):
             row = {
                 k: v
-                for k, v in row.items()
+                for k, v in self._get_row(element).items()
                 if requested_columns is None or k in requested_columns
             }
             row["rowid"] = i
             _logger.debug(row)
             yield flatten(row)
+
+    def get_data(  # pylint: disable=unused-argument, too-many-arguments
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+        requested_columns: Optional[set[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Row]:
+        pending, self._pending = self._pending, None
+        elements = (
+            self._get_elements() if pending is None else itertools.chain(*pending)
+        )
+        yield from self._get_rows(elements, requested_columns)
+
+    def close(self) -> None:
+        if self._pending is not None:
+            _, elements = self._pending
+            elements.close()  # type: ignore
+            self._pending = None
@@ -3,20 +3,23 @@ An adapter for fetching XML data.
 """
 
 import logging
+import re
 import xml.etree.ElementTree as ET
-from collections.abc import Iterator
-from typing import Any, Optional
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, cast
 
 from defusedxml import ElementTree as DET
 
-from shillelagh.adapters.api.generic_json import GenericJSONAPI
+from shillelagh.adapters.api.generic_json import CHUNK_SIZE, GenericJSONAPI
 from shillelagh.exceptions import ProgrammingError
-from shillelagh.filters import Filter
-from shillelagh.lib import flatten
-from shillelagh.typing import RequestedOrder, Row
+from shillelagh.typing import Row
 
 _logger = logging.getLogger(__name__)
 
+# a step in a simple path: a tag, optionally namespaced, or ``*``
+STEP = re.compile(r"(\{[^{}*]+\})?(\*|[^/{}\[\]()@*=\'\"]+)")
+
 
 def element_to_dict(element: ET.Element) -> Any:
     """
@@ -42,9 +45,133 @@ def element_to_dict(element: ET.Element) -> Any:
     return result
 
 
+def get_steps(path: str) -> Optional[list[tuple[bool, str]]]:
+    """
+    Parse a simple path into steps that can be matched while streaming.
+
+    Each step is a tag (or ``*``) and a flag indicating if it can match any
+    descendant, instead of only children:
+
+        >>> get_steps(".//bill")
+        [(True, 'bill')]
+        >>> get_steps("bills/*")
+        [(False, 'bills'), (False, '*')]
+
+    Returns ``None`` for paths with predicates, parent references, or other syntax
+    that needs the whole tree.
+    """
+    if path.endswith("/"):
+        return None
+
+    steps: list[tuple[bool, str]] = []
+    descendant = False
+    rest = path
+    while rest:
+        if rest.startswith("//") and (steps or path.startswith(".")):
+            descendant = True
+            rest = rest[2:]
+            continue
+        if rest.startswith("/") and steps and not descendant:
+            rest = rest[1:]
+            continue
+
+        match = STEP.match(rest)
+        if not match or match.group() == "..":
+            return None
+        rest = rest[match.end() :]
+        if match.group() == ".":
+            if rest.startswith("/") and not rest.startswith("//"):
+                rest = rest[1:]
+            continue
+
+        steps.append((descendant, match.group()))
+        descendant = False
+
+    return None if descendant else steps
+
+
+def path_matches(steps: list[tuple[bool, str]], tags: list[str]) -> bool:
+    """
+    Check if the tags of an element and its ancestors (excluding the root) match.
+    """
+    if not steps:
+        return not tags
+
+    descendant, name = steps[0]
+    candidates = range(len(tags)) if descendant else range(min(len(tags), 1))
+    return any(
+        name in {"*", tags[i]} and path_matches(steps[1:], tags[i + 1 :])
+        for i in candidates
+    )
+
+
+def iterfind(
+    events: Iterable[tuple[str, ET.Element]],
+    steps: list[tuple[bool, str]],
+) -> Iterator[Any]:
+    """
+    Find elements matching a path in a stream of parse events.
+
+    Matching elements are converted to dictionaries as soon as they're complete, in
+    document order, and elements that are not needed anymore are removed from the
+    tree, so that memory is bounded by the size of the elements being returned.
+    """
+    # the last step is checked first, to quickly discard elements
+    _, last = steps[-1] if steps else (False, "*")
+    any_tag = last == "*"
+
+    stack: list[ET.Element] = []
+    pending: deque[ET.Element] = deque()
+    open_: set[int] = set()
+    for event, element in events:
+        if event == "start":
+            stack.append(element)
+            if (any_tag or element.tag == last) and path_matches(
+                steps,
+                [ancestor.tag for ancestor in stack[1:]],
+            ):
+                pending.append(element)
+                open_.add(id(element))
+            continue
+
+        stack.pop()
+        if open_:
+            # elements inside a pending match are needed for its conversion
+            if id(element) not in open_:
+                continue
+            open_.remove(id(element))
+            while pending and id(pending[0]) not in open_:
+                yield element_to_dict(pending.popleft())
+            if open_:
+                continue
+
+        element.clear()
+        if stack:
+            del stack[-1][-1]
+
+
+class ChunkReader:  # pylint: disable=too-few-public-methods
+    """
+    A file-like object reading from an iterable of chunks.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+
+    def read(self, size: int = -1) -> bytes:  # pylint: disable=unused-argument
+        """
+        Return the next non-empty chunk, or an empty string at the end.
+        """
+        return next((chunk for chunk in self.chunks if chunk), b"")
+
+
 class GenericXMLAPI(GenericJSONAPI):
     """
     An adapter for fetching XML data.
+
+    The response is parsed incrementally, and rows are returned as soon as the
+    matching elements are complete. Paths with predicates are evaluated after the
+    whole document has been parsed. Paginated APIs are not supported.
     """
 
     safe = True
@@ -52,32 +179,36 @@ class GenericXMLAPI(GenericJSONAPI):
     supports_limit = False
     supports_offset = False
     supports_requested_columns = True
+    supports_pagination = False
 
     content_type = "xml"  # works with text/xml and application/xml
     default_path = "*"
     cache_name = "generic_xml_cache"
 
-    def get_data(  # pylint: disable=unused-argument, too-many-arguments
-        self,
-        bounds: dict[str, Filter],
-        order: list[tuple[str, RequestedOrder]],
-        requested_columns: Optional[set[str]] = None,
-        **kwargs: Any,
-    ) -> Iterator[Row]:
-        response = self._session.get(self.uri)
-        payload = response.content.decode("utf-8")
+    def _compile_path(self) -> None:
+        # XPath expressions are compiled and cached by ElementTree
+        pass
+
+    def _get_elements(self) -> Iterator[Any]:
+        response = self._session.get(self.uri, stream=True)
         if not response.ok:
+            payload = response.content.decode("utf-8")
             raise ProgrammingError(f"Error: {payload}")
 
-        root = DET.fromstring(payload)
-        result = root.findall(self.path)
-        for i, element in enumerate(result):
-            row = element_to_dict(element)
-            row = {
-                k: v
-                for k, v in row.items()
-                if requested_columns is None or k in requested_columns
-            }
-            row["rowid"] = i
-            _logger.debug(row)
-            yield flatten(row)
+        source = ChunkReader(response.iter_content(CHUNK_SIZE))
+        steps = get_steps(self.path)
+        try:
+            if steps is not None:
+                events = DET.iterparse(source, events=("start", "end"))
+                yield from iterfind(events, steps)
+                return
+
+            _logger.debug("Path %s needs the whole document", self.path)
+            for element in DET.parse(source).getroot().findall(self.path):
+                yield element_to_dict(element)
+        finally:
+            response.close()
+
+    def _get_row(self, element: Any) -> Row:
+        # elements are converted while parsing, so they can be discarded
+        return cast(Row, element)
@@ -65,6 +65,8 @@ class GSheetsField(Field[Internal, External]):
         "M/d/yyyy": "m/d/yyyy",
     }
 
+    __slots__ = ("pattern", "timezone")
+
     def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
         filters: Optional[list[type[Filter]]] = None,
@@ -93,6 +95,9 @@ class GSheetsField(Field[Internal, External]):
             and self.timezone == other.timezone,
         )
 
+    def __hash__(self) -> int:
+        return hash((super().__hash__(), self.pattern, self.timezone))
+
 
 class GSheetsDateTime(GSheetsField[str, datetime.datetime]):
     """
@@ -116,6 +121,8 @@ class GSheetsDateTime(GSheetsField[str, datetime.datetime]):
     type = "TIMESTAMP"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: GvizDateValue) -> Optional[datetime.datetime]:
         # Google Chart API returns ``None`` for a NULL cell, while the Google
         # Sheets API returns an empty string
@@ -182,6 +189,8 @@ class GSheetsDate(GSheetsField[str, datetime.date]):
     type = "DATE"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: GvizDateValue) -> Optional[datetime.date]:
         # Google Chart API returns ``None`` for a NULL cell, while the Google
         # Sheets API returns an empty string
@@ -231,6 +240,8 @@ class GSheetsTime(GSheetsField[str, datetime.time]):
     type = "TIME"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: GvizTimeValue) -> Optional[datetime.time]:
         """
         Parse time of day as returned from the Google Chart API.
@@ -277,6 +288,8 @@ class GSheetsDuration(GSheetsField[str, datetime.timedelta]):
     type = "DURATION"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.timedelta]:
         if self.pattern is None or value is None or value == "":
             return None
@@ -314,6 +327,8 @@ class GSheetsBoolean(GSheetsField[str, bool]):
     type = "BOOLEAN"
     db_api_type = "NUMBER"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[bool]:
         # Google Chart API returns ``None`` for a NULL cell, while the Google
         # Sheets API returns an empty string
@@ -344,6 +359,8 @@ class GSheetsNumber(GSheetsField[str, float]):
     type = "REAL"
     db_api_type = "NUMBER"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[float]:
         if value is None or value == "":
             return None
@@ -380,6 +397,8 @@ class GSheetsString(GSheetsField[str, str]):
     type = "TEXT"
     db_api_type = "STRING"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[str]:
         return None if value == "" else value
 
@@ -10,7 +10,6 @@ import re
 from collections.abc import Iterator
 from typing import Any, Optional, cast
 
-import jsonpath
 import prison
 import requests
 from yarl import URL
@@ -165,7 +164,7 @@ class PresetWorkspaceAPI(PresetAPI):
                 )
                 raise ProgrammingError(f"Error: {messages}")
 
-            rows = jsonpath.findall(self.path, payload)
+            rows = self._path.findall(payload)
             if not rows:
                 break
 
@@ -43,15 +43,19 @@ def combine_time_filters(bounds: dict[str, Filter]) -> Range:
 
     # convert time_epoch range to datetime so we can combine it
     # with the time range
-    time_epoch_range.start = (
-        datetime.fromtimestamp(time_epoch_range.start, tz=timezone.utc)
-        if time_epoch_range.start is not None
-        else None
-    )
-    time_epoch_range.end = (
-        datetime.fromtimestamp(time_epoch_range.end, tz=timezone.utc)
-        if time_epoch_range.end is not None
-        else None
+    time_epoch_range = Range(
+        (
+            datetime.fromtimestamp(time_epoch_range.start, tz=timezone.utc)
+            if time_epoch_range.start is not None
+            else None
+        ),
+        (
+            datetime.fromtimestamp(time_epoch_range.end, tz=timezone.utc)
+            if time_epoch_range.end is not None
+            else None
+        ),
+        time_epoch_range.include_start,
+        time_epoch_range.include_end,
     )
 
     # combine time ranges together and check if the result is a valid range
@@ -155,7 +155,7 @@ class Adapter:
         """
         columns = self.get_columns()
         parsers = {column_name: field.parse for column_name, field in columns.items()}
-        parsers["rowid"] = RowID().parse
+        parsers["rowid"] = RowID.shared().parse
 
         for row in self.get_data(bounds, order, **kwargs):
             yield {
@@ -181,7 +181,7 @@ class Adapter:
         ``insert_data``.
         """
         columns = self.get_columns().copy()
-        columns["rowid"] = RowID()
+        columns["rowid"] = RowID.shared()
         row = {
             column_name: columns[column_name].format(value)
             for column_name, value in row.items()
@@ -220,13 +220,21 @@ class Adapter:
         Update a single row with native Python types.
         """
         columns = self.get_columns().copy()
-        columns["rowid"] = RowID()
+        columns["rowid"] = RowID.shared()
         row = {
             column_name: columns[column_name].format(value)
             for column_name, value in row.items()
         }
         self.update_data(row_id, row)
 
+    def commit(self) -> None:
+        """
+        Commit pending changes.
+
+        This method is called when a transaction is committed. Adapters that buffer
+        changes should use this method to persist them.
+        """
+
     def close(self) -> None:
         """
         Close the adapter.
@@ -235,6 +243,13 @@ class Adapter:
         connection is closed.
         """
 
+    def vacuum(self) -> None:
+        """
+        Reclaim the space used by deleted rows.
+
+        Adapters that only mark rows as deleted can use this method to remove them.
+        """
+
     def drop_table(self) -> None:
         """
         Drop a table.
@@ -1,3 +1,4 @@
+# pylint: disable=too-many-lines
 """
 An adapter for CSV files.
 
@@ -10,31 +11,52 @@ filtering and sorting in Python, instead of relying on the backend.
 Remote files (HTTP/HTTPS) are also supported in read-only mode.
 """
 
+import bz2
 import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
 import logging
+import lzma
+import mmap
 import os
 import tempfile
+import time
 import urllib.parse
+from collections import deque
 from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Optional, cast
+from typing import IO, Any, Optional, Union, cast
 
 import requests
 
 from shillelagh.adapters.base import Adapter
 from shillelagh.exceptions import ProgrammingError
-from shillelagh.fields import Field
+from shillelagh.fields import Boolean, Field, Float, Integer, Order, String
 from shillelagh.filters import (
     Equal,
     Filter,
+    Impossible,
     IsNotNull,
     IsNull,
     NotEqual,
     Operator,
     Range,
 )
-from shillelagh.lib import RowIDManager, analyze, filter_data, update_order
+from shillelagh.lib import (
+    RowIDManager,
+    analyze,
+    compile_predicate,
+    filter_data,
+    get_arrow_mask,
+    import_pyarrow,
+    update_order,
+)
 from shillelagh.typing import Maybe, MaybeType, RequestedOrder, Row
 
 _logger = logging.getLogger(__name__)
@@ -47,6 +69,57 @@ DEFAULT_TIMEOUT = timedelta(minutes=3)
 
 SUPPORTED_PROTOCOLS = {"http", "https"}
 
+# bump when the format of the metadata file changes
+METADATA_VERSION = 2
+
+# number of rows in each block of the index
+DEFAULT_BLOCK_SIZE = 1000
+
+# number of rows parsed by each task in a parallel scan
+DEFAULT_CHUNK_SIZE = 100_000
+
+# fraction of deleted rows above which the file is compacted when closed
+DEFAULT_COMPACTION_THRESHOLD = 0.2
+
+# engines used to parse the file: the ``csv`` module, or ``pyarrow``
+ENGINES = {"python", "arrow"}
+
+# size of the chunks used when streaming remote files to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# the least recently used downloads are removed when the cache grows above this size
+DEFAULT_MAX_CACHE_SIZE = 1024**3
+
+# interrupted downloads are kept for resuming only for a limited time
+PARTIAL_DOWNLOAD_EXPIRATION = timedelta(days=1)
+
+# extensions of compressed files, and the magic number at the start of each format
+COMPRESSIONS = {
+    ".gz": b"\x1f\x8b",
+    ".bz2": b"BZh",
+    ".xz": b"\xfd7zXZ\x00",
+    ".zst": b"\x28\xb5\x2f\xfd",
+}
+
+# types that can be returned by ``analyze``
+FIELD_TYPES: dict[str, type[Field]] = {
+    field.__name__: field for field in (Boolean, Float, Integer, String)
+}
+
+# column names, number of rows, order and type of columns, last row, and index
+Metadata = tuple[
+    list[str],
+    int,
+    dict[str, Order],
+    dict[str, type[Field]],
+    Optional[Row],
+    "BlockIndex",
+]
+
+# a contiguous part of the file: position of the first row, its byte offset, and
+# the position where the segment ends (``None`` means the end of the file)
+Segment = tuple[int, int, Optional[int]]
+
 
 class RowTracker:
     """An iterator that keeps track of the last yielded row."""
@@ -64,7 +137,602 @@ class RowTracker:
         return self.iterable.__next__()
 
 
-class CSVFile(Adapter):
+class BlockIndex:
+    """
+    A sparse index for CSV files.
+
+    Rows are grouped in blocks of ``block_size`` rows. For each block the index
+    stores the byte offset of its first row, and the minimum and maximum value of
+    each column (a "zone map"). This allows reading only the parts of the file that
+    can have rows satisfying the filters of a query, and seeking directly to the
+    rows requested by an ``OFFSET``.
+
+    Rows appended after the index was built are not indexed, and are always read.
+    A ``block_size`` of 0 disables the index.
+    """
+
+    def __init__(
+        self,
+        block_size: int,
+        blocks: Optional[list[dict[str, Any]]] = None,
+        num_rows: int = 0,
+        end: int = 0,
+    ):
+        self.block_size = block_size
+        self.blocks = blocks or []
+
+        # number of indexed rows, and the byte offset where they end
+        self.num_rows = num_rows
+        self.end = end
+
+    def add(self, offset: int, values: list[Any]) -> None:
+        """
+        Add a row to the index.
+        """
+        if not self.block_size:
+            return
+
+        if self.num_rows % self.block_size == 0:
+            self.blocks.append({"offset": offset, "min": [], "max": []})
+        block = self.blocks[-1]
+        minimums, maximums = block["min"], block["max"]
+
+        # columns with nulls, NaNs, or values of different types can't be pruned,
+        # and are marked with ``None``
+        for i, value in enumerate(values):
+            if i == len(minimums):
+                minimums.append(value)
+                maximums.append(value)
+            elif minimums[i] is None:
+                continue
+            else:
+                try:
+                    minimums[i] = min(minimums[i], value)
+                    maximums[i] = max(maximums[i], value)
+                except TypeError:
+                    minimums[i] = maximums[i] = None
+                    continue
+
+            if value is None or value != value:  # pylint: disable=comparison-with-itself
+                minimums[i] = maximums[i] = None
+
+        self.num_rows += 1
+
+    def get_segments(  # pylint: disable=too-many-arguments
+        self,
+        bounds: dict[str, Filter],
+        column_names: list[str],
+        start: int,
+        offset: int = 0,
+        row_ids: Optional[Iterator[int]] = None,
+    ) -> tuple[list[Segment], int]:
+        """
+        Return the segments of the file that need to be read.
+
+        Blocks whose zone maps can't satisfy ``bounds`` are skipped. If ``offset`` is
+        passed the first blocks are also skipped, as long as their number of live rows
+        (based on ``row_ids``) is not greater than the offset; the remaining offset is
+        returned together with the segments. ``start`` is the byte offset of the
+        first row.
+        """
+        positions = {column_name: i for i, column_name in enumerate(column_names)}
+        row_ids = row_ids or iter(())
+
+        segments: list[Segment] = []
+        for i, block in enumerate(self.blocks):
+            first = i * self.block_size
+            last = min(first + self.block_size, self.num_rows)
+
+            if not block_may_match(block, bounds, positions):
+                continue
+
+            if offset and not segments:
+                live = sum(
+                    1
+                    for row_id in itertools.islice(row_ids, last - first)
+                    if row_id != -1
+                )
+                if live <= offset:
+                    offset -= live
+                    continue
+
+            if segments and segments[-1][2] == first:
+                segments[-1] = (segments[-1][0], segments[-1][1], last)
+            else:
+                segments.append((first, block["offset"], last))
+
+        # rows that are not indexed
+        if segments and segments[-1][2] == self.num_rows:
+            segments[-1] = (segments[-1][0], segments[-1][1], None)
+        else:
+            segments.append((self.num_rows, self.end if self.blocks else start, None))
+
+        return segments, offset
+
+    def split(self, segments: list[Segment], chunk_size: int) -> list[Segment]:
+        """
+        Split segments into chunks of approximately ``chunk_size`` rows.
+
+        Chunks are aligned to blocks, so they always start at the beginning of a row.
+        The segment with rows that are not indexed is not split.
+        """
+        step = max(chunk_size // self.block_size, 1) * self.block_size
+
+        chunks: list[Segment] = []
+        for first, offset, last in segments:
+            end = self.num_rows if last is None else last
+            for start in range(first, end, step):
+                stop = min(start + step, end)
+                chunks.append(
+                    (
+                        start,
+                        offset
+                        if start == first
+                        else self.blocks[start // self.block_size]["offset"],
+                        None if last is None and stop == end else stop,
+                    ),
+                )
+            if first == end:
+                chunks.append((first, offset, last))
+
+        return chunks
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Serialize the index.
+        """
+        return {
+            "block_size": self.block_size,
+            "blocks": self.blocks,
+            "num_rows": self.num_rows,
+            "end": self.end,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BlockIndex":
+        """
+        Deserialize the index.
+        """
+        return cls(data["block_size"], data["blocks"], data["num_rows"], data["end"])
+
+
+def block_may_match(
+    block: dict[str, Any],
+    bounds: dict[str, Filter],
+    positions: dict[str, int],
+) -> bool:
+    """
+    Check if a block can have rows satisfying the filters.
+    """
+    for column_name, filter_ in bounds.items():
+        i = positions.get(column_name, -1)
+        if not 0 <= i < len(block["min"]):
+            continue
+        minimum, maximum = block["min"][i], block["max"][i]
+        if minimum is None:
+            continue
+
+        try:
+            if isinstance(filter_, Equal):
+                if not minimum <= filter_.value <= maximum:
+                    return False
+            elif isinstance(filter_, NotEqual):
+                if minimum == maximum == filter_.value:
+                    return False
+            elif isinstance(filter_, Range):
+                if filter_.start is not None and (
+                    filter_.start > maximum
+                    or (filter_.start == maximum and not filter_.include_start)
+                ):
+                    return False
+                if filter_.end is not None and (
+                    filter_.end < minimum
+                    or (filter_.end == minimum and not filter_.include_end)
+                ):
+                    return False
+        except TypeError:
+            continue
+
+    return True
+
+
+def is_csv(path: Path) -> bool:
+    """
+    Check if a path looks like a CSV file, possibly compressed.
+    """
+    suffixes = path.suffixes
+    return bool(suffixes) and (
+        suffixes[-1] == ".csv"
+        or (suffixes[-1] in COMPRESSIONS and suffixes[-2:-1] == [".csv"])
+    )
+
+
+def get_compression(path: Path) -> Optional[str]:
+    """
+    Detect the compression of a file from its magic number.
+
+    The content is used instead of the extension because remote files might have
+    been decompressed on download, when served with ``Content-Encoding``.
+    """
+    with open(path, "rb") as fp:
+        magic = fp.read(6)
+
+    for extension, prefix in COMPRESSIONS.items():
+        if magic.startswith(prefix):
+            return extension
+
+    return None
+
+
+def open_compressed(path: Path, compression: str) -> IO[bytes]:
+    """
+    Open a compressed file for reading decompressed bytes.
+
+    The file objects support ``seek`` and ``tell`` in decompressed positions, so
+    they can be used with the index. Seeking forward is done by decompressing and
+    discarding data, which is still much faster than parsing the skipped rows.
+    """
+    if compression == ".gz":
+        return cast(IO[bytes], gzip.open(path, "rb"))
+    if compression == ".bz2":
+        return cast(IO[bytes], bz2.open(path, "rb"))
+    if compression == ".xz":
+        return cast(IO[bytes], lzma.open(path, "rb"))
+
+    try:
+        import zstandard  # type: ignore  # pylint: disable=import-outside-toplevel
+    except ImportError as ex:
+        raise ProgrammingError(
+            "Reading Zstandard files requires the ``zstandard`` package",
+        ) from ex
+
+    # pylint: disable=consider-using-with
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    return io.BufferedReader(reader)
+
+
+@contextmanager
+def open_bytes(path: Path) -> Iterator[Union[IO[bytes], mmap.mmap]]:
+    """
+    Open a file for reading bytes, memory-mapping it when possible.
+
+    Compressed files are decompressed on the fly.
+    """
+    if compression := get_compression(path):
+        with open_compressed(path, compression) as fp:
+            yield fp
+        return
+
+    with open(path, "rb") as fp:
+        # only files with a real file descriptor can be mapped, and empty files can't
+        try:
+            if not isinstance(fp, io.BufferedReader):
+                raise ValueError("Not a regular file")
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            yield fp
+            return
+
+        with mapped:
+            yield mapped
+
+
+def get_reader(fp: Union[IO[bytes], mmap.mmap]) -> Iterator[list[Any]]:
+    """
+    Return a CSV reader for a binary file.
+
+    The reader consumes one line at a time, so ``fp.tell()`` always points to the
+    start of the next row, and seeking ``fp`` between rows is allowed.
+    """
+    lines = (line.decode("utf-8") for line in iter(fp.readline, b""))
+    return csv.reader(lines, quoting=csv.QUOTE_NONNUMERIC)
+
+
+def scan_chunk(  # pylint: disable=too-many-arguments, too-many-locals
+    path: Path,
+    column_names: list[str],
+    chunk: Segment,
+    bounds: dict[str, Filter],
+    requested_columns: list[str],
+) -> tuple[list[int], list[list[Any]]]:
+    """
+    Parse and filter a chunk of a CSV file.
+
+    This runs in a worker process during parallel scans. It returns the position of
+    the matching rows in the chunk, and the values of the requested columns. Results
+    are returned by column, since that's much faster to send back to the parent.
+    """
+    first, offset, last = chunk
+    predicate = compile_predicate(bounds)
+
+    positions: list[int] = []
+    columns: list[list[Any]] = [[] for _ in requested_columns]
+    with open_bytes(path) as fp:
+        fp.seek(offset)
+        reader = get_reader(fp)
+        rows = reader if last is None else itertools.islice(reader, last - first)
+        for i, values in enumerate(rows):
+            row = dict(zip(column_names, values))
+            if predicate(row):
+                positions.append(i)
+                for column, column_name in zip(columns, requested_columns):
+                    column.append(row.get(column_name))
+
+    return positions, columns
+
+
+def get_arrow_reader(stream: Any, types: dict[str, type[Field]]) -> Any:
+    """
+    Return a ``pyarrow`` streaming reader for rows of a CSV file, without the header.
+
+    The ``QUOTE_NONNUMERIC`` format is preserved by declaring the type of each
+    column, and by reading only unquoted empty values as nulls.
+    """
+    pa = import_pyarrow()
+    arrow_types = {
+        Boolean: pa.bool_(),
+        Float: pa.float64(),
+        Integer: pa.int64(),
+        String: pa.string(),
+    }
+
+    return pa.csv.open_csv(
+        stream,
+        read_options=pa.csv.ReadOptions(column_names=list(types), use_threads=True),
+        convert_options=pa.csv.ConvertOptions(
+            column_types={
+                column_name: arrow_types[type_] for column_name, type_ in types.items()
+            },
+            null_values=[""],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+
+class ByteCounter:  # pylint: disable=too-few-public-methods
+    """
+    A text file wrapper that writes UTF-8 to a binary file, counting bytes.
+    """
+
+    def __init__(self, fp: IO[bytes]):
+        self.fp = fp
+        self.position = 0
+
+    def write(self, text: str) -> int:
+        """
+        Write text to the file.
+        """
+        data = text.encode("utf-8")
+        self.position += len(data)
+        return self.fp.write(data)
+
+
+def get_download_cache_dir(cache_dir: Optional[str] = None) -> Path:
+    """
+    Return the directory where remote files are cached.
+    """
+    if cache_dir:
+        return Path(cache_dir)
+    return Path(tempfile.gettempdir()) / "shillelagh" / "downloads"
+
+
+def stream_to_file(response: requests.Response, output: IO[bytes]) -> None:
+    """
+    Write the body of a streaming response to a file, in chunks.
+    """
+    if not response.ok:
+        raise ProgrammingError(
+            f"Unable to download {response.url}: {response.status_code}",
+        )
+
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+        output.write(chunk)
+
+
+def write_text_atomically(path: Path, text: str) -> None:
+    """
+    Write a text file through a unique temporary file, so readers never see it
+    partially written.
+    """
+    fd, temporary_path = tempfile.mkstemp(
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+        dir=path.parent,
+    )
+    with os.fdopen(fd, "w", encoding="utf-8") as output:
+        output.write(text)
+    os.replace(temporary_path, path)
+
+
+def download(  # pylint: disable=too-many-locals
+    uri: str,
+    cache_dir: Path,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+) -> Path:
+    """
+    Download a remote file to the cache, returning the path to the local copy.
+
+    Cached files are revalidated with conditional requests, using the ``ETag`` and
+    ``Last-Modified`` headers from the original response, so they're only downloaded
+    again when they change. Interrupted downloads are resumed with ``Range``
+    requests.
+
+    Each download is written to a unique temporary file, and moved into place when
+    complete, so that concurrent processes never write to the same file. After a
+    download the least recently used files are evicted from the cache until its
+    size is below ``max_cache_size``.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha256(uri.encode("utf-8")).hexdigest()
+    path = cache_dir / f"{key}.csv"
+    partial_path = cache_dir / f"{key}.csv.part"
+    info_path = cache_dir / f"{key}.json"
+
+    try:
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        info = {}
+    validator = info.get("etag") or info.get("last_modified")
+
+    fd, name = tempfile.mkstemp(prefix=f"{key}.", suffix=".part", dir=cache_dir)
+    os.close(fd)
+    temporary_path = Path(name)
+
+    headers = {}
+    if info.get("complete") and path.exists():
+        if info.get("etag"):
+            headers["If-None-Match"] = info["etag"]
+        if info.get("last_modified"):
+            headers["If-Modified-Since"] = info["last_modified"]
+    elif validator:
+        # claim the interrupted download; the rename is atomic, so if another
+        # process is resuming it we simply start from scratch
+        try:
+            os.replace(partial_path, temporary_path)
+        except FileNotFoundError:
+            pass
+        else:
+            headers["Range"] = f"bytes={temporary_path.stat().st_size}-"
+            headers["If-Range"] = validator
+
+    _logger.info("Downloading %s to %s", uri, path)
+    try:
+        with requests.get(
+            uri,
+            headers=headers,
+            stream=True,
+            timeout=DEFAULT_TIMEOUT.total_seconds(),
+        ) as response:
+            if response.status_code == 304:
+                _logger.info("Using cached copy of %s", uri)
+                temporary_path.unlink()
+                touch(path)
+                return path
+
+            # the server sends the whole file if the partial download is outdated
+            resume = response.status_code == 206
+            if not resume:
+                info = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "complete": False,
+                }
+                write_text_atomically(info_path, json.dumps(info))
+
+            with open(temporary_path, "ab" if resume else "wb") as output:
+                stream_to_file(response, output)
+    except BaseException:
+        # keep the partial download, so it can be resumed
+        os.replace(temporary_path, partial_path)
+        raise
+
+    os.replace(temporary_path, path)
+    info["complete"] = True
+    write_text_atomically(info_path, json.dumps(info))
+
+    evict_downloads(cache_dir, max_cache_size, keep=path)
+
+    return path
+
+
+def touch(path: Path) -> None:
+    """
+    Mark a cached download as recently used.
+
+    Only the access time is updated, since the modification time is part of the
+    signature used to validate the cached metadata.
+    """
+    stat = path.stat()
+    os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+
+def evict_downloads(cache_dir: Path, max_cache_size: int, keep: Path) -> None:
+    """
+    Remove the least recently used downloads until the cache is small enough.
+
+    Interrupted downloads older than ``PARTIAL_DOWNLOAD_EXPIRATION`` are also
+    removed. The file in ``keep``, which is about to be used, is never removed.
+    """
+    now = time.time()
+    downloads = []
+    size = 0
+    for entry in cache_dir.iterdir():
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:  # removed by another process
+            continue
+
+        if entry.suffix == ".part":
+            if now - stat.st_mtime > PARTIAL_DOWNLOAD_EXPIRATION.total_seconds():
+                entry.unlink(missing_ok=True)
+        elif entry.suffix == ".csv":
+            size += stat.st_size
+            if entry != keep:
+                downloads.append((stat.st_atime, stat.st_size, entry))
+
+    for _, entry_size, entry in sorted(downloads):
+        if size <= max_cache_size:
+            break
+        _logger.info("Evicting %s from the download cache", entry)
+        for related_path in (
+            entry,
+            entry.with_suffix(".json"),
+            get_metadata_path(entry),
+        ):
+            related_path.unlink(missing_ok=True)
+        size -= entry_size
+
+
+def get_metadata_path(path: Path) -> Path:
+    """
+    Return the path of the file caching the metadata of a CSV file.
+    """
+    return path.with_name(f".{path.name}.metadata.json")
+
+
+def get_signature(path: Path) -> dict[str, Any]:
+    """
+    Return the size, modification time, and a hash of the header of a file.
+
+    The signature is used to check if the cached metadata of a file is still valid.
+    """
+    stat = path.stat()
+    with open_bytes(path) as fp:
+        header = fp.readline()
+
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "header_hash": hashlib.sha256(header).hexdigest(),
+    }
+
+
+def get_tombstones_path(path: Path) -> Path:
+    """
+    Return the path of the log with the positions of deleted rows in a CSV file.
+    """
+    return path.with_name(f".{path.name}.tombstones")
+
+
+def get_generation(path: Path) -> dict[str, Any]:
+    """
+    Return an identifier of the current generation of a file.
+
+    Appending rows to a file keeps its generation, while compacting it creates a
+    new generation, since the compacted file replaces the original one (and has a
+    different inode).
+    """
+    with open_bytes(path) as fp:
+        header = fp.readline()
+
+    return {
+        "inode": path.stat().st_ino,
+        "header_hash": hashlib.sha256(header).hexdigest(),
+    }
+
+
+class CSVFile(Adapter):  # pylint: disable=too-many-instance-attributes
     r"""
     An adapter for CSV files.
 
@@ -78,17 +746,25 @@ class CSVFile(Adapter):
         13.0,12.1,"Kodiak_Trail"
 
     The adapter will first scan the whole file to determine number of rows, as
-    well as the type and order of each column.
-
-    The adapter has no index. When data is ``SELECT``\ed the adapter will stream
-    over all the rows in the file, filtering them on the fly. If a specific
-    order is requests the resulting rows will be loaded into memory so they
-    can be sorted.
+    well as the type and order of each column. For local files the result is
+    stored in a hidden file next to the CSV file (``.test.csv.metadata.json``
+    for ``test.csv``), and reused while the size, modification time and header
+    of the file don't change. This can be disabled with ``cache_metadata=False``.
+
+    The scan also builds a sparse index (see ``BlockIndex``), with the byte offset
+    and the minimum and maximum value of each column for every ``block_size``
+    rows. When data is ``SELECT``\ed the adapter will stream over the blocks that
+    can satisfy the filters, filtering rows on the fly. If a specific
+    order is requests the resulting rows will be sorted in memory, spilling
+    to temporary files if they're too big.
 
     Inserted rows are appended to the end of the file. Deleted rows simply
     have their row ID marked as deleted (-1), and are ignored when the data is
-    scanned for results. When the adapter is closed deleted rows will be
-    garbage collected.
+    scanned for results. Their positions are also appended to a hidden log next
+    to the file (``.test.csv.tombstones``), which is read when the file is opened.
+    When the adapter is closed the file is compacted, removing the deleted rows,
+    if the fraction of deleted rows is above ``compaction_threshold``. The file
+    can also be compacted explicitly by calling ``vacuum``.
 
     Updates are handled with a delete followed by an insert.
     """
@@ -105,7 +781,7 @@ class CSVFile(Adapter):
     def supports(uri: str, fast: bool = True, **kwargs: Any) -> MaybeType:
         # local file
         path = Path(uri)
-        if path.suffix == ".csv" and path.exists():
+        if is_csv(path) and path.exists():
             return True
 
         # remote file
@@ -113,8 +789,8 @@ class CSVFile(Adapter):
         if parsed.scheme not in SUPPORTED_PROTOCOLS:
             return False
 
-        # URLs ending in ``.csv`` are probably CSV files
-        if parsed.path.endswith(".csv"):
+        # URLs ending in ``.csv`` (or ``.csv.gz``, etc.) are probably CSV files
+        if is_csv(Path(parsed.path)):
             return True
 
         # do a head request to get mimetype
@@ -128,35 +804,169 @@ class CSVFile(Adapter):
     def parse_uri(uri: str) -> tuple[str]:
         return (uri,)
 
-    def __init__(self, path_or_uri: str):
+    def __init__(  # pylint: disable=too-many-arguments, too-many-locals, too-many-positional-arguments
+        self,
+        path_or_uri: str,
+        cache_metadata: bool = True,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        workers: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        cache_downloads: bool = True,
+        cache_dir: Optional[str] = None,
+        max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+        compaction_threshold: float = DEFAULT_COMPACTION_THRESHOLD,
+        engine: str = "python",
+    ):
+        if engine not in ENGINES:
+            raise ProgrammingError(f"Invalid engine: {engine}")
+        if engine == "arrow":
+            import_pyarrow()
+
         super().__init__()
 
+        self.engine = engine
+
+        # appended rows and deletions are buffered until the transaction is committed
+        self._data_file: Optional[IO[str]] = None
+        self._writer: Optional[Any] = None
+        self._tombstones: list[int] = []
+        self._uncommitted = False
+
         path = Path(path_or_uri)
-        if path.suffix == ".csv" and path.exists():
+        if is_csv(path) and path.exists():
             self.local = True
+        elif cache_downloads:
+            self.local = False
+            path = download(
+                path_or_uri,
+                get_download_cache_dir(cache_dir),
+                max_cache_size,
+            )
         else:
             self.local = False
 
             # download CSV file
             with tempfile.NamedTemporaryFile(delete=False) as output:
-                response = requests.get(
+                with requests.get(
                     path_or_uri,
+                    stream=True,
                     timeout=DEFAULT_TIMEOUT.total_seconds(),
-                )
-                output.write(response.content)
+                ) as response:
+                    stream_to_file(response, output)
             path = Path(output.name)
 
         self.path = path
         self.modified = False
+        self.compression = get_compression(path)
+
+        # cached downloads are kept, so their metadata can be cached as well
+        self.cached = not self.local and cache_downloads
+        self.cache_metadata = cache_metadata and (self.local or self.cached)
+        self.block_size = block_size
+
+        # parallel scans use a process pool; 0 means one worker per CPU
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+        metadata = self._load_metadata() if self.cache_metadata else None
+        if metadata is None:
+            column_names, num_rows, order, types, last_row, index = self._analyze()
+        else:
+            column_names, num_rows, order, types, last_row, index = metadata
+
+        self.columns = {
+            column_name: types[column_name](
+                filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+                order=order[column_name],
+                exact=True,
+            )
+            for column_name in column_names
+        }
+
+        self.compaction_threshold = compaction_threshold
+        self._load_state(num_rows, last_row, index)
+
+        if metadata is None and self.cache_metadata:
+            self._save_metadata()
+
+    def _load_state(
+        self,
+        num_rows: int,
+        last_row: Optional[Row],
+        index: BlockIndex,
+    ) -> None:
+        """
+        Set the row IDs, deleted rows and index of the file.
+        """
+        # the row ID manager is used to keep track of insertions and deletions
+        self.row_id_manager = RowIDManager([range(0, num_rows + 1)])
+
+        # rows deleted in previous sessions are stored in the tombstone log; only
+        # local uncompressed files can be modified
+        self.num_deleted = 0
+        if self.local and not self.compression:
+            self.generation = get_generation(self.path)
+            self._load_tombstones(num_rows)
+
+        self.last_row = last_row
+        self.num_rows = num_rows - self.num_deleted
+        self.index = index
+
+    def _refresh(self) -> None:
+        """
+        Reload the file if it was compacted since it was opened.
+
+        Compacting the file (eg, by calling ``VACUUM`` on it) changes the position
+        of the rows, so the row IDs, deleted rows and index are loaded again.
+        """
+        if (
+            not self.local
+            or self.compression
+            or get_generation(self.path) == self.generation
+        ):
+            return
+
+        if self._uncommitted:
+            raise ProgrammingError(
+                f"File {self.path} was rewritten while it had uncommitted changes",
+            )
+
+        _logger.info("File %s was rewritten since it was opened", self.path)
+        self._close_writer()
+        metadata = self._load_metadata() if self.cache_metadata else None
+        _, num_rows, order, _, last_row, index = metadata or self._analyze()
+        for column_name, field in self.columns.items():
+            field.order = order[column_name]
+        self._load_state(num_rows, last_row, index)
+        self.modified = False
+
+    def _analyze(self) -> Metadata:
+        """
+        Scan the file to determine number of rows, and type and order of columns.
+
+        The index is built in the same pass.
+        """
+        index = BlockIndex(self.block_size)
+
+        def read_rows() -> Iterator[Row]:
+            while True:
+                offset = fp.tell()
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    index.end = offset
+                    return
+                index.add(offset, row)
+                yield dict(zip(column_names, row))
 
         _logger.info("Opening file CSV file %s to load metadata", self.path)
-        with open(self.path, encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile, quoting=csv.QUOTE_NONNUMERIC)
+        with open_bytes(self.path) as fp:
+            reader = get_reader(fp)
             try:
                 column_names = next(reader)
             except StopIteration as ex:
                 raise ProgrammingError("The file has no rows") from ex
-            data = (dict(zip(column_names, row)) for row in reader)
+            data = read_rows()
 
             # put data in a ``RowTracker``, so we can monitor the last row
             # and keep track of the column order
@@ -167,20 +977,113 @@ class CSVFile(Adapter):
             num_rows, order, types = analyze(row_tracker)
             _logger.debug("Read %d rows", num_rows)
 
-        self.columns = {
-            column_name: types[column_name](
-                filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
-                order=order[column_name],
-                exact=True,
+        return column_names, num_rows, order, types, row_tracker.last_row, index
+
+    def _load_metadata(self) -> Optional[Metadata]:
+        """
+        Load cached metadata, if it's still valid.
+        """
+        metadata_path = get_metadata_path(self.path)
+        try:
+            with open(metadata_path, encoding="utf-8") as fp:
+                metadata = json.load(fp)
+
+            signature = get_signature(self.path)
+            index = BlockIndex.from_dict(metadata["index"])
+            if (
+                metadata["version"] != METADATA_VERSION
+                or metadata["signature"] != signature
+                or index.block_size != self.block_size
+            ):
+                _logger.info("Metadata in %s is stale", metadata_path)
+                return None
+
+            column_names = metadata["column_names"]
+            order = {
+                column_name: Order(metadata["order"][column_name])
+                for column_name in column_names
+            }
+            types = {
+                column_name: FIELD_TYPES[metadata["types"][column_name]]
+                for column_name in column_names
+            }
+            last_row = (
+                dict(zip(column_names, metadata["last_row"]))
+                if metadata["last_row"] is not None
+                else None
             )
-            for column_name in column_names
-        }
+            num_rows = metadata["num_rows"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
 
-        # the row ID manager is used to keep track of insertions and deletions
-        self.row_id_manager = RowIDManager([range(0, num_rows + 1)])
+        _logger.info("Loaded metadata from %s", metadata_path)
+        return column_names, num_rows, order, types, last_row, index
 
-        self.last_row = row_tracker.last_row
-        self.num_rows = num_rows
+    def _load_tombstones(self, num_rows: int) -> None:
+        """
+        Mark rows deleted in previous sessions as deleted.
+
+        The log is ignored if the file was compacted or replaced after it was written.
+        """
+        tombstones_path = get_tombstones_path(self.path)
+        if not tombstones_path.exists():
+            return
+
+        try:
+            with open(tombstones_path, encoding="utf-8") as fp:
+                generation = json.loads(fp.readline())
+                # incomplete lines are from interrupted writes, and are ignored
+                positions = {int(line) for line in fp if line.endswith("\n")}
+        except ValueError:
+            generation = None
+
+        if generation != self.generation:
+            _logger.warning("Ignoring stale tombstones in %s", tombstones_path)
+            tombstones_path.unlink()
+            return
+
+        # the row ID of each row is its position when the file is opened
+        _logger.info("Loaded %d tombstones from %s", len(positions), tombstones_path)
+        for position in sorted(positions):
+            if position < num_rows:
+                self.row_id_manager.delete(position)
+                self.num_deleted += 1
+
+    def _save_metadata(self) -> None:
+        """
+        Store the metadata of the file, so it doesn't have to be scanned again.
+        """
+        column_names = list(self.columns)
+        metadata = {
+            "version": METADATA_VERSION,
+            "signature": get_signature(self.path),
+            "column_names": column_names,
+            "num_rows": self.num_rows + self.num_deleted,
+            "order": {
+                column_name: field.order.value
+                for column_name, field in self.columns.items()
+            },
+            "types": {
+                column_name: type(field).__name__
+                for column_name, field in self.columns.items()
+            },
+            "last_row": (
+                [self.last_row[column_name] for column_name in column_names]
+                if self.last_row
+                else None
+            ),
+            "index": self.index.to_dict(),
+        }
+
+        # write to a temporary file first, so readers never see a partial file
+        metadata_path = get_metadata_path(self.path)
+        temporary_path = metadata_path.with_suffix(".tmp")
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as fp:
+                json.dump(metadata, fp)
+            os.replace(temporary_path, metadata_path)
+        except OSError:
+            _logger.warning("Unable to write metadata to %s", metadata_path)
 
     def get_columns(self) -> dict[str, Field]:
         return self.columns
@@ -197,14 +1100,13 @@ class CSVFile(Adapter):
         if filtered_columns:
             cost += FILTERING_COST
 
-        # sorting, on the other hand, is costy, requiring loading all the data
-        # in memory and calling ``.sort()`` for each column that needs to be
-        # ordered
+        # sorting, on the other hand, is costy, requiring consuming all the data
+        # and sorting it in memory (or on disk, for big files)
         cost += SORTING_COST * len(order)
 
         return cost
 
-    def get_data(  # pylint: disable=too-many-arguments
+    def get_data(  # pylint: disable=too-many-arguments, too-many-locals
         self,
         bounds: dict[str, Filter],
         order: list[tuple[str, RequestedOrder]],
@@ -216,9 +1118,14 @@ class CSVFile(Adapter):
         requested_columns = requested_columns or set(self.columns.keys())
         requested_columns.add("rowid")
 
+        # buffered rows need to be written so they can be read
+        self._refresh()
+        self.commit()
+
         _logger.info("Opening file CSV file %s to load data", self.path)
-        with open(self.path, encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile, quoting=csv.QUOTE_NONNUMERIC)
+        # pylint: disable=contextmanager-generator-missing-cleanup
+        with open_bytes(self.path) as fp:
+            reader = get_reader(fp)
 
             try:
                 header = next(reader)
@@ -226,8 +1133,45 @@ class CSVFile(Adapter):
                 raise ProgrammingError("The file has no rows") from ex
             column_names = ["rowid", *header]
 
-            rows = ([i, *row] for i, row in zip(self.row_id_manager, reader) if i != -1)
-            data = (dict(zip(column_names, row)) for row in rows)
+            # use the index to skip blocks that can't match the filters; the offset
+            # can also be skipped, but only when rows are returned in the file order
+            if offset and not bounds and not order:
+                segments, offset = self.index.get_segments(
+                    bounds,
+                    header,
+                    fp.tell(),
+                    offset,
+                    iter(self.row_id_manager),
+                )
+            else:
+                segments, _ = self.index.get_segments(bounds, header, fp.tell())
+
+            # bounds are applied by ``pyarrow`` or by the workers in parallel scans;
+            # compressed files are not scanned in parallel, since each worker would
+            # have to decompress the file from the beginning
+            parallel = self.workers > 1 and self.index.blocks and not self.compression
+            if self.engine == "arrow" or parallel:
+                if any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+                    return
+                if self.engine == "arrow":
+                    data = self._scan_arrow(
+                        fp,
+                        header,
+                        segments,
+                        bounds,
+                        requested_columns,
+                    )
+                else:
+                    data = self._scan_parallel(
+                        header,
+                        segments,
+                        bounds,
+                        requested_columns,
+                    )
+                bounds = {}
+            else:
+                rows = self._read_segments(fp, reader, segments)
+                data = (dict(zip(column_names, row)) for row in rows)
 
             # Filter and sort the data. It would probably be more efficient to simply
             # declare the columns as having no filter and no sort order, and let the
@@ -243,52 +1187,294 @@ class CSVFile(Adapter):
                 _logger.debug(row)
                 yield row
 
+    def _read_segments(
+        self,
+        fp: Union[IO[bytes], mmap.mmap],
+        reader: Iterator[list[Any]],
+        segments: list[Segment],
+    ) -> Iterator[list[Any]]:
+        """
+        Read segments of the file, returning rows prefixed with their row ID.
+        """
+        # pylint: disable=looping-through-iterator
+        row_ids = iter(self.row_id_manager)
+        position = 0
+        for first, offset, last in segments:
+            # skip row IDs of rows in blocks that are not read
+            for _ in itertools.islice(row_ids, first - position):
+                pass
+            position = first
+
+            fp.seek(offset)
+            rows = reader if last is None else itertools.islice(reader, last - first)
+            for row, row_id in zip(rows, row_ids):
+                position += 1
+                if row_id != -1:
+                    yield [row_id, *row]
+
+    def _scan_arrow(  # pylint: disable=too-many-arguments, too-many-locals
+        self,
+        fp: Union[IO[bytes], mmap.mmap],
+        header: list[str],
+        segments: list[Segment],
+        bounds: dict[str, Filter],
+        requested_columns: set[str],
+    ) -> Iterator[Row]:
+        """
+        Read segments of the file with ``pyarrow``.
+
+        Rows are parsed in batches by multiple threads, and filtered and projected
+        as Arrow arrays; only the rows and columns requested are converted to Python.
+        """
+        pa = import_pyarrow()
+        types = {column_name: type(self.columns[column_name]) for column_name in header}
+        column_names = [
+            column_name for column_name in header if column_name in requested_columns
+        ]
+
+        # uncompressed files are read directly, without copies; compressed files are
+        # decompressed by ``fp``
+        source = None if self.compression else pa.memory_map(str(self.path))
+
+        # pylint: disable=looping-through-iterator
+        row_ids = iter(self.row_id_manager)
+        position = 0
+        for first, offset, last in segments:
+            # skip row IDs of rows in blocks that are not read
+            for _ in itertools.islice(row_ids, first - position):
+                pass
+            position = first
+
+            end = (
+                None
+                if last is None
+                else self.index.blocks[last // self.index.block_size]["offset"]
+            )
+            stream = self._get_arrow_stream(fp, source, offset, end)
+            if stream is None:
+                continue
+
+            for batch in get_arrow_reader(stream, types):
+                ids = list(itertools.islice(row_ids, batch.num_rows))
+                position += batch.num_rows
+
+                mask = get_arrow_mask(batch, bounds)
+                if mask is None:
+                    indexes = range(batch.num_rows)
+                else:
+                    # pylint: disable=no-member
+                    indexes = pa.compute.indices_nonzero(mask).to_pylist()
+                    batch = batch.filter(mask)
+
+                columns = batch.select(column_names).to_pydict()
+                rows = (
+                    zip(*(columns[column_name] for column_name in column_names))
+                    if column_names
+                    else itertools.repeat(())
+                )
+                for i, values in zip(indexes, rows):
+                    if ids[i] != -1:
+                        row = dict(zip(column_names, values))
+                        row["rowid"] = ids[i]
+                        yield row
+
+    @staticmethod
+    def _get_arrow_stream(
+        fp: Union[IO[bytes], mmap.mmap],
+        source: Any,
+        start: int,
+        end: Optional[int],
+    ) -> Any:
+        """
+        Return a ``pyarrow`` stream with the bytes between ``start`` and ``end``.
+
+        ``source`` is the memory-mapped file, or ``None`` for compressed files. When
+        ``end`` is ``None`` the stream goes until the end of the file. Returns ``None``
+        if there are no bytes to read.
+        """
+        pa = import_pyarrow()
+
+        if source:
+            end = source.size() if end is None else end
+            return source.get_stream(start, end - start) if end > start else None
+
+        fp.seek(start)
+        if end is not None:
+            return pa.BufferReader(fp.read(end - start))
+        if cast(io.BufferedReader, fp).peek(1):
+            return pa.PythonFile(fp, mode="r")
+        return None
+
+    def _scan_parallel(  # pylint: disable=too-many-locals
+        self,
+        header: list[str],
+        segments: list[Segment],
+        bounds: dict[str, Filter],
+        requested_columns: set[str],
+    ) -> Iterator[Row]:
+        """
+        Read segments of the file using a pool of processes.
+
+        The segments are split into chunks of rows, which are parsed and filtered
+        by the workers. Results are returned in the file order, and at most
+        ``workers`` chunks are parsed ahead of the rows being consumed, so that
+        memory is bounded and closing the generator stops the scan.
+        """
+        chunks = self.index.split(segments, self.chunk_size)
+        column_names = [
+            column_name for column_name in header if column_name in requested_columns
+        ]
+        _logger.info(
+            "Scanning %d chunks of CSV file %s with %d workers",
+            len(chunks),
+            self.path,
+            self.workers,
+        )
+
+        # pylint: disable=looping-through-iterator
+        row_ids = iter(self.row_id_manager)
+        position = 0
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        remaining = iter(chunks)
+        pending: deque[tuple[Segment, Future]] = deque()
+
+        def submit(count: int) -> None:
+            for chunk in itertools.islice(remaining, count):
+                future = executor.submit(
+                    scan_chunk,
+                    self.path,
+                    header,
+                    chunk,
+                    bounds,
+                    column_names,
+                )
+                pending.append((chunk, future))
+
+        try:
+            submit(self.workers)
+            while pending:
+                (first, _, last), future = pending.popleft()
+                positions, columns = future.result()
+                submit(1)
+
+                # skip row IDs of rows in blocks that are not read
+                for _ in itertools.islice(row_ids, first - position):
+                    pass
+                ids = list(
+                    row_ids
+                    if last is None
+                    else itertools.islice(row_ids, last - first),
+                )
+                position = first + len(ids)
+
+                for i, values in zip(positions, zip(*columns)):
+                    if i < len(ids) and ids[i] != -1:
+                        row = dict(zip(column_names, values))
+                        row["rowid"] = ids[i]
+                        yield row
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def insert_data(self, row: Row) -> int:
         if not self.local:
             raise ProgrammingError("Cannot apply DML to a remote file")
+        if self.compression:
+            raise ProgrammingError("Cannot apply DML to a compressed file")
+
+        # the file can only be rewritten by another adapter between transactions
+        if not self._uncommitted:
+            self._refresh()
 
         row_id: Optional[int] = row.pop("rowid")
         row_id = cast(int, self.row_id_manager.insert(row_id))
 
-        # append row
-        column_names = list(self.get_columns().keys())
+        # append row; the file is kept open, and the rows are buffered until the
+        # transaction is committed or the adapter is closed
         _logger.info("Appending row with ID %d to CSV file %s", row_id, self.path)
         _logger.debug(row)
-        with open(self.path, "a", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile, quoting=csv.QUOTE_NONNUMERIC)
-            writer.writerow([row[column_name] for column_name in column_names])
+        if self._writer is None:
+            # pylint: disable=consider-using-with
+            self._data_file = open(self.path, "a", encoding="utf-8")
+            self._writer = csv.writer(self._data_file, quoting=csv.QUOTE_NONNUMERIC)
+        self._writer.writerow([row[column_name] for column_name in self.columns])
         self.num_rows += 1
 
-        # update order, in case it has changed
-        for column_name, column_type in self.columns.items():
-            column_type.order = update_order(
-                current_order=column_type.order,
-                previous=self.last_row[column_name] if self.last_row else None,
+        # update order, in case it has changed; with more than 2 rows a column that
+        # is not sorted can't become sorted, so it can be skipped
+        previous_row = self.last_row or {}
+        for column_name, field in self.columns.items():
+            if field.order == Order.NONE and self.num_rows > 2:
+                continue
+            field.order = update_order(
+                current_order=field.order,
+                previous=previous_row.get(column_name),
                 current=row[column_name],
                 num_rows=self.num_rows,
             )
         self.last_row = row
         self.modified = True
+        self._uncommitted = True
 
         return row_id
 
     def delete_data(self, row_id: int) -> None:
         if not self.local:
             raise ProgrammingError("Cannot apply DML to a remote file")
+        if self.compression:
+            raise ProgrammingError("Cannot apply DML to a compressed file")
+
+        if not self._uncommitted:
+            self._refresh()
 
         _logger.info("Deleting row with ID %d from CSV file %s", row_id, self.path)
         # on ``DELETE``\s we simply mark the row as deleted, so that it will be ignored
-        # on ``SELECT``\s
-        self.row_id_manager.delete(row_id)
+        # on ``SELECT``\s; its position is stored in the tombstone log on commit
+        position = self.row_id_manager.delete(row_id)
+        self._tombstones.append(position)
         self.num_rows -= 1
+        self.num_deleted += 1
         self.modified = True
+        self._uncommitted = True
+
+    def commit(self) -> None:
+        """
+        Write buffered rows and tombstones to disk.
+
+        Rows are written first, so that tombstones never point to rows that were not
+        written.
+        """
+        if self._data_file:
+            self._data_file.flush()
+
+        if self._tombstones:
+            with open(get_tombstones_path(self.path), "a", encoding="utf-8") as fp:
+                if fp.tell() == 0:
+                    fp.write(json.dumps(self.generation) + "\n")
+                fp.writelines(f"{position}\n" for position in self._tombstones)
+            self._tombstones = []
+
+        self._uncommitted = False
+
+    def _close_writer(self) -> None:
+        """
+        Commit pending changes and close the file used to append rows.
+        """
+        self.commit()
+        if self._data_file:
+            self._data_file.close()
+            self._data_file = None
+            self._writer = None
 
     def close(self) -> None:
         """
         Garbage collect the file.
 
-        This method will get rid of deleted rows in the files.
+        This method will write any buffered changes, and get rid of deleted rows in
+        the file if they're above the compaction threshold.
         """
+        if self.cached:
+            return
+
         if not self.local:
             try:
                 self.path.unlink()
@@ -296,23 +1482,84 @@ class CSVFile(Adapter):
                 pass
             return
 
-        if not self.modified:
+        self._close_writer()
+        if not self.modified or not self._check_generation():
             return
 
-        # garbage collect -- should we sort the data according to the initial sort
-        # order when writing to the new file?
-        with open(self.path, encoding="utf-8") as csvfile:
-            reader = csv.reader(csvfile, quoting=csv.QUOTE_NONNUMERIC)
+        num_rows = self.num_rows + self.num_deleted
+        if self.num_deleted > self.compaction_threshold * num_rows:
+            self._compact()
+        elif self.cache_metadata:
+            # the order and types of the columns are still valid, since they were
+            # updated on inserts, and rows appended are read without the index
+            self._save_metadata()
+        self.modified = False
+
+    def vacuum(self) -> None:
+        """
+        Remove deleted rows from the file, regardless of the compaction threshold.
+        """
+        self._close_writer()
+        if self.num_deleted and self._check_generation():
+            self._compact()
+
+    def _check_generation(self) -> bool:
+        """
+        Check that the file was not compacted or replaced since it was opened.
+
+        If it was, the row IDs are no longer valid and the file can't be compacted.
+        """
+        if get_generation(self.path) == self.generation:
+            return True
+
+        _logger.warning("File %s was rewritten since it was opened", self.path)
+        return False
+
+    def _compact(self) -> None:
+        """
+        Rewrite the file without the deleted rows.
+        """
+        # should we sort the data according to the initial sort order when writing
+        # to the new file?
+        _logger.info("Compacting CSV file %s", self.path)
+        index = BlockIndex(self.block_size)
+        with open_bytes(self.path) as fp:
+            reader = get_reader(fp)
             column_names = next(reader)
-            data = (row for i, row in zip(self.row_id_manager, reader) if i != -1)
+            data = RowTracker(
+                dict(zip(column_names, row))
+                for i, row in zip(self.row_id_manager, reader)
+                if i != -1
+            )
 
-            with open(self.path.with_suffix(".csv.bak"), "w", encoding="utf-8") as copy:
-                writer = csv.writer(copy, quoting=csv.QUOTE_NONNUMERIC)
+            # the index is rebuilt as rows are written, since their offsets change
+            with open(self.path.with_suffix(".csv.bak"), "wb") as copy:
+                counter = ByteCounter(copy)
+                writer = csv.writer(counter, quoting=csv.QUOTE_NONNUMERIC)
                 writer.writerow(column_names)
-                writer.writerows(data)
+                for row in data:
+                    values = list(row.values())
+                    index.add(counter.position, values)
+                    writer.writerow(values)
+                index.end = counter.position
 
         os.replace(self.path.with_suffix(".csv.bak"), self.path)
+        get_tombstones_path(self.path).unlink(missing_ok=True)
+        self.generation = get_generation(self.path)
         self.modified = False
 
+        # rows get new row IDs, based on their new positions
+        self.row_id_manager = RowIDManager([range(0, self.num_rows + 1)])
+        self.num_deleted = 0
+        self.last_row = data.last_row
+        self.index = index
+
+        # the order and types of the columns are still valid, since they were
+        # updated on inserts, and deleting rows doesn't change them
+        if self.cache_metadata:
+            self._save_metadata()
+
     def drop_table(self) -> None:
         self.path.unlink()
+        get_metadata_path(self.path).unlink(missing_ok=True)
+        get_tombstones_path(self.path).unlink(missing_ok=True)
@@ -0,0 +1,397 @@
+"""
+An adapter for querying multiple CSV files as a single table.
+
+Files are selected with a glob pattern (``/path/to/events/2024-05-*.csv``) or a
+directory (``/path/to/events/``), and each one is read with the CSV adapter.
+Directories named ``key=value`` (eg, ``/path/to/events/day=2024-05-01/``) are
+exposed as partition columns.
+"""
+
+import glob
+import itertools
+import logging
+import os
+import queue
+import threading
+import urllib.parse
+from collections import deque
+from collections.abc import Generator, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, cast
+
+from shillelagh.adapters.base import Adapter
+from shillelagh.adapters.file.csvfile import (
+    DEFAULT_BLOCK_SIZE,
+    FILTERING_COST,
+    INITIAL_COST,
+    SORTING_COST,
+    CSVFile,
+    block_may_match,
+    is_csv,
+)
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Field, Order, String
+from shillelagh.filters import (
+    Equal,
+    Filter,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    NotEqual,
+    Operator,
+    Range,
+)
+from shillelagh.lib import compile_predicate, filter_data
+from shillelagh.typing import MaybeType, RequestedOrder, Row
+
+_logger = logging.getLogger(__name__)
+
+# characters that make a path a glob pattern
+GLOB_CHARACTERS = set("*?[")
+
+# rows are read from each file in batches, and at most ``MAX_BATCHES`` batches are
+# buffered per file
+BATCH_SIZE = 1000
+MAX_BATCHES = 4
+
+# how often threads blocked on a full buffer check if the scan was stopped, in seconds
+POLL_INTERVAL = 0.1
+
+# marks the end of the rows of a file
+DONE = object()
+
+
+def get_paths(uri: str) -> list[Path]:
+    """
+    Return the CSV files matching a glob pattern or inside a directory.
+
+    Hidden files are ignored, since they're used to store metadata.
+    """
+    path = Path(uri)
+    if path.is_dir():
+        candidates = path.rglob("*")
+    elif GLOB_CHARACTERS & set(uri):
+        candidates = (Path(match) for match in glob.iglob(uri, recursive=True))
+    else:
+        return []
+
+    return sorted(
+        candidate
+        for candidate in candidates
+        if is_csv(candidate)
+        and candidate.is_file()
+        and not candidate.name.startswith(".")
+    )
+
+
+def get_partitions(path: Path) -> dict[str, str]:
+    """
+    Return the partition values of a file, from ``key=value`` directories.
+    """
+    partitions = {}
+    for part in path.parent.parts:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            partitions[urllib.parse.unquote(key)] = urllib.parse.unquote(value)
+    return partitions
+
+
+def value_may_match(filter_: Filter, value: Any) -> bool:
+    """
+    Check if a value satisfies a filter.
+
+    Values that can't be compared with the filter (eg, ``NULL`` in a range) don't
+    match.
+    """
+    try:
+        return compile_predicate({"value": filter_})({"value": value})
+    except TypeError:
+        return False
+
+
+class CSVGlob(Adapter):
+    """
+    An adapter for multiple CSV files, queried as a single table.
+
+    The schema is the union of the columns of all the files, with values missing in a
+    file read as ``NULL``; columns whose type is not the same in every file are
+    exposed as strings. Partition values from ``key=value`` directories are exposed
+    as string columns.
+
+    Each file is read by a ``CSVFile`` adapter, so its metadata and index are
+    cached next to the file. Before reading a file the filters are checked against
+    its partition values, missing columns, and the minimum and maximum value of each
+    block in the index; files that can't have matching rows are skipped.
+
+    The remaining files are scanned concurrently by a pool of ``workers`` threads
+    (0 uses one thread per CPU). Rows are returned in the order of the files.
+    """
+
+    # the adapter is not safe, since it could be used to read files from
+    # the filesystem
+    safe = False
+
+    supports_limit = True
+    supports_offset = True
+    supports_requested_columns = True
+
+    @staticmethod
+    def supports(uri: str, fast: bool = True, **kwargs: Any) -> MaybeType:
+        return bool(get_paths(uri))
+
+    @staticmethod
+    def parse_uri(uri: str) -> tuple[str]:
+        return (uri,)
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        uri: str,
+        cache_metadata: bool = True,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        engine: str = "python",
+        workers: int = 0,
+    ):
+        paths = get_paths(uri)
+        if not paths:
+            raise ProgrammingError(f"No CSV files found in {uri}")
+
+        super().__init__()
+
+        self.workers = workers or os.cpu_count() or 1
+
+        # files are added as they're opened, so ``close`` works if one of them fails
+        self.files: list[CSVFile] = []
+        for path in paths:
+            self.files.append(
+                CSVFile(
+                    str(path),
+                    cache_metadata=cache_metadata,
+                    block_size=block_size,
+                    engine=engine,
+                ),
+            )
+        self.partitions = [get_partitions(path) for path in paths]
+
+        # row IDs of each file are shifted so they are unique across files
+        self.offsets = list(
+            itertools.accumulate(
+                (file_.row_id_manager.get_max_row_id() + 1 for file_ in self.files),
+                initial=0,
+            ),
+        )
+
+        types: dict[str, set[type[Field]]] = {}
+        for file_ in self.files:
+            for column_name, field in file_.get_columns().items():
+                types.setdefault(column_name, set()).add(type(field))
+        for partitions in self.partitions:
+            for column_name in partitions:
+                types.setdefault(column_name, set()).add(String)
+
+        # columns with conflicting types are filtered by the backend
+        self.columns = {
+            column_name: (next(iter(type_)) if len(type_) == 1 else String)(
+                filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+                order=Order.NONE,
+                exact=len(type_) == 1,
+            )
+            for column_name, type_ in types.items()
+        }
+
+    def get_columns(self) -> dict[str, Field]:
+        return self.columns
+
+    def get_cost(
+        self,
+        filtered_columns: list[tuple[str, Operator]],
+        order: list[tuple[str, RequestedOrder]],
+    ) -> float:
+        cost = INITIAL_COST
+
+        if filtered_columns:
+            cost += FILTERING_COST
+
+        cost += SORTING_COST * len(order)
+
+        return cost
+
+    def _get_constants(self, i: int) -> Row:
+        """
+        Return the columns of the table that have a constant value in a given file.
+
+        These are the partition columns, and the columns missing from the file.
+        """
+        constants: Row = {
+            column_name: None
+            for column_name in self.columns
+            if column_name not in self.files[i].columns
+        }
+        constants.update(self.partitions[i])
+        return constants
+
+    def _get_file_bounds(
+        self,
+        i: int,
+        bounds: dict[str, Filter],
+    ) -> Optional[dict[str, Filter]]:
+        """
+        Return the filters that need to be applied when reading a given file.
+
+        Returns ``None`` if the file can't have rows satisfying the filters.
+        """
+        file_ = self.files[i]
+        constants = self._get_constants(i)
+
+        file_bounds = {}
+        for column_name, filter_ in bounds.items():
+            if column_name in constants:
+                if not value_may_match(filter_, constants[column_name]):
+                    return None
+            elif type(file_.columns[column_name]) is type(self.columns[column_name]):
+                file_bounds[column_name] = filter_
+
+        positions = {column_name: j for j, column_name in enumerate(file_.columns)}
+        if file_.index.blocks and not any(
+            block_may_match(block, file_bounds, positions)
+            for block in file_.index.blocks
+        ):
+            return None
+
+        return file_bounds
+
+    def _scan(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        i: int,
+        bounds: dict[str, Filter],
+        limit: Optional[int],
+        requested_columns: set[str],
+        batches: queue.Queue[Any],
+        stop: threading.Event,
+    ) -> None:
+        """
+        Read the rows of a given file that satisfy the filters.
+
+        Rows are put in the queue in batches of ``BATCH_SIZE``, followed by ``DONE``.
+        The queue is bounded, so reading blocks until the rows are consumed, and
+        stops when ``stop`` is set.
+        """
+
+        def put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        file_ = self.files[i]
+        constants = {
+            column_name: value
+            for column_name, value in self._get_constants(i).items()
+            if column_name in requested_columns
+        }
+        file_columns = (requested_columns & set(file_.columns)) | {"rowid"}
+
+        _logger.info("Reading file %s", file_.path)
+        rows = cast(
+            Generator[Row, None, None],
+            file_.get_data(bounds, [], limit=limit, requested_columns=file_columns),
+        )
+        try:
+            while batch := [
+                {**row, **constants, "rowid": row["rowid"] + self.offsets[i]}
+                for row in itertools.islice(rows, BATCH_SIZE)
+            ]:
+                if not put(batch):
+                    return
+        finally:
+            rows.close()
+            put(DONE)
+
+    def _read_files(
+        self,
+        tasks: list[tuple[int, dict[str, Filter]]],
+        limit: Optional[int],
+        requested_columns: set[str],
+    ) -> Iterator[Row]:
+        """
+        Read files concurrently, returning rows in the order of the files.
+
+        At most ``workers`` files are read at the same time, and each one buffers at
+        most ``MAX_BATCHES`` batches of rows ahead of the rows being consumed. When
+        the generator is closed the files being read are stopped.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        stop = threading.Event()
+        pending: deque[tuple[Future, queue.Queue[Any]]] = deque()
+
+        def submit(tasks: Iterator[tuple[int, dict[str, Filter]]]) -> None:
+            for i, bounds in tasks:
+                batches: queue.Queue[Any] = queue.Queue(maxsize=MAX_BATCHES)
+                future = executor.submit(
+                    self._scan,
+                    i,
+                    bounds,
+                    limit,
+                    requested_columns,
+                    batches,
+                    stop,
+                )
+                pending.append((future, batches))
+
+        remaining = iter(tasks)
+        try:
+            submit(itertools.islice(remaining, self.workers))
+            while pending:
+                future, batches = pending[0]
+                while (batch := batches.get()) is not DONE:
+                    yield from batch
+
+                # raise any errors from reading the file
+                future.result()
+                pending.popleft()
+                submit(itertools.islice(remaining, 1))
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_data(  # pylint: disable=too-many-arguments
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        requested_columns: Optional[set[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Row]:
+        if any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+            return
+
+        requested_columns = requested_columns or set(self.columns)
+        requested_columns.add("rowid")
+
+        tasks = []
+        for i, file_ in enumerate(self.files):
+            file_bounds = self._get_file_bounds(i, bounds)
+            if file_bounds is None:
+                _logger.debug("Skipping file %s", file_.path)
+            else:
+                tasks.append((i, file_bounds))
+
+        # each file needs to return at most ``limit + offset`` rows
+        file_limit = None if limit is None or order else limit + (offset or 0)
+
+        yield from filter_data(
+            self._read_files(tasks, file_limit, requested_columns),
+            {},
+            order,
+            limit,
+            offset,
+            requested_columns,
+        )
+
+    def close(self) -> None:
+        for file_ in self.files:
+            file_.close()
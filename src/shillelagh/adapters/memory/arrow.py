@@ -0,0 +1,326 @@
+"""
+An adapter for in-memory Arrow tables and Polars dataframes.
+"""
+
+# pylint: disable=invalid-name, no-member
+
+import sys
+from collections.abc import Iterator
+from typing import Any, Callable, Optional
+
+import pyarrow as pa  # type: ignore
+import pyarrow.compute as pc  # type: ignore
+
+from shillelagh.adapters.base import Adapter
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import (
+    Blob,
+    Boolean,
+    Date,
+    DateTime,
+    Decimal,
+    Duration,
+    Field,
+    Float,
+    Integer,
+    Order,
+    String,
+    Time,
+)
+from shillelagh.filters import (
+    Equal,
+    Filter,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    Like,
+    NotEqual,
+    Range,
+)
+from shillelagh.lib import SimpleCostModel, find_variable, get_arrow_mask
+from shillelagh.typing import RequestedOrder, Row
+
+# this is just a wild guess; used to estimate query cost
+AVERAGE_NUMBER_OF_ROWS = 1000
+
+# number of rows converted to Python objects at a time
+CHUNK_SIZE = 10_000
+
+# tables registered with ``register_table``
+registered_tables: dict[str, pa.Table] = {}
+
+type_map: list[
+    tuple[Callable[[pa.DataType], bool], type[Field], list[type[Filter]]]
+] = [
+    (pa.types.is_boolean, Boolean, [Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_integer, Integer, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_floating, Float, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_decimal, Decimal, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (
+        pa.types.is_string,
+        String,
+        [Range, Equal, NotEqual, Like, IsNull, IsNotNull],
+    ),
+    (
+        pa.types.is_large_string,
+        String,
+        [Range, Equal, NotEqual, Like, IsNull, IsNotNull],
+    ),
+    (pa.types.is_binary, Blob, [Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_large_binary, Blob, [Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_timestamp, DateTime, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_date, Date, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_time, Time, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    (pa.types.is_duration, Duration, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+]
+
+
+def get_field(type_: pa.DataType) -> Optional[Field]:
+    """
+    Return a Shillelagh `Field` from an Arrow type.
+
+    Returns ``None`` for types that are not supported, like lists and structs.
+    """
+    for predicate, class_, filters in type_map:
+        if predicate(type_):
+            return class_(
+                filters=filters,
+                order=Order.ANY,
+                exact=True,
+            )
+    return None
+
+
+def get_table(value: Any) -> Optional[pa.Table]:
+    """
+    Return an Arrow table from an object, if it's a table or a dataframe.
+
+    Record batches and Polars dataframes are converted to tables without copying
+    the data. Polars is never imported; if the caller has a Polars dataframe the
+    module has already been imported.
+    """
+    if isinstance(value, pa.Table):
+        return value
+    if isinstance(value, pa.RecordBatch):
+        return pa.Table.from_batches([value])
+
+    polars = sys.modules.get("polars")
+    if polars is not None and isinstance(value, polars.DataFrame):
+        return value.to_arrow()
+
+    return None
+
+
+def register_table(name: str, table: Any) -> None:
+    """
+    Register an Arrow table or Polars dataframe, so it can be queried by name.
+
+    Registered tables are found without inspecting the stack, so they can be queried
+    from any thread.
+    """
+    arrow_table = get_table(table)
+    if arrow_table is None:
+        raise ProgrammingError(f"Not a table: {table!r}")
+    registered_tables[name] = arrow_table
+
+
+def unregister_table(name: str) -> None:
+    """
+    Remove a registered table.
+    """
+    registered_tables.pop(name, None)
+
+
+def find_table(uri: str) -> Optional[pa.Table]:
+    """
+    Find a Arrow table or Polars dataframe by name.
+
+    Registered tables are returned first; otherwise the stack is searched for a
+    variable with the given name.
+    """
+    if uri in registered_tables:
+        return registered_tables[uri]
+
+    return find_variable(uri, get_table)
+
+
+def get_sort_indices(table: pa.Table, order: list[tuple[str, RequestedOrder]]) -> Any:
+    """
+    Return the indices that sort a table.
+
+    Nulls are sorted first in ascending order and last in descending order, like in
+    SQLite, by sorting on their validity before sorting on the values.
+    """
+    keys = {}
+    sort_keys = []
+    for i, (column_name, requested_order) in enumerate(order):
+        direction = "ascending" if requested_order == Order.ASCENDING else "descending"
+        keys[f"valid_{i}"] = pc.is_valid(table.column(column_name))
+        keys[f"value_{i}"] = table.column(column_name)
+        sort_keys.extend([(f"valid_{i}", direction), (f"value_{i}", direction)])
+
+    return pc.sort_indices(pa.table(keys), sort_keys=sort_keys)
+
+
+def filter_and_sort(
+    table: pa.Table,
+    column_names: list[str],
+    bounds: dict[str, Filter],
+    order: list[tuple[str, RequestedOrder]],
+) -> tuple[pa.Table, Optional[pa.Array]]:
+    """
+    Filter and sort the columns of a table.
+
+    The filters are evaluated on the original table, so that only the columns that
+    are needed are filtered. Returns the resulting table and the positions of its
+    rows in the original table, or ``None`` if they weren't changed.
+    """
+    positions: Optional[pa.Array] = None
+    mask = get_arrow_mask(table, bounds)
+    table = table.select(column_names)
+    if mask is not None:
+        positions = pc.indices_nonzero(mask)
+        table = table.filter(mask)
+
+    if order:
+        indices = get_sort_indices(table, order)
+        table = table.take(indices)
+        positions = indices if positions is None else positions.take(indices)
+
+    return table, positions
+
+
+def get_rows(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    table: pa.Table,
+    positions: Optional[pa.Array],
+    start: int,
+    end: int,
+    chunk_size: int,
+) -> Iterator[Row]:
+    """
+    Convert rows of a table to Python objects, in chunks.
+    """
+    for i in range(start, end, chunk_size):
+        length = min(chunk_size, end - i)
+        row_ids = (
+            range(i, i + length)
+            if positions is None
+            else positions.slice(i, length).to_pylist()
+        )
+        rows = (
+            table.slice(i, length).to_pylist()
+            if table.num_columns
+            else [{} for _ in range(length)]
+        )
+        for row_id, row in zip(row_ids, rows):
+            row["rowid"] = row_id
+            yield row
+
+
+def get_table_data(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    table: pa.Table,
+    columns: dict[str, Field],
+    bounds: dict[str, Filter],
+    order: list[tuple[str, RequestedOrder]],
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    requested_columns: Optional[set[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Row]:
+    """
+    Apply the ``get_data`` method on an Arrow table.
+
+    Filters, sorting and slicing are done with Arrow compute kernels, and only the
+    rows and columns needed are converted to Python objects. The row ID is the
+    position of the row in the table.
+    """
+    if any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+        return
+
+    column_names = [
+        column_name
+        for column_name in columns
+        if requested_columns is None or column_name in requested_columns
+    ]
+    needed = set(column_names) | {column_name for column_name, _ in order}
+    table, positions = filter_and_sort(
+        table,
+        [column_name for column_name in columns if column_name in needed],
+        bounds,
+        order,
+    )
+
+    # the table might have no columns, so the number of rows is computed from the
+    # positions when possible
+    num_rows = table.num_rows if positions is None else len(positions)
+    start = min(offset or 0, num_rows)
+    end = num_rows if limit is None else min(start + limit, num_rows)
+
+    yield from get_rows(table.select(column_names), positions, start, end, chunk_size)
+
+
+def get_columns_from_table(table: pa.Table) -> dict[str, Field]:
+    """
+    Construct adapter columns from an Arrow table.
+    """
+    return {
+        column_name: field
+        for column_name, type_ in zip(table.column_names, table.schema.types)
+        if (field := get_field(type_)) is not None
+    }
+
+
+class ArrowMemory(Adapter):
+    """
+    An adapter for in-memory Arrow tables and Polars dataframes.
+
+    Tables are read-only, and queried without converting them to Pandas.
+    """
+
+    safe = False
+
+    supports_limit = True
+    supports_offset = True
+    supports_requested_columns = True
+
+    @staticmethod
+    def supports(uri: str, fast: bool = True, **kwargs: Any) -> Optional[bool]:
+        return find_table(uri) is not None
+
+    @staticmethod
+    def parse_uri(uri: str) -> tuple[str]:
+        return (uri,)
+
+    def __init__(self, uri: str):
+        table = find_table(uri)
+        if table is None:
+            raise ProgrammingError("Could not find table")
+
+        super().__init__()
+
+        self.table = table
+        self.columns = get_columns_from_table(table)
+
+    def get_columns(self) -> dict[str, Field]:
+        return self.columns
+
+    get_cost = SimpleCostModel(AVERAGE_NUMBER_OF_ROWS)
+
+    def get_data(  # pylint: disable=too-many-arguments
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        requested_columns: Optional[set[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Row]:
+        yield from get_table_data(
+            self.table,
+            self.columns,
+            bounds,
+            order,
+            limit,
+            offset,
+            requested_columns,
+        )
@@ -4,8 +4,8 @@ An adapter for in-memory Pandas dataframes.
 
 # pylint: disable=invalid-name
 
-import inspect
 import operator
+import re
 from collections.abc import Iterator
 from typing import Any, Optional
 
@@ -21,15 +21,24 @@ from shillelagh.filters import (
     Impossible,
     IsNotNull,
     IsNull,
+    Like,
     NotEqual,
     Range,
 )
-from shillelagh.lib import SimpleCostModel
+from shillelagh.lib import SimpleCostModel, find_variable
 from shillelagh.typing import RequestedOrder, Row
 
 # this is just a wild guess; used to estimate query cost
 AVERAGE_NUMBER_OF_ROWS = 1000
 
+# number of rows converted to Python objects at a time
+CHUNK_SIZE = 10_000
+
+EMPTY = np.array([], dtype=np.int64)
+
+# dataframes registered with ``register_dataframe``
+registered_dataframes: dict[str, pd.DataFrame] = {}
+
 type_map: dict[str, tuple[type[Field], list[type[Filter]]]] = {
     "i": (Integer, [Range, Equal, NotEqual, IsNull, IsNotNull]),
     "b": (Boolean, [Equal, NotEqual, IsNull, IsNotNull]),
@@ -37,7 +46,7 @@ type_map: dict[str, tuple[type[Field], list[type[Filter]]]] = {
     "f": (Float, [Range, Equal, NotEqual, IsNull, IsNotNull]),
     "M": (DateTime, [Range, Equal, NotEqual, IsNull, IsNotNull]),
     "S": (String, [Range, Equal, NotEqual, IsNull, IsNotNull]),
-    "O": (String, [Range, Equal, NotEqual, IsNull, IsNotNull]),
+    "O": (String, [Range, Equal, NotEqual, Like, IsNull, IsNotNull]),
 }
 
 
@@ -53,77 +62,359 @@ def get_field(dtype: np.dtype) -> Field:
     )
 
 
+def register_dataframe(name: str, df: pd.DataFrame) -> None:
+    """
+    Register a dataframe, so it can be queried as a table with a given name.
+
+    Registered dataframes are found without inspecting the stack, so they can be
+    queried from any thread.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise ProgrammingError(f"Not a dataframe: {df!r}")
+    registered_dataframes[name] = df
+
+
+def unregister_dataframe(name: str) -> None:
+    """
+    Remove a registered dataframe.
+    """
+    registered_dataframes.pop(name, None)
+
+
 def find_dataframe(uri: str) -> Optional[pd.DataFrame]:
     """
-    Go up the stack, find the Pandas dataframe.
+    Find a Pandas dataframe by name.
+
+    Registered dataframes are returned first; otherwise the stack is searched for a
+    variable with the given name.
+    """
+    if uri in registered_dataframes:
+        return registered_dataframes[uri]
+
+    return find_variable(
+        uri,
+        lambda value: value if isinstance(value, pd.DataFrame) else None,
+    )
+
+
+def get_like_regex(pattern: str) -> re.Pattern:
+    """
+    Build a regular expression matching the same values as a ``LIKE`` pattern.
+    """
+    regex = "".join(
+        ".*" if char == "%" else "." if char == "_" else re.escape(char)
+        for char in pattern
+    )
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+
+def get_mask(series: pd.Series, filter_: Filter) -> np.ndarray:
+    """
+    Return a boolean mask with the values of a series that satisfy a filter.
+    """
+    if isinstance(filter_, Equal):
+        mask = series == filter_.value
+    elif isinstance(filter_, NotEqual):
+        mask = series != filter_.value
+    elif isinstance(filter_, Range):
+        mask = pd.Series(True, index=series.index)
+        if filter_.start is not None:
+            operator_ = operator.ge if filter_.include_start else operator.gt
+            mask &= operator_(series, filter_.start)
+        if filter_.end is not None:
+            operator_ = operator.le if filter_.include_end else operator.lt
+            mask &= operator_(series, filter_.end)
+    elif isinstance(filter_, Like):
+        mask = series.str.fullmatch(get_like_regex(filter_.value), na=False)
+    elif isinstance(filter_, IsNull):
+        mask = series.isna()
+    else:
+        mask = series.notna()
+
+    return np.asarray(mask, dtype=bool)
+
+
+def copy_on_write() -> bool:
+    """
+    Return if Pandas copy-on-write is enabled.
+
+    It's always enabled from Pandas 3.0, and optional in Pandas 2.
+    """
+    if int(pd.__version__.split(".", 1)[0]) >= 3:
+        return True
+    return getattr(pd.options.mode, "copy_on_write", False) is True
+
+
+def get_fingerprint(series: pd.Series) -> tuple[Any, ...]:
+    """
+    Return an identifier of the values of a series.
+
+    Series with the same fingerprint share the same underlying array.
+    """
+    values = series.values
+    if isinstance(values, np.ndarray):
+        return (values.__array_interface__["data"][0], values.shape, values.dtype)
+    return (id(values), len(values), series.dtype)
+
+
+class DataFrameIndex:
+    """
+    Sort order and hash indexes of the columns of a dataframe.
+
+    Both are computed lazily, the first time a column is filtered or sorted. Columns
+    sorted in ascending or descending order (without nulls) are searched with
+    ``searchsorted``. Hash indexes, used for equality filters, are only built for the
+    columns in ``indexed_columns``.
+
+    The dataframe can be modified by its owner between queries, so ``validate``
+    should be called before each query. With copy-on-write the index keeps a
+    reference to each column it computed, so modifying the column creates a new
+    array, and only the columns that changed are discarded. Without copy-on-write
+    changes can't be detected, so the cache is cleared and hash indexes are not
+    used, since building them for a single query is slower than a full scan.
+    """
+
+    def __init__(self, df: pd.DataFrame, indexed_columns: Optional[list[str]] = None):
+        self.df = df
+        self.indexed_columns = set(indexed_columns or [])
+        self._series: dict[Any, pd.Series] = {}
+        self._orders: dict[Any, Order] = {}
+        self._indexes: dict[Any, dict[Any, np.ndarray]] = {}
+
+    def reset(self) -> None:
+        """
+        Clear the cache, after the dataframe is modified.
+        """
+        self._series.clear()
+        self._orders.clear()
+        self._indexes.clear()
+
+    def validate(self) -> None:
+        """
+        Discard the cache of columns that were modified since it was computed.
+        """
+        if not copy_on_write():
+            self.reset()
+            return
+
+        for label, series in list(self._series.items()):
+            if label not in self.df.columns or get_fingerprint(
+                self.df[label],
+            ) != get_fingerprint(series):
+                del self._series[label]
+                self._orders.pop(label, None)
+                self._indexes.pop(label, None)
+
+    def _get_series(self, label: Any) -> pd.Series:
+        """
+        Return a column, keeping a reference to it while it's cached.
+        """
+        if label not in self._series:
+            self._series[label] = self.df[label]
+        return self._series[label]
+
+    def get_order(self, label: Any) -> Order:
+        """
+        Return the order of a column.
+        """
+        if label not in self._orders:
+            series = self._get_series(label)
+            if series.hasnans:
+                self._orders[label] = Order.NONE
+            elif series.is_monotonic_increasing:
+                self._orders[label] = Order.ASCENDING
+            elif series.is_monotonic_decreasing:
+                self._orders[label] = Order.DESCENDING
+            else:
+                self._orders[label] = Order.NONE
+
+        return self._orders[label]
+
+    def get_index(self, label: Any) -> Optional[dict[Any, np.ndarray]]:
+        """
+        Return a hash index for a column, if it's indexed.
+
+        The index maps each value to the (sorted) positions of the rows that have it.
+        """
+        if str(label) not in self.indexed_columns or not copy_on_write():
+            return None
+        if label not in self._indexes:
+            series = self._get_series(label)
+            self._indexes[label] = series.groupby(series, sort=False).indices
+        return self._indexes[label]
+
+    def search(self, label: Any, filter_: Filter) -> Optional[tuple[int, int]]:
+        """
+        Return the positions of the rows satisfying a filter on a sorted column.
+
+        Returns ``None`` if the column is not sorted, or the filter can't be
+        evaluated with a binary search.
+        """
+        order = self.get_order(label)
+        if order == Order.NONE or not isinstance(filter_, (Equal, Range)):
+            return None
+
+        # ``searchsorted`` requires values in ascending order
+        series = self._get_series(label)
+        if order == Order.DESCENDING:
+            series = series.iloc[::-1]
+
+        if isinstance(filter_, Equal):
+            start: Any = filter_.value
+            end: Any = filter_.value
+            include_start = include_end = True
+        else:
+            start, end = filter_.start, filter_.end
+            include_start, include_end = filter_.include_start, filter_.include_end
+
+        try:
+            # ``searchsorted`` doesn't check types, so make sure values are comparable
+            for value in (start, end):
+                if value is not None and len(series):
+                    operator.le(series.iloc[0], value)
+
+            first = (
+                0
+                if start is None
+                else int(
+                    series.searchsorted(start, "left" if include_start else "right")
+                )
+            )
+            last = (
+                len(series)
+                if end is None
+                else int(series.searchsorted(end, "right" if include_end else "left"))
+            )
+        except TypeError:
+            return None
+
+        if order == Order.DESCENDING:
+            first, last = len(series) - last, len(series) - first
+
+        return first, last
+
+
+def get_positions(
+    df: pd.DataFrame,
+    bounds: dict[str, Filter],
+    labels: dict[str, Any],
+    index: DataFrameIndex,
+) -> np.ndarray:
     """
-    for level in inspect.stack():
-        # search locals
-        context_locals = dict(inspect.getmembers(level[0]))["f_locals"]
-        if uri in context_locals and isinstance(context_locals[uri], pd.DataFrame):
-            return context_locals[uri]
+    Return the positions of the rows satisfying the filters, in ascending order.
 
-        # search globals
-        context_globals = dict(inspect.getmembers(level[0]))["f_globals"]
-        if uri in context_globals and isinstance(context_globals[uri], pd.DataFrame):
-            return context_globals[uri]
+    Equality filters on indexed columns and filters on sorted columns are used to
+    narrow down the candidate rows first; the remaining filters are combined into a
+    single boolean mask evaluated only on the candidates.
+    """
+    first, last = 0, len(df)
+    candidates: Optional[np.ndarray] = None
+    remaining: dict[str, Filter] = {}
+    for column_name, filter_ in bounds.items():
+        if (
+            isinstance(filter_, Equal)
+            and (hash_index := index.get_index(labels[column_name])) is not None
+        ):
+            matches = hash_index.get(filter_.value, EMPTY)
+            candidates = (
+                matches if candidates is None else np.intersect1d(candidates, matches)
+            )
+        elif (range_ := index.search(labels[column_name], filter_)) is not None:
+            first, last = max(first, range_[0]), min(last, range_[1])
+        else:
+            remaining[column_name] = filter_
+
+    if candidates is None:
+        candidates = np.arange(first, max(first, last))
+        frame = df.iloc[first:last]
+    else:
+        candidates = candidates[(candidates >= first) & (candidates < last)]
+        frame = df.iloc[candidates]
 
-    return None
+    mask = np.ones(len(frame), dtype=bool)
+    for column_name, filter_ in remaining.items():
+        mask &= get_mask(frame[labels[column_name]], filter_)
 
+    return candidates[mask]
 
-def get_df_data(  # pylint: disable=too-many-arguments, too-many-branches, too-many-positional-arguments
+
+def get_df_data(  # pylint: disable=too-many-arguments, too-many-locals, too-many-positional-arguments
     df: pd.DataFrame,
     columns: dict[str, Field],
     bounds: dict[str, Filter],
     order: list[tuple[str, RequestedOrder]],
     limit: Optional[int] = None,
     offset: Optional[int] = None,
+    requested_columns: Optional[set[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    index: Optional[DataFrameIndex] = None,
 ) -> Iterator[Row]:
     """
     Apply the ``get_data`` method on a Pandas dataframe.
+
+    The filters are evaluated with ``get_positions``, and only the rows and columns
+    needed are sliced from the dataframe. Rows are then built in chunks, from one
+    list of Python values per column.
+
+    Sorting on a single column that is already sorted (see ``DataFrameIndex``)
+    doesn't require sorting the data.
     """
     if df.empty:
         return
 
-    # ensure column names are strings
-    df = df.rename(columns={k: str(k) for k in df.columns})
-
-    column_names = list(columns.keys())
-    df = df[column_names]
-
-    for column_name, filter_ in bounds.items():
+    for filter_ in bounds.values():
         if isinstance(filter_, Impossible):
             return
-        if isinstance(filter_, Equal):
-            df = df[df[column_name] == filter_.value]
-        elif isinstance(filter_, NotEqual):
-            df = df[df[column_name] != filter_.value]
-        elif isinstance(filter_, Range):
-            if filter_.start is not None:
-                operator_ = operator.ge if filter_.include_start else operator.gt
-                df = df[operator_(df[column_name], filter_.start)]
-            if filter_.end is not None:
-                operator_ = operator.le if filter_.include_end else operator.lt
-                df = df[operator_(df[column_name], filter_.end)]
-        elif isinstance(filter_, IsNull):
-            df = df[~df[column_name].notnull()]
-        elif isinstance(filter_, IsNotNull):
-            df = df[df[column_name].notnull()]
-        else:
+        if not isinstance(filter_, (Equal, NotEqual, Range, Like, IsNull, IsNotNull)):
             raise ProgrammingError(f"Invalid filter: {filter_}")
 
-    if order:
+    # column names might not be strings
+    labels = {str(label): label for label in df.columns}
+
+    index = index or DataFrameIndex(df)
+    index.validate()
+    positions = get_positions(df, bounds, labels, index)
+
+    column_names = [
+        column_name
+        for column_name in columns
+        if requested_columns is None or column_name in requested_columns
+    ]
+    needed = set(column_names) | {column_name for column_name, _ in order}
+    df = df[[labels[column_name] for column_name in columns if column_name in needed]]
+
+    # without a sort limit and offset can be applied to the positions directly
+    start = offset or 0
+    end = None if limit is None else start + limit
+    if len(order) == 1 and (column_order := index.get_order(labels[order[0][0]])) in {
+        Order.ASCENDING,
+        Order.DESCENDING,
+    }:
+        if order[0][1] != column_order:
+            positions = positions[::-1]
+        df = df.iloc[positions[start:end]]
+    elif order:
         by, requested_orders = list(zip(*order))
         ascending = [
             requested_order == Order.ASCENDING for requested_order in requested_orders
         ]
-        df = df.sort_values(by=list(by), ascending=ascending)
-
-    df = df[offset:]
-    df = df[:limit]
-
-    for row in df.itertuples(name=None):
-        yield dict(zip(["rowid", *column_names], row))
+        df = df.iloc[positions].sort_values(
+            by=[labels[column_name] for column_name in by],
+            ascending=ascending,
+        )
+        df = df.iloc[start:end]
+    else:
+        df = df.iloc[positions[start:end]]
+
+    names = ["rowid", *column_names]
+    for i in range(0, len(df), chunk_size):
+        chunk = df.iloc[i : i + chunk_size]
+        values = [
+            chunk.index.tolist(),
+            *(chunk[labels[column_name]].tolist() for column_name in column_names),
+        ]
+        for row in zip(*values):
+            yield dict(zip(names, row))
 
 
 def get_columns_from_df(df: pd.DataFrame) -> dict[str, Field]:
@@ -138,7 +429,7 @@ def get_columns_from_df(df: pd.DataFrame) -> dict[str, Field]:
     }
 
 
-class PandasMemory(Adapter):
+class PandasMemory(Adapter):  # pylint: disable=too-many-instance-attributes
     """
     An adapter for in-memory Pandas dataframes.
     """
@@ -147,6 +438,7 @@ class PandasMemory(Adapter):
 
     supports_limit = True
     supports_offset = True
+    supports_requested_columns = True
 
     @staticmethod
     def supports(uri: str, fast: bool = True, **kwargs: Any) -> Optional[bool]:
@@ -156,46 +448,165 @@ class PandasMemory(Adapter):
     def parse_uri(uri: str) -> tuple[str]:
         return (uri,)
 
-    def __init__(self, uri: str):
-        super().__init__()
+    def __init__(self, uri: str, indexes: Optional[list[str]] = None):
         df = find_dataframe(uri)
         if df is None:
             raise ProgrammingError("Could not find dataframe")
 
+        super().__init__()
+
+        self.uri = uri
         self.df = df
         self.columns = get_columns_from_df(df)
+        self.labels = {str(label): label for label in df.columns}
+        self.index = DataFrameIndex(df, indexes)
+
+        # changes are buffered and applied to the dataframe in a single step, since
+        # enlarging it one row at a time copies it on every insert
+        self._inserted: dict[str, list[Any]] = {
+            column_name: [] for column_name in self.columns
+        }
+        self._inserted_ids: list[int] = []
+        self._pending_ids: set[int] = set()
+        self._deleted: list[int] = []
+        self._updated: dict[int, Row] = {}
+        self._next_row_id: Optional[int] = None
 
     def get_columns(self) -> dict[str, Field]:
         return self.columns
 
     get_cost = SimpleCostModel(AVERAGE_NUMBER_OF_ROWS)
 
-    def get_data(
+    def get_data(  # pylint: disable=too-many-arguments
         self,
         bounds: dict[str, Filter],
         order: list[tuple[str, RequestedOrder]],
         limit: Optional[int] = None,
         offset: Optional[int] = None,
+        requested_columns: Optional[set[str]] = None,
         **kwargs: Any,
     ) -> Iterator[Row]:
-        yield from get_df_data(self.df, self.columns, bounds, order, limit, offset)
+        self._flush()
+        yield from get_df_data(
+            self.df,
+            self.columns,
+            bounds,
+            order,
+            limit,
+            offset,
+            requested_columns,
+            index=self.index,
+        )
 
     def insert_data(self, row: Row) -> int:
         row_id: Optional[int] = row.pop("rowid")
+        if self._next_row_id is None:
+            self._next_row_id = int(max(self.df.index, default=-1)) + 1
         if row_id is None:
-            row_id = max(self.df.index) + 1
+            row_id = self._next_row_id
+        self._next_row_id = max(self._next_row_id, row_id + 1)
 
-        self.df.loc[row_id] = row
+        for column_name, values in self._inserted.items():
+            values.append(row.get(column_name))
+        self._inserted_ids.append(row_id)
+        self._pending_ids.add(row_id)
 
         return row_id
 
     def delete_data(self, row_id: int) -> None:
-        self.df.drop([row_id], inplace=True)
+        if row_id in self._pending_ids:
+            self._flush()
+
+        self._updated.pop(row_id, None)
+        self._deleted.append(row_id)
 
     def update_data(self, row_id: int, row: Row) -> None:
         # the row_id might change on an update
-        new_row_id = row.pop("rowid")
+        new_row_id = row["rowid"]
         if new_row_id != row_id:
-            self.df.drop([row_id], inplace=True)
+            self.delete_data(row_id)
+            self.insert_data(row)
+            return
+
+        if row_id in self._pending_ids:
+            self._flush()
+
+        self._updated[row_id] = row
+
+    def _flush(self) -> None:
+        """
+        Apply buffered changes to the dataframe.
+
+        Updates are applied with a single assignment and deletes with a single
+        ``drop``. Inserted rows are added with a single ``concat``, which returns a
+        new dataframe, since Pandas can only enlarge a dataframe in place by a single
+        row at a time, copying it on every row.
+        """
+        if not (self._updated or self._deleted or self._inserted_ids):
+            return
+
+        if self._updated:
+            row_ids = list(self._updated)
+            labels = [self.labels[column_name] for column_name in self.columns]
+            self.df.loc[row_ids, labels] = pd.DataFrame(
+                {
+                    self.labels[column_name]: [
+                        row[column_name] for row in self._updated.values()
+                    ]
+                    for column_name in self.columns
+                },
+                index=row_ids,
+            )
+            self._updated = {}
+
+        if self._deleted:
+            self.df.drop(self._deleted, inplace=True)
+            self._deleted = []
+
+        if self._inserted_ids:
+            inserted = pd.DataFrame(
+                {
+                    self.labels[column_name]: values
+                    for column_name, values in self._inserted.items()
+                },
+                index=pd.Index(self._inserted_ids, name=self.df.index.name),
+                columns=self.df.columns,
+            )
+            frames = [frame for frame in (self.df, inserted) if not frame.empty]
+            df = pd.concat(frames) if len(frames) > 1 else inserted
+
+            # rows with missing values upcast the columns when concatenated
+            for label, dtype in self.df.dtypes.items():
+                if df[label].dtype != dtype:
+                    try:
+                        df[label] = df[label].astype(dtype)
+                    except (TypeError, ValueError):
+                        pass
+
+            self._replace(df)
+
+            for values in self._inserted.values():
+                values.clear()
+            self._inserted_ids = []
+            self._pending_ids.clear()
+
+        self._next_row_id = None
+        self.index.reset()
+
+    def _replace(self, df: pd.DataFrame) -> None:
+        """
+        Replace the dataframe with a new one, after rows are inserted.
+
+        If the dataframe was registered the registry is updated, so that other
+        connections see the new rows.
+        """
+        if registered_dataframes.get(self.uri) is self.df:
+            registered_dataframes[self.uri] = df
+        self.df = df
+        self.index.df = df
+
+    def commit(self) -> None:
+        self._flush()
 
-        self.df.loc[new_row_id] = row.values()
+    def close(self) -> None:
+        self._flush()
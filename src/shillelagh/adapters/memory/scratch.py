@@ -0,0 +1,820 @@
+"""
+An adapter for in-memory tables, shared by all the connections in a process.
+
+Tables are created on first use, with the columns declared in the URI, and can
+be used to stage intermediate results that are queried repeatedly:
+
+    🍀> INSERT INTO "scratch://staging?cols=id:int,site:str&sorted=id&hash=site"
+    ... SELECT id, site FROM some_table;
+    🍀> SELECT * FROM "scratch://staging" WHERE site = 'Diamond_St';
+
+"""
+
+import array
+import bisect
+import datetime
+import math
+import operator
+import threading
+import urllib.parse
+from collections.abc import Iterator
+from typing import Any, Callable, Optional
+
+from shillelagh.adapters.base import Adapter
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import (
+    Blob,
+    Boolean,
+    Date,
+    DateTime,
+    Duration,
+    Field,
+    Float,
+    Integer,
+    Order,
+    String,
+    Time,
+)
+from shillelagh.filters import (
+    Equal,
+    Filter,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    Like,
+    NotEqual,
+    Operator,
+    Range,
+)
+from shillelagh.lib import ReversedKey
+from shillelagh.typing import RequestedOrder, Row
+
+# number of rows converted to Python objects at a time
+CHUNK_SIZE = 10_000
+
+# deleted rows are removed from storage when there are more of them than live rows,
+# and at least this many
+COMPACTION_THRESHOLD = 1000
+
+SCALAR_FILTERS = [Equal, NotEqual, IsNull, IsNotNull]
+RANGE_FILTERS = [Range, Equal, NotEqual, IsNull, IsNotNull]
+RANGE_OPERATORS = {Operator.EQ, Operator.GE, Operator.GT, Operator.LE, Operator.LT}
+
+# name -> (field, filters, array typecode, Python type); columns without a typecode
+# are stored in lists
+TYPES: dict[str, tuple[type[Field], list[type[Filter]], Optional[str], type]] = {
+    "int": (Integer, RANGE_FILTERS, "q", int),
+    "float": (Float, RANGE_FILTERS, "d", float),
+    "bool": (Boolean, SCALAR_FILTERS, "b", bool),
+    "str": (String, [*RANGE_FILTERS, Like], None, str),
+    "bytes": (Blob, SCALAR_FILTERS, None, bytes),
+    "date": (Date, RANGE_FILTERS, None, datetime.date),
+    "time": (Time, RANGE_FILTERS, None, datetime.time),
+    "datetime": (DateTime, RANGE_FILTERS, None, datetime.datetime),
+    "duration": (Duration, RANGE_FILTERS, None, datetime.timedelta),
+}
+
+INDEX_TYPES = {"sorted", "hash"}
+
+
+class Column:
+    """
+    The values of a column.
+
+    Numbers and booleans are stored in typed arrays, with a separate mask of valid
+    (not null) values; other types are stored in lists.
+    """
+
+    __slots__ = ("name", "type_", "values", "valid")
+
+    def __init__(self, name: str, type_: str):
+        self.name = name
+        self.type_ = type_
+
+        _, _, typecode, _ = TYPES[type_]
+        self.values: Any = [] if typecode is None else array.array(typecode)
+        self.valid: Optional[bytearray] = None if typecode is None else bytearray()
+
+    def check(self, value: Any) -> None:
+        """
+        Check that a value can be stored in the column.
+        """
+        if value is None:
+            return
+
+        _, _, typecode, type_ = TYPES[self.type_]
+        try:
+            if typecode is None:
+                valid = isinstance(value, type_)
+            else:
+                valid = bool(array.array(typecode, [value]))
+        except (TypeError, OverflowError):
+            valid = False
+
+        if not valid:
+            raise ProgrammingError(f"Invalid value for column {self.name}: {value!r}")
+
+    def append(self, value: Any) -> None:
+        """
+        Append a value to the column, which should be checked first.
+        """
+        if self.valid is None:
+            self.values.append(value)
+        else:
+            self.values.append(0 if value is None else value)
+            self.valid.append(value is not None)
+
+    def set(self, position: int, value: Any) -> None:
+        """
+        Replace the value at a given position, which should be checked first.
+        """
+        if self.valid is None:
+            self.values[position] = value
+        else:
+            self.values[position] = 0 if value is None else value
+            self.valid[position] = value is not None
+
+    def get(self, position: int) -> Any:
+        """
+        Return the value at a given position.
+        """
+        return self.take([position])[0]
+
+    def take(self, positions: list[int]) -> list[Any]:
+        """
+        Return the values at given positions.
+        """
+        values = self.values
+        valid = self.valid
+        if valid is None:
+            return [values[position] for position in positions]
+        if self.type_ == "bool":
+            return [
+                bool(values[position]) if valid[position] else None
+                for position in positions
+            ]
+        return [values[position] if valid[position] else None for position in positions]
+
+    def compact(self, positions: list[int]) -> None:
+        """
+        Keep only the values at given positions.
+        """
+        if self.valid is None:
+            self.values = self.take(positions)
+        else:
+            self.values = array.array(
+                self.values.typecode,
+                (self.values[position] for position in positions),
+            )
+            self.valid = bytearray(self.valid[position] for position in positions)
+
+
+class HashIndex:
+    """
+    An index mapping values to the positions where they occur.
+
+    Used for equality filters. Nulls are not indexed.
+    """
+
+    __slots__ = ("positions",)
+
+    def __init__(self) -> None:
+        self.positions: dict[Any, set[int]] = {}
+
+    def add(self, value: Any, position: int) -> None:
+        """
+        Add a value to the index.
+        """
+        if value is not None:
+            self.positions.setdefault(value, set()).add(position)
+
+    def remove(self, value: Any, position: int) -> None:
+        """
+        Remove a value from the index.
+        """
+        if value is not None:
+            positions = self.positions[value]
+            positions.discard(position)
+            if not positions:
+                del self.positions[value]
+
+    def search(self, filter_: Filter) -> Optional[list[int]]:
+        """
+        Return the positions satisfying a filter, or ``None`` if it can't be used.
+        """
+        if not isinstance(filter_, Equal):
+            return None
+
+        try:
+            return sorted(self.positions.get(filter_.value, ()))
+        except TypeError:
+            # unhashable value
+            return None
+
+
+class SortedIndex:
+    """
+    An index with the values of a column in sorted order.
+
+    Used for equality and range filters, and to return rows sorted by the column
+    without sorting them. Entries are ``(value, position)`` tuples, so that they can
+    be found with a binary search; nulls are kept separately.
+    """
+
+    __slots__ = ("entries", "nulls")
+
+    def __init__(self) -> None:
+        self.entries: list[tuple[Any, int]] = []
+        self.nulls: set[int] = set()
+
+    def add(self, value: Any, position: int) -> None:
+        """
+        Add a value to the index.
+        """
+        if value is None:
+            self.nulls.add(position)
+        else:
+            bisect.insort(self.entries, (value, position))
+
+    def remove(self, value: Any, position: int) -> None:
+        """
+        Remove a value from the index.
+        """
+        if value is None:
+            self.nulls.discard(position)
+        else:
+            del self.entries[bisect.bisect_left(self.entries, (value, position))]
+
+    def search(self, filter_: Filter) -> Optional[list[int]]:
+        """
+        Return the positions satisfying a filter, in the order of the values.
+
+        Returns ``None`` if the index can't be used for the filter.
+        """
+        if isinstance(filter_, Equal):
+            start, end, include_start, include_end = (
+                filter_.value,
+                filter_.value,
+                True,
+                True,
+            )
+        elif isinstance(filter_, Range):
+            start, end, include_start, include_end = (
+                filter_.start,
+                filter_.end,
+                filter_.include_start,
+                filter_.include_end,
+            )
+        else:
+            return None
+
+        # ``(value,)`` sorts before and ``(value, math.inf)`` after every entry with
+        # the same value
+        try:
+            low = (
+                0
+                if start is None
+                else (
+                    bisect.bisect_left(self.entries, (start,))
+                    if include_start
+                    else bisect.bisect_right(self.entries, (start, math.inf))
+                )
+            )
+            high = (
+                len(self.entries)
+                if end is None
+                else (
+                    bisect.bisect_right(self.entries, (end, math.inf))
+                    if include_end
+                    else bisect.bisect_left(self.entries, (end,))
+                )
+            )
+        except TypeError:
+            # value can't be compared with the column
+            return None
+
+        return [position for _, position in self.entries[low:high]]
+
+    def ordered(self, descending: bool) -> list[int]:
+        """
+        Return all the positions, sorted by value.
+
+        Nulls are sorted first in ascending order and last in descending order, like
+        in SQLite.
+        """
+        nulls = sorted(self.nulls)
+        if descending:
+            return [position for _, position in reversed(self.entries)] + nulls
+        return nulls + [position for _, position in self.entries]
+
+
+def get_predicate(filter_: Filter) -> Callable[[Any], bool]:
+    """
+    Return a function that checks if a value satisfies a filter.
+
+    Like in SQL, nulls only satisfy ``IS NULL``, and values that can't be compared
+    with the filter don't satisfy it.
+    """
+    if isinstance(filter_, IsNull):
+        return lambda value: value is None
+    if isinstance(filter_, IsNotNull):
+        return lambda value: value is not None
+    if isinstance(filter_, Like):
+        match = filter_.regex.match
+        return lambda value: isinstance(value, str) and match(value) is not None
+
+    comparisons: list[tuple[Callable[[Any, Any], bool], Any]] = []
+    if isinstance(filter_, Equal):
+        comparisons.append((operator.eq, filter_.value))
+    elif isinstance(filter_, NotEqual):
+        comparisons.append((operator.ne, filter_.value))
+    elif isinstance(filter_, Range):
+        if filter_.start is not None:
+            comparisons.append(
+                (operator.ge if filter_.include_start else operator.gt, filter_.start),
+            )
+        if filter_.end is not None:
+            comparisons.append(
+                (operator.le if filter_.include_end else operator.lt, filter_.end),
+            )
+    else:
+        raise ProgrammingError(f"Invalid filter: {filter_}")
+
+    def predicate(value: Any) -> bool:
+        if value is None:
+            return False
+        try:
+            return all(compare(value, other) for compare, other in comparisons)
+        except TypeError:
+            return False
+
+    return predicate
+
+
+class ScratchTable:  # pylint: disable=too-many-instance-attributes
+    """
+    A table stored in memory, column by column.
+
+    Rows are addressed by their position in the columns; a dictionary maps row IDs
+    to positions. Deleted rows are marked with a row ID of -1, and removed when they
+    outnumber the live rows. All operations acquire the table lock, so the table can
+    be used from multiple threads.
+    """
+
+    __slots__ = (
+        "columns",
+        "row_ids",
+        "positions",
+        "sorted_indexes",
+        "hash_indexes",
+        "next_row_id",
+        "deleted",
+        "lock",
+    )
+
+    def __init__(self, types: dict[str, str]):
+        for type_ in types.values():
+            if type_ not in TYPES:
+                raise ProgrammingError(f"Invalid type: {type_}")
+
+        self.columns = {
+            column_name: Column(column_name, type_)
+            for column_name, type_ in types.items()
+        }
+        self.row_ids = array.array("q")
+        self.positions: dict[int, int] = {}
+        self.sorted_indexes: dict[str, SortedIndex] = {}
+        self.hash_indexes: dict[str, HashIndex] = {}
+        self.next_row_id = 0
+        self.deleted = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def types(self) -> dict[str, str]:
+        """
+        Return the type of each column.
+        """
+        return {
+            column_name: column.type_ for column_name, column in self.columns.items()
+        }
+
+    def _get_indexes(self, column_name: str) -> list[Any]:
+        """
+        Return all the indexes of a column.
+        """
+        return [
+            indexes[column_name]
+            for indexes in (self.sorted_indexes, self.hash_indexes)
+            if column_name in indexes
+        ]
+
+    def add_index(self, column_name: str, kind: str) -> None:
+        """
+        Build an index on a column, if it doesn't exist.
+        """
+        if column_name not in self.columns:
+            raise ProgrammingError(f"Invalid column: {column_name}")
+        if kind not in INDEX_TYPES:
+            raise ProgrammingError(f"Invalid index type: {kind}")
+
+        with self.lock:
+            indexes: dict[str, Any] = (
+                self.sorted_indexes if kind == "sorted" else self.hash_indexes
+            )
+            if column_name in indexes:
+                return
+
+            index = SortedIndex() if kind == "sorted" else HashIndex()
+            positions = list(self.positions.values())
+            values = self.columns[column_name].take(positions)
+            for value, position in zip(values, positions):
+                index.add(value, position)
+            indexes[column_name] = index
+
+    def insert(self, row: Row) -> int:
+        """
+        Insert a row, returning its row ID.
+        """
+        with self.lock:
+            row_id: Optional[int] = row.get("rowid")
+            if row_id is None:
+                row_id = self.next_row_id
+            elif row_id in self.positions:
+                raise ProgrammingError(f"Row ID {row_id} already exists")
+
+            # check all the values first, so that columns keep the same length
+            for column_name, column in self.columns.items():
+                column.check(row.get(column_name))
+
+            position = len(self.row_ids)
+            for column_name, column in self.columns.items():
+                value = row.get(column_name)
+                column.append(value)
+                for index in self._get_indexes(column_name):
+                    index.add(value, position)
+
+            self.row_ids.append(row_id)
+            self.positions[row_id] = position
+            self.next_row_id = max(self.next_row_id, row_id + 1)
+
+            return row_id
+
+    def delete(self, row_id: int) -> None:
+        """
+        Delete a row.
+        """
+        with self.lock:
+            position = self.positions.pop(row_id)
+            for column_name, column in self.columns.items():
+                for index in self._get_indexes(column_name):
+                    index.remove(column.get(position), position)
+            self.row_ids[position] = -1
+            self.deleted += 1
+
+            if self.deleted > max(len(self.positions), COMPACTION_THRESHOLD):
+                self.compact()
+
+    def update(self, row_id: int, row: Row) -> None:
+        """
+        Update the values of a row in place.
+        """
+        with self.lock:
+            position = self.positions[row_id]
+            for column_name, column in self.columns.items():
+                column.check(row.get(column_name))
+
+            for column_name, column in self.columns.items():
+                old = column.get(position)
+                new = row.get(column_name)
+                if old == new and type(old) is type(new):
+                    continue
+
+                column.set(position, new)
+                for index in self._get_indexes(column_name):
+                    index.remove(old, position)
+                    index.add(new, position)
+
+    def compact(self) -> None:
+        """
+        Remove deleted rows from storage, and rebuild the indexes.
+        """
+        with self.lock:
+            positions = list(self.positions.values())
+            for column in self.columns.values():
+                column.compact(positions)
+            self.row_ids = array.array(
+                "q",
+                (self.row_ids[position] for position in positions),
+            )
+            self.positions = {row_id: i for i, row_id in enumerate(self.row_ids)}
+            self.deleted = 0
+
+            kinds = [(column_name, "sorted") for column_name in self.sorted_indexes]
+            kinds.extend((column_name, "hash") for column_name in self.hash_indexes)
+            self.sorted_indexes = {}
+            self.hash_indexes = {}
+            for column_name, kind in kinds:
+                self.add_index(column_name, kind)
+
+    def _search(self, bounds: dict[str, Filter]) -> tuple[list[int], dict[str, Filter]]:
+        """
+        Find candidate positions using the best index available.
+
+        Hash indexes are preferred to sorted indexes. Returns the positions, in
+        storage order, and the filters that still need to be applied.
+        """
+        for indexes in (self.hash_indexes, self.sorted_indexes):
+            for column_name, filter_ in bounds.items():
+                if column_name in indexes:
+                    positions = indexes[column_name].search(filter_)
+                    if positions is not None:
+                        remaining = {
+                            other: other_filter
+                            for other, other_filter in bounds.items()
+                            if other != column_name
+                        }
+                        return sorted(positions), remaining
+
+        return list(self.positions.values()), bounds
+
+    def _sort(
+        self,
+        positions: list[int],
+        order: list[tuple[str, RequestedOrder]],
+    ) -> list[int]:
+        """
+        Sort positions by the values of one or more columns.
+        """
+        keys: list[list[Any]] = []
+        for column_name, requested_order in order:
+            values = self.columns[column_name].take(positions)
+            # nulls sort first, like in SQLite
+            if requested_order == Order.DESCENDING:
+                keys.append(
+                    [ReversedKey((value is not None, value)) for value in values]
+                )
+            else:
+                keys.append([(value is not None, value) for value in values])
+
+        return [decorated[-1] for decorated in sorted(zip(*keys, positions))]
+
+    def select(
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+    ) -> list[int]:
+        """
+        Return the row IDs of the rows satisfying filters, in a given order.
+        """
+        with self.lock:
+            # read the rows in the order of a sorted index, if available
+            if len(order) == 1 and (column_name := order[0][0]) in self.sorted_indexes:
+                index = self.sorted_indexes[column_name]
+                descending = order[0][1] == Order.DESCENDING
+                remaining = dict(bounds)
+                positions: Optional[list[int]] = (
+                    index.search(remaining.pop(column_name))
+                    if column_name in bounds
+                    else None
+                )
+                if positions is None:
+                    positions, remaining = index.ordered(descending), bounds
+                elif descending:
+                    positions.reverse()
+                order = []
+            else:
+                positions, remaining = self._search(bounds)
+
+            for column_name, filter_ in remaining.items():
+                predicate = get_predicate(filter_)
+                values = self.columns[column_name].take(positions)
+                positions = [
+                    position
+                    for position, value in zip(positions, values)
+                    if predicate(value)
+                ]
+
+            if order:
+                positions = self._sort(positions, order)
+
+            return [self.row_ids[position] for position in positions]
+
+    def get_rows(
+        self,
+        row_ids: list[int],
+        column_names: list[str],
+        chunk_size: int = CHUNK_SIZE,
+    ) -> Iterator[Row]:
+        """
+        Return rows given their IDs.
+
+        Rows are read in chunks, so the table is only locked while each chunk is
+        built. Rows deleted in the meantime are skipped.
+        """
+        names = ["rowid", *column_names]
+        for i in range(0, len(row_ids), chunk_size):
+            with self.lock:
+                chunk = [
+                    row_id
+                    for row_id in row_ids[i : i + chunk_size]
+                    if row_id in self.positions
+                ]
+                positions = [self.positions[row_id] for row_id in chunk]
+                values = [
+                    chunk,
+                    *(
+                        self.columns[column_name].take(positions)
+                        for column_name in column_names
+                    ),
+                ]
+
+            for row in zip(*values):
+                yield dict(zip(names, row))
+
+
+# tables are shared by all the connections in the process
+tables: dict[str, ScratchTable] = {}
+tables_lock = threading.Lock()
+
+
+def parse_list(query_string: dict[str, list[str]], key: str) -> list[str]:
+    """
+    Return a list of comma-separated values from a query string.
+    """
+    return [
+        value
+        for values in query_string.get(key, [])
+        for value in values.split(",")
+        if value
+    ]
+
+
+class ScratchMemory(Adapter):
+    """
+    An adapter for in-memory tables, shared by all the connections in a process:
+
+        🍀> SELECT * FROM "scratch://staging?cols=id:int,site:str&hash=site";
+
+    Columns are declared with ``cols``, and are only needed when the table is first
+    used. The supported types are ``int``, ``float``, ``bool``, ``str``, ``bytes``,
+    ``date``, ``time``, ``datetime`` and ``duration``. Indexes can be declared with
+    ``sorted`` (for range filters and sorting) and ``hash`` (for equality filters).
+
+    Changes are applied immediately, and are visible to all connections.
+    """
+
+    # tables are shared between connections
+    safe = False
+
+    supports_limit = True
+    supports_offset = True
+    supports_requested_columns = True
+
+    @staticmethod
+    def supports(uri: str, fast: bool = True, **kwargs: Any) -> Optional[bool]:
+        parsed = urllib.parse.urlparse(uri)
+        return parsed.scheme == "scratch"
+
+    @staticmethod
+    def parse_uri(uri: str) -> tuple[str, dict[str, str], list[str], list[str]]:
+        parsed = urllib.parse.urlparse(uri)
+        query_string = urllib.parse.parse_qs(parsed.query)
+
+        types = {}
+        for column in parse_list(query_string, "cols"):
+            column_name, _, type_ = column.partition(":")
+            types[column_name] = type_
+
+        return (
+            parsed.netloc + parsed.path,
+            types,
+            parse_list(query_string, "sorted"),
+            parse_list(query_string, "hash"),
+        )
+
+    def __init__(
+        self,
+        name: str,
+        types: dict[str, str],
+        sorted_indexes: list[str],
+        hash_indexes: list[str],
+    ):
+        with tables_lock:
+            table = tables.get(name)
+            if table is None:
+                if not types:
+                    raise ProgrammingError(f"Table {name} does not exist")
+                table = ScratchTable(types)
+            elif types and types != table.types:
+                raise ProgrammingError(
+                    f"Table {name} already exists with different columns",
+                )
+
+            for column_name in sorted_indexes:
+                table.add_index(column_name, "sorted")
+            for column_name in hash_indexes:
+                table.add_index(column_name, "hash")
+
+            tables[name] = table
+
+        super().__init__()
+
+        self.name = name
+        self.table = table
+        self.columns = {
+            column_name: field(filters=filters, order=Order.ANY, exact=True)
+            for column_name, (field, filters, _, _) in (
+                (column_name, TYPES[type_])
+                for column_name, type_ in table.types.items()
+            )
+        }
+
+    def get_columns(self) -> dict[str, Field]:
+        return self.columns
+
+    def get_cost(
+        self,
+        filtered_columns: list[tuple[str, Operator]],
+        order: list[tuple[str, RequestedOrder]],
+    ) -> float:
+        """
+        Estimate the query cost from the indexes that can be used.
+
+        An equality filter on a hash index costs 1, and filters on a sorted index
+        cost a binary search; other filters require a scan. Sorting is free when
+        ordering by a single column with a sorted index.
+        """
+        rows = max(len(self.table), 1)
+        search = math.log2(rows + 1)
+
+        costs = []
+        for column_name, operator_ in filtered_columns:
+            if operator_ == Operator.EQ and column_name in self.table.hash_indexes:
+                costs.append(1.0)
+            elif (
+                operator_ in RANGE_OPERATORS
+                and column_name in self.table.sorted_indexes
+            ):
+                costs.append(search)
+            else:
+                costs.append(float(rows))
+
+        # only the cheapest index is used, and the other filters are applied to the
+        # rows it returns
+        cost = min(costs, default=float(rows)) * max(len(costs), 1)
+
+        if order and not (len(order) == 1 and order[0][0] in self.table.sorted_indexes):
+            cost += rows * search * len(order)
+
+        return cost
+
+    def get_data(  # pylint: disable=too-many-arguments
+        self,
+        bounds: dict[str, Filter],
+        order: list[tuple[str, RequestedOrder]],
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        requested_columns: Optional[set[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Row]:
+        if any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+            return
+
+        row_ids = self.table.select(bounds, order)
+
+        start = offset or 0
+        end = None if limit is None else start + limit
+        column_names = [
+            column_name
+            for column_name in self.columns
+            if requested_columns is None or column_name in requested_columns
+        ]
+
+        yield from self.table.get_rows(row_ids[start:end], column_names)
+
+    def insert_data(self, row: Row) -> int:
+        return self.table.insert(row)
+
+    def delete_data(self, row_id: int) -> None:
+        self.table.delete(row_id)
+
+    def update_data(self, row_id: int, row: Row) -> None:
+        # the row_id might change on an update
+        new_row_id = row["rowid"]
+        if new_row_id != row_id:
+            with self.table.lock:
+                self.table.delete(row_id)
+                self.table.insert(row)
+        else:
+            self.table.update(row_id, row)
+
+    def vacuum(self) -> None:
+        self.table.compact()
+
+    def drop_table(self) -> None:
+        with tables_lock:
+            if tables.get(self.name) is self.table:
+                del tables[self.name]
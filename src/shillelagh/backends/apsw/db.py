@@ -4,6 +4,7 @@ A DB API 2.0 wrapper for APSW.
 """
 
 import datetime
+import itertools
 import logging
 import re
 from collections.abc import Iterator
@@ -94,6 +95,11 @@ sqlite_version_info = tuple(
 
 NO_SUCH_TABLE = re.compile("no such table: (?P<uri>.*)")
 
+# number of rows converted together, one column at a time; batches start with a
+# single row and double up to the maximum, so the first rows are returned without
+# fetching more rows than needed from the adapters
+CONVERT_BATCH_SIZE = 1000
+
 CURSOR_METHOD = TypeVar("CURSOR_METHOD", bound=Callable[..., Any])
 
 _logger = logging.getLogger(__name__)
@@ -256,12 +262,19 @@ class APSWCursor(Cursor):  # pylint: disable=too-many-instance-attributes
         if not self.description:
             return  # pragma: no cover
 
-        for row in cursor:
-            yield tuple(
-                # convert from SQLite types to native Python types
-                type_map[desc[1].type]().parse(col)
-                for col, desc in zip(row, self.description)
-            )
+        # the description is only final once the first row is fetched
+        fields: Optional[list[Field]] = None
+        size = 1
+        while batch := list(itertools.islice(cursor, size)):
+            if fields is None:
+                fields = [type_map[desc[1].type].shared() for desc in self.description]
+
+            # convert from SQLite types to native Python types, one column at a time
+            columns = [
+                field.parse_many(column) for field, column in zip(fields, zip(*batch))
+            ]
+            yield from zip(*columns)
+            size = min(size * 2, CONVERT_BATCH_SIZE)
 
     def _create_table(self, uri: str) -> None:
         """
@@ -379,6 +392,11 @@ class APSWConnection(
                 self._adapter_kwargs,
                 adapters,
             ),
+            "vacuum": partial(
+                functions.vacuum,
+                self._adapter_kwargs,
+                adapters,
+            ),
             "date_trunc": functions.date_trunc,
         }
         if not safe:
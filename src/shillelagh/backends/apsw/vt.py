@@ -125,10 +125,10 @@ def convert_rows_to_sqlite(
     the conversion (not the adapter fields).
     """
     converters = {
-        column_name: type_map[column_field.type]().format
+        column_name: type_map[column_field.type].shared().format
         for column_name, column_field in columns.items()
     }
-    converters["rowid"] = RowID().format
+    converters["rowid"] = RowID.shared().format
     for row in rows:
         yield {
             column_name: converters[column_name](value)
@@ -148,10 +148,10 @@ def convert_rows_from_sqlite(
     the conversion (not the adapter fields).
     """
     converters = {
-        column_name: type_map[column_field.type]().parse
+        column_name: type_map[column_field.type].shared().parse
         for column_name, column_field in columns.items()
     }
-    converters["rowid"] = RowID().parse
+    converters["rowid"] = RowID.shared().parse
     for row in rows:
         yield {
             column_name: converters[column_name](value)
@@ -184,7 +184,7 @@ def get_all_bounds(
         column_type = columns[column_name]
 
         # convert constraint to native Python type, then to DB specific type
-        constraint = type_map[column_type.type]().parse(constraint)
+        constraint = type_map[column_type.type].shared().parse(constraint)
         value = column_type.format(constraint)
 
         all_bounds[column_name].add((operator, value))
@@ -319,6 +319,25 @@ class VTTable:
         # the index as JSON in ``index_name``
         index_number = 42
 
+        # a column has a single filter, so when its operators can't be combined (eg,
+        # ``LIKE`` and the range SQLite derives from it) only the operators of the
+        # filter accepting most of them are used, and SQLite evaluates the others
+        operators: DefaultDict[int, set[Operator]] = defaultdict(set)
+        for column_index, sqlite_index_constraint in constraints:
+            if column_index >= 0 and sqlite_index_constraint in operator_map:
+                operators[column_index].add(operator_map[sqlite_index_constraint])
+        accepted_operators = {
+            column_index: max(
+                (
+                    column_operators & class_.operators
+                    for class_ in column_types[column_index].filters
+                ),
+                key=len,
+                default=set(),
+            )
+            for column_index, column_operators in operators.items()
+        }
+
         indexes: list[Index] = []
         constraints_used: list[Constraint] = []
         filter_index = 0
@@ -335,15 +354,13 @@ class VTTable:
                 indexes.append((LIMIT_OFFSET_INDEX, sqlite_index_constraint))
             # column operator
             elif column_index >= 0:
-                column_name = column_names[column_index]
-                column_type = column_types[column_index]
-                for class_ in column_type.filters:
-                    if operator in class_.operators:
-                        filtered_columns.append((column_name, operator))
-                        constraints_used.append((filter_index, column_type.exact))
-                        filter_index += 1
-                        indexes.append((column_index, sqlite_index_constraint))
-                        break
+                if operator in accepted_operators.get(column_index, set()):
+                    filtered_columns.append((column_names[column_index], operator))
+                    constraints_used.append(
+                        (filter_index, column_types[column_index].exact),
+                    )
+                    filter_index += 1
+                    indexes.append((column_index, sqlite_index_constraint))
                 else:
                     constraints_used.append(None)
 
@@ -471,6 +488,12 @@ class VTTable:
 
     Destroy = Disconnect
 
+    def Commit(self) -> None:
+        """
+        Commit the current transaction.
+        """
+        self.adapter.commit()
+
     def UpdateInsertRow(self, rowid: Optional[int], fields: tuple[Any, ...]) -> int:
         """
         Insert a row with the specified rowid.
@@ -116,6 +116,9 @@ class MulticornForeignDataWrapper(ForeignDataWrapper):
         self.adapter.update_row(rowid, newvalues)
         return newvalues
 
+    def commit(self) -> None:
+        self.adapter.commit()
+
     @property
     def rowid_column(self):
         return "rowid"
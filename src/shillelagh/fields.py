@@ -1,10 +1,11 @@
+# pylint: disable=too-many-lines
 """
 Fields representing columns of different types and capabilities.
 """
 
 import datetime
 import decimal
-from collections.abc import Collection
+from collections.abc import Collection, Iterable
 from enum import Enum
 from typing import Any, Generic, Optional, TypeVar, Union, cast
 
@@ -53,6 +54,9 @@ class Order(Enum):
     ANY = "any"
 
 
+_shared_fields: dict[tuple[Any, ...], "Field"] = {}
+
+
 class Field(Generic[Internal, External]):
     """
     Represents a column in a table.
@@ -186,6 +190,13 @@ class Field(Generic[Internal, External]):
     # Allowing 3rd party libraries to determine that ``Integer`` represents a number.
     db_api_type = "DBAPIType"
 
+    # NumPy dtype used by ``to_array``, for fields with a fixed-width type
+    array_dtype: Optional[str] = None
+
+    # fields are created for every column of every table, so we use slots to keep
+    # them compact; subclasses can still define new attributes
+    __slots__ = ("filters", "order", "exact")
+
     def __init__(
         self,
         filters: Optional[Collection[FilterType]] = None,
@@ -212,6 +223,37 @@ class Field(Generic[Internal, External]):
             and self.exact == other.exact,
         )
 
+    def __hash__(self) -> int:
+        # not cached, since some adapters modify the order of the fields, eg, when
+        # new rows are inserted
+        return hash((self.__class__, frozenset(self.filters), self.order, self.exact))
+
+    @classmethod
+    def shared(
+        cls,
+        filters: Optional[Collection[FilterType]] = None,
+        order: Order = Order.NONE,
+        exact: bool = False,
+    ) -> "Field":
+        """
+        Return a shared instance of the field.
+
+        Fields are often created only to call ``parse`` or ``format``; this returns a
+        single instance per ``(type, filters, order, exact)``, avoiding the
+        allocation::
+
+            >>> Integer.shared() is Integer.shared()
+            True
+
+        Shared instances must not be modified.
+        """
+        key = (cls, tuple(filters or ()), order, exact)
+        try:
+            return _shared_fields[key]
+        except KeyError:
+            field = _shared_fields[key] = cls(filters, order, exact)
+            return field
+
     def parse(
         self,
         value: Optional[Internal],
@@ -247,6 +289,59 @@ class Field(Generic[Internal, External]):
         """
         return cast(Optional[Internal], value)
 
+    def parse_many(
+        self,
+        values: Iterable[Optional[Internal]],
+    ) -> list[Optional[External]]:
+        """
+        Convert a column of values from a DB type to a native Python type.
+
+        This is equivalent to calling ``parse`` on each value, but fields can override
+        it with a faster implementation that converts the whole column at once.
+        """
+        if type(self).parse is Field.parse:
+            return cast(list[Optional[External]], list(values))
+
+        parse = self.parse
+        return [parse(value) for value in values]
+
+    def format_many(
+        self,
+        values: Iterable[Optional[External]],
+    ) -> list[Optional[Internal]]:
+        """
+        Convert a column of values from a native Python type to a DB type.
+
+        This should be the opposite of ``parse_many``.
+        """
+        if type(self).format is Field.format:
+            return cast(list[Optional[Internal]], list(values))
+
+        format_ = self.format
+        return [format_(value) for value in values]
+
+    def to_array(self, values: Iterable[Optional[Internal]]) -> Any:
+        """
+        Parse a column of values into an array.
+
+        Fields with a fixed-width type (integers, floats and booleans) return a typed
+        NumPy array when NumPy is installed. Other fields, columns with nulls, or values
+        that don't fit in the array type return a list, like ``parse_many``.
+        """
+        parsed = self.parse_many(values)
+        if self.array_dtype is None or None in parsed:
+            return parsed
+
+        try:
+            import numpy as np  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return parsed
+
+        try:
+            return np.array(parsed, dtype=self.array_dtype)
+        except OverflowError:
+            return parsed
+
     def quote(self, value: Optional[Internal]) -> str:
         """
         Quote values.
@@ -274,6 +369,10 @@ class Integer(Field[int, int]):
     type = "INTEGER"
     db_api_type = "NUMBER"
 
+    array_dtype = "int64"
+
+    __slots__ = ()
+
 
 class StringInteger(Field[str, int]):
     """
@@ -286,6 +385,10 @@ class StringInteger(Field[str, int]):
     type = "INTEGER"
     db_api_type = "NUMBER"
 
+    array_dtype = "int64"
+
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[int]:
         return value if value is None else int(value)
 
@@ -304,6 +407,8 @@ class RowID(Integer):
 
     db_api_type = "ROWID"
 
+    __slots__ = ()
+
 
 class Float(Field[float, float]):
     """A float."""
@@ -311,6 +416,10 @@ class Float(Field[float, float]):
     type = "REAL"
     db_api_type = "NUMBER"
 
+    array_dtype = "float64"
+
+    __slots__ = ()
+
 
 class String(Field[str, str]):
     """A string."""
@@ -318,6 +427,8 @@ class String(Field[str, str]):
     type = "TEXT"
     db_api_type = "STRING"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[str]) -> str:
         if value is None:
             return "NULL"
@@ -336,6 +447,8 @@ class Date(Field[datetime.date, datetime.date]):
     type = "DATE"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[datetime.date]) -> str:
         if value is None:
             return "NULL"
@@ -355,6 +468,8 @@ class ISODate(Field[str, datetime.date]):
     type = "DATE"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.date]:
         if value is None:
             return None
@@ -382,6 +497,8 @@ class StringDate(ISODate):
     A more permissive date format.
     """
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.date]:
         if value is None:
             return None
@@ -405,6 +522,8 @@ class Time(Field[datetime.time, datetime.time]):
     type = "TIME"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[datetime.time]) -> str:
         if value is None:
             return "NULL"
@@ -424,6 +543,8 @@ class ISOTime(Field[str, datetime.time]):
     type = "TIME"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.time]:
         if value is None:
             return None
@@ -452,6 +573,8 @@ class StringTime(ISOTime):
     A more permissive time format.
     """
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.time]:
         if value is None:
             return None
@@ -478,6 +601,8 @@ class DateTime(Field[datetime.datetime, datetime.datetime]):
     type = "TIMESTAMP"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[datetime.datetime]) -> str:
         if value is None:
             return "NULL"
@@ -498,6 +623,8 @@ class ISODateTime(Field[str, datetime.datetime]):
     type = "TIMESTAMP"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.datetime]:
         if value is None:
             return None
@@ -514,6 +641,51 @@ class ISODateTime(Field[str, datetime.datetime]):
 
         return timestamp
 
+    def parse_many(
+        self,
+        values: Iterable[Optional[str]],
+    ) -> list[Optional[datetime.datetime]]:
+        """
+        Parse a column of timestamps.
+
+        Values are parsed with the native ``datetime.datetime.fromisoformat``, falling
+        back to ``parse`` when it fails. Since values in a column usually share the
+        same format, once that happens the rest of the column is parsed with ``parse``.
+        Repeated values are only parsed once.
+        """
+        cache: dict[str, Optional[datetime.datetime]] = {}
+        fromisoformat = datetime.datetime.fromisoformat
+        parse = self.parse
+        native = True
+
+        parsed: list[Optional[datetime.datetime]] = []
+        for value in values:
+            if value is None:
+                parsed.append(None)
+                continue
+
+            if value in cache:
+                parsed.append(cache[value])
+                continue
+
+            timestamp: Optional[datetime.datetime]
+            if native:
+                try:
+                    timestamp = fromisoformat(value)
+                except ValueError:
+                    native = False
+                    timestamp = parse(value)
+                else:
+                    if timestamp.tzinfo is not None:
+                        timestamp = timestamp.astimezone(datetime.timezone.utc)
+            else:
+                timestamp = parse(value)
+
+            cache[value] = timestamp
+            parsed.append(timestamp)
+
+        return parsed
+
     def format(self, value: Optional[datetime.datetime]) -> Optional[str]:
         if value is None:
             return None
@@ -539,6 +711,8 @@ class FastISODateTime(ISODateTime):
     arbitrary ISO 8601 strings. It's used for serializing and deserializing into SQLite.
     """
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.datetime]:
         if value is None:
             return None
@@ -561,6 +735,8 @@ class StringDateTime(ISODateTime):
     A more permissive datetime format.
     """
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.datetime]:
         if value is None:
             return None
@@ -586,6 +762,8 @@ class Duration(Field[datetime.timedelta, datetime.timedelta]):
     type = "DURATION"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
 
 class StringDuration(Field[str, datetime.timedelta]):
     """
@@ -597,6 +775,8 @@ class StringDuration(Field[str, datetime.timedelta]):
     type = "DURATION"
     db_api_type = "DATETIME"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[datetime.timedelta]:
         if value is None:
             return None
@@ -641,6 +821,8 @@ class Blob(Field[bytes, bytes]):
     type = "BLOB"
     db_api_type = "BINARY"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[bytes]) -> str:
         if value is None:
             return "NULL"
@@ -658,6 +840,8 @@ class StringBlob(Field[str, bytes]):
     type = "BLOB"
     db_api_type = "BINARY"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[bytes]:
         if value is None:
             return None
@@ -680,6 +864,10 @@ class Boolean(Field[bool, bool]):
     type = "BOOLEAN"
     db_api_type = "NUMBER"
 
+    array_dtype = "bool"
+
+    __slots__ = ()
+
     def quote(self, value: Optional[bool]) -> str:
         if value is None:
             return "NULL"
@@ -697,6 +885,10 @@ class StringBoolean(Field[str, bool]):
     type = "BOOLEAN"
     db_api_type = "NUMBER"
 
+    array_dtype = "bool"
+
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[bool]:
         if value is None:
             return None
@@ -740,6 +932,10 @@ class IntBoolean(Field[int, bool]):
     type = "BOOLEAN"
     db_api_type = "NUMBER"
 
+    array_dtype = "bool"
+
+    __slots__ = ()
+
     def parse(self, value: Optional[int]) -> Optional[bool]:
         if value is None:
             return None
@@ -764,6 +960,8 @@ class Decimal(Field[decimal.Decimal, decimal.Decimal]):
     type = "DECIMAL"
     db_api_type = "NUMBER"
 
+    __slots__ = ()
+
     def quote(self, value: Optional[decimal.Decimal]) -> str:
         if value is None:
             return "NULL"
@@ -778,6 +976,8 @@ class StringDecimal(Field[str, decimal.Decimal]):
     type = "DECIMAL"
     db_api_type = "NUMBER"
 
+    __slots__ = ()
+
     def parse(self, value: Optional[str]) -> Optional[decimal.Decimal]:
         if value is None:
             return None
@@ -788,6 +988,19 @@ class StringDecimal(Field[str, decimal.Decimal]):
             return None
         return str(value)
 
+    def parse_many(
+        self,
+        values: Iterable[Optional[str]],
+    ) -> list[Optional[decimal.Decimal]]:
+        to_decimal = decimal.Decimal
+        return [None if value is None else to_decimal(value) for value in values]
+
+    def format_many(
+        self,
+        values: Iterable[Optional[decimal.Decimal]],
+    ) -> list[Optional[str]]:
+        return [None if value is None else str(value) for value in values]
+
     def quote(self, value: Optional[str]) -> str:
         if value is None:
             return "NULL"
@@ -806,6 +1019,8 @@ class Unknown(Field[Any, Any]):
     type = "TEXT"
     db_api_type = "STRING"
 
+    __slots__ = ()
+
     def quote(self, value: Any) -> Any:
         if value is None:
             return "NULL"
@@ -47,6 +47,8 @@ class Endpoint:
     interval. The second endpoint represents infinity in this case.
     """
 
+    __slots__ = ("value", "include", "side")
+
     def __init__(self, value: Any, include: bool, side: Side):
         self.value = value
         self.include = include
@@ -58,6 +60,9 @@ class Endpoint:
 
         return self.value == other.value and self.include == other.include
 
+    def __hash__(self) -> int:
+        return hash((self.value, self.include))
+
     def __gt__(self, other: Any) -> bool:  # pylint: disable=too-many-return-statements
         if not isinstance(other, Endpoint):
             return NotImplemented
@@ -128,10 +133,61 @@ def get_endpoints_from_operation(
 class Filter:
     """
     A filter representing a SQL predicate.
+
+    Filters are immutable and hashable, so they can be used as cache keys. The
+    hash is computed once, from the values returned by ``_key``. Attributes can
+    only be set once, in ``__init__``, so that the cached hash remains valid.
     """
 
+    __slots__ = ("_hash",)
+
     operators: set[Operator] = set()
 
+    def _key(self) -> tuple[Any, ...]:
+        """
+        Return the values that identify the filter.
+        """
+        return ()
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ != self.__class__:
+            return NotImplemented
+
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            # pylint: disable=attribute-defined-outside-init
+            self._hash: int = hash((self.__class__, self._key()))
+            return self._hash
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if hasattr(self, name):
+            raise AttributeError(
+                f"Cannot modify attribute {name!r} of immutable {self.__class__.__name__}",
+            )
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(
+            f"Cannot delete attribute {name!r} of immutable {self.__class__.__name__}",
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the hash is not pickled, since the hash of strings changes across processes
+        return {
+            name: getattr(self, name)
+            for class_ in self.__class__.__mro__
+            for name in getattr(class_, "__slots__", ())
+            if name != "_hash" and hasattr(self, name)
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
     @classmethod
     def build(cls, operations: set[tuple[Operator, Any]]) -> "Filter":
         """
@@ -164,6 +220,8 @@ class Impossible(Filter):
     Custom Filter returned when impossible conditions are passed.
     """
 
+    __slots__ = ()
+
     @classmethod
     def build(cls, operations: set[tuple[Operator, Any]]) -> Filter:
         return Impossible()
@@ -171,12 +229,6 @@ class Impossible(Filter):
     def check(self, value: Any) -> bool:
         return False
 
-    def __eq__(self, other: Any) -> bool:
-        if not isinstance(other, Impossible):
-            return NotImplemented
-
-        return True
-
     def __repr__(self) -> str:
         return "1 = 0"
 
@@ -186,6 +238,8 @@ class IsNull(Filter):
     Filter for ``IS NULL``.
     """
 
+    __slots__ = ()
+
     operators: set[Operator] = {Operator.IS_NULL}
 
     @classmethod
@@ -195,12 +249,6 @@ class IsNull(Filter):
     def check(self, value: Any) -> bool:
         return value is None
 
-    def __eq__(self, other: Any) -> bool:
-        if not isinstance(other, IsNull):
-            return NotImplemented
-
-        return True
-
     def __repr__(self) -> str:
         return "IS NULL"
 
@@ -210,6 +258,8 @@ class IsNotNull(Filter):
     Filter for ``IS NOT NULL``.
     """
 
+    __slots__ = ()
+
     operators: set[Operator] = {Operator.IS_NOT_NULL}
 
     @classmethod
@@ -219,12 +269,6 @@ class IsNotNull(Filter):
     def check(self, value: Any) -> bool:
         return value is not None
 
-    def __eq__(self, other: Any) -> bool:
-        if not isinstance(other, IsNotNull):
-            return NotImplemented
-
-        return True
-
     def __repr__(self) -> str:
         return "IS NOT NULL"
 
@@ -234,6 +278,8 @@ class Equal(Filter):
     Equality comparison.
     """
 
+    __slots__ = ("value",)
+
     operators: set[Operator] = {
         Operator.EQ,
     }
@@ -241,6 +287,9 @@ class Equal(Filter):
     def __init__(self, value: Any):
         self.value = value
 
+    def _key(self) -> tuple[Any, ...]:
+        return (self.value,)
+
     @classmethod
     def build(cls, operations: set[tuple[Operator, Any]]) -> Filter:
         values = {value for operator, value in operations}
@@ -261,6 +310,8 @@ class NotEqual(Filter):
     Inequality comparison.
     """
 
+    __slots__ = ("value",)
+
     operators: set[Operator] = {
         Operator.NE,
     }
@@ -268,6 +319,9 @@ class NotEqual(Filter):
     def __init__(self, value: Any):
         self.value = value
 
+    def _key(self) -> tuple[Any, ...]:
+        return (self.value,)
+
     @classmethod
     def build(cls, operations: set[tuple[Operator, Any]]) -> Filter:
         values = {value for operator, value in operations}
@@ -288,6 +342,8 @@ class Like(Filter):
     Substring searches.
     """
 
+    __slots__ = ("value", "regex")
+
     operators: set[Operator] = {
         Operator.LIKE,
     }
@@ -299,6 +355,9 @@ class Like(Filter):
             re.IGNORECASE,
         )
 
+    def _key(self) -> tuple[Any, ...]:
+        return (self.value,)
+
     @classmethod
     def build(cls, operations: set[tuple[Operator, Any]]) -> Filter:
         # we only accept a single value
@@ -334,6 +393,8 @@ class Range(Filter):
 
     """
 
+    __slots__ = ("start", "end", "include_start", "include_end")
+
     def __init__(
         self,
         start: Optional[Any] = None,
@@ -354,16 +415,8 @@ class Range(Filter):
         Operator.LT,
     }
 
-    def __eq__(self, other: Any):
-        if not isinstance(other, Range):
-            return NotImplemented
-
-        return (
-            self.start == other.start
-            and self.end == other.end
-            and self.include_start == other.include_start
-            and self.include_end == other.include_end
-        )
+    def _key(self) -> tuple[Any, ...]:
+        return (self.start, self.end, self.include_start, self.include_end)
 
     def __add__(self, other: Any) -> Filter:
         if not isinstance(other, Range):
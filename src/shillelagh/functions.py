@@ -22,7 +22,7 @@ if sys.version_info < (3, 10):
 else:
     from importlib.metadata import distribution
 
-__all__ = ["upgrade", "sleep", "get_metadata", "version", "date_trunc"]
+__all__ = ["upgrade", "sleep", "get_metadata", "vacuum", "version", "date_trunc"]
 
 
 def upgrade(target_version: str) -> str:
@@ -133,6 +133,26 @@ def get_metadata(
     )
 
 
+def vacuum(
+    adapter_kwargs: dict[str, dict[str, Any]],
+    adapters: list[type[Adapter]],
+    uri: str,
+) -> None:
+    """
+    Remove deleted rows from a given table.
+
+    Some adapters only mark rows as deleted, removing them from time to time. This
+    function forces them to be removed::
+
+        sql> SELECT VACUUM("test.csv");
+
+    """
+    adapter, args, kwargs = find_adapter(uri, adapter_kwargs, adapters)
+    instance = adapter(*args, **kwargs)
+    instance.vacuum()
+    instance.close()
+
+
 def version() -> str:
     """
     Return the current version of Shillelagh.
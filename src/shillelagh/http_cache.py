@@ -0,0 +1,282 @@
+"""
+Backends for the HTTP cache, with size limits and statistics.
+"""
+
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+import requests_cache
+from requests_cache.backends import BaseCache, FileCache, SQLiteCache
+from requests_cache.backends.filesystem import FileDict
+from requests_cache.backends.sqlite import SQLiteDict
+from requests_cache.serializers import SerializerPipeline, Stage
+from requests_cache.serializers.preconf import pickle_serializer
+
+_logger = logging.getLogger(__name__)
+
+BACKENDS = {"sqlite", "memory", "filesystem"}
+
+# responses stored in the filesystem are compressed
+compressed_serializer = SerializerPipeline(
+    [*pickle_serializer.stages, Stage(zlib, dumps="compress", loads="decompress")],
+    name="pkl_zlib",
+    is_binary=True,
+)
+
+
+class CacheStats:
+    """
+    Statistics of an HTTP cache.
+
+    ``stale`` counts the expired responses served while they're revalidated, which
+    are also counted as hits.
+    """
+
+    __slots__ = ("bytes", "entries", "evictions", "hits", "lock", "misses", "stale")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.entries = 0
+        self.bytes = 0
+
+    def record(self, response: requests.Response) -> None:
+        """
+        Record a response returned by a session.
+        """
+        with self.lock:
+            if getattr(response, "from_cache", False):
+                self.hits += 1
+                if getattr(response, "is_expired", False):
+                    self.stale += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self) -> dict[str, int]:
+        """
+        Return the statistics as a dictionary.
+        """
+        with self.lock:
+            return {
+                name: getattr(self, name) for name in self.__slots__ if name != "lock"
+            }
+
+
+class BoundedCache(BaseCache):  # pylint: disable=abstract-method, too-many-instance-attributes
+    """
+    A cache backend with a maximum size.
+
+    The storage of another backend is used, and the stored size of the responses is
+    tracked in an index. When the cache is larger than ``max_size`` bytes, expired
+    responses that can no longer be served are evicted first (responses can be
+    served for ``grace`` seconds after expiring when stale-while-revalidate is
+    enabled), followed by the least recently used ones.
+
+    Responses stored by previous processes are added to the index when the cache is
+    created, so existing caches are trimmed to the maximum size.
+    """
+
+    def __init__(
+        self,
+        backend: BaseCache,
+        stats: CacheStats,
+        max_size: Optional[int] = None,
+        grace: float = 0,
+    ):
+        super().__init__(cache_name=backend.cache_name)
+        self.backend = backend
+        self.responses = backend.responses
+        self.redirects = backend.redirects
+        self.stats = stats
+        self.max_size = max_size
+        self.grace = grace
+
+        self.lock = threading.RLock()
+        self.index: OrderedDict[str, tuple[int, Optional[float]]] = OrderedDict()
+        self.size = 0
+
+        with self.lock:
+            for key, size, expires in self._get_stored_entries():
+                self._add(key, size, expires)
+            self._evict()
+
+    def _get_stored_entries(self) -> list[tuple[str, int, Optional[float]]]:
+        """
+        Return the key, stored size and expiration of the responses already stored.
+        """
+        if isinstance(self.responses, SQLiteDict):
+            with self.responses.connection() as connection:
+                return list(
+                    connection.execute(
+                        f"SELECT key, LENGTH(value), expires "
+                        f"FROM {self.responses.table_name} ORDER BY expires",
+                    ),
+                )
+
+        if isinstance(self.responses, FileDict):
+            stats = [(path.stem, path.stat()) for path in self.responses.paths()]
+            return [
+                (key, stat.st_size, None)
+                for key, stat in sorted(stats, key=lambda item: item[1].st_mtime)
+            ]
+
+        return []
+
+    def _add(self, key: str, size: int, expires: Optional[float]) -> None:
+        """
+        Add a response to the index, replacing the previous one.
+        """
+        self._discard(key)
+        self.index[key] = (size, expires)
+        self.size += size
+        with self.stats.lock:
+            self.stats.entries += 1
+            self.stats.bytes += size
+
+    def _discard(self, key: str) -> bool:
+        """
+        Remove a response from the index, returning if it was present.
+        """
+        if key not in self.index:
+            return False
+
+        size, _ = self.index.pop(key)
+        self.size -= size
+        with self.stats.lock:
+            self.stats.entries -= 1
+            self.stats.bytes -= size
+        return True
+
+    def _evict(self) -> None:
+        """
+        Evict responses until the cache is below the maximum size.
+        """
+        if self.max_size is None or self.size <= self.max_size:
+            return
+
+        now = time.time()
+        expired = [
+            key
+            for key, (_, expires) in self.index.items()
+            if expires is not None and expires + self.grace < now
+        ]
+        keys = iter(expired + list(self.index))
+        while self.size > self.max_size:
+            key = next(keys)
+            if not self._discard(key):
+                continue
+
+            _logger.debug("Evicting %s from %s", key, self.cache_name)
+            with self.stats.lock:
+                self.stats.evictions += 1
+            try:
+                del self.responses[key]
+            except KeyError:
+                pass
+
+    def get_response(self, key: str, default: Any = None) -> Any:
+        response = super().get_response(key, default)
+        if response is not default:
+            with self.lock:
+                if key in self.index:
+                    self.index.move_to_end(key)
+        return response
+
+    def save_response(
+        self,
+        response: requests.Response,
+        cache_key: Optional[str] = None,
+        expires: Optional[datetime] = None,
+    ) -> None:
+        cache_key = cache_key or self.create_key(response.request)
+        super().save_response(response, cache_key, expires)
+        with self.lock:
+            self._add(
+                cache_key,
+                self._get_stored_size(cache_key, response),
+                expires.timestamp() if expires else None,
+            )
+            self._evict()
+
+    def _get_stored_size(self, key: str, response: requests.Response) -> int:
+        """
+        Return the stored size of a response that was just saved.
+
+        This matches the sizes returned by ``_get_stored_entries``; responses kept in
+        memory are not serialized, so the size of their body is used instead.
+        """
+        if isinstance(self.responses, SQLiteDict):
+            with self.responses.connection() as connection:
+                row = connection.execute(
+                    f"SELECT LENGTH(value) FROM {self.responses.table_name} "
+                    "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            return row[0] if row else 0
+
+        if isinstance(self.responses, FileDict):
+            path = Path(self.responses.cache_dir) / f"{key}{self.responses.extension}"
+            return path.stat().st_size if path.exists() else 0
+
+        return len(response.content or b"")
+
+    def set_limits(self, max_size: Optional[int], grace: float) -> None:
+        """
+        Apply the limits of another session sharing the cache.
+
+        The cache is bounded by the smallest maximum size, and expired responses are
+        kept for the longest grace period, so that they can be served by any session.
+        """
+        with self.lock:
+            if max_size is not None:
+                self.max_size = (
+                    max_size if self.max_size is None else min(self.max_size, max_size)
+                )
+            self.grace = max(self.grace, grace)
+            self._evict()
+
+    def clear(self) -> None:
+        super().clear()
+        with self.lock:
+            for key in list(self.index):
+                self._discard(key)
+
+
+def get_backend(cache_name: str, backend: str) -> BaseCache:
+    """
+    Create a cache backend by name, one of ``BACKENDS``.
+    """
+    if backend == "sqlite":
+        return SQLiteCache(cache_name)
+    if backend == "memory":
+        return BaseCache(cache_name)
+    return FileCache(cache_name, serializer=compressed_serializer)
+
+
+class StatsSession(requests_cache.CachedSession):  # pylint: disable=abstract-method
+    """
+    A cached session that records cache hits and misses.
+    """
+
+    def __init__(self, *args: Any, stats: CacheStats, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    def send(  # type: ignore  # pylint: disable=arguments-differ
+        self,
+        request: requests.PreparedRequest,
+        **kwargs: Any,
+    ) -> requests.Response:
+        response = super().send(request, **kwargs)
+        self.stats.record(response)
+        return response
@@ -1,17 +1,26 @@
+# pylint: disable=too-many-lines
 """Helper functions for Shillelagh."""
 
 import base64
+import bisect
+import heapq
 import inspect
 import itertools
 import json
 import marshal
 import math
 import operator
-from collections.abc import Iterator
-from datetime import timedelta
-from typing import Any, Callable, DefaultDict, Optional, TypeVar
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Callable, DefaultDict, Optional, TypeVar, cast
 
 import apsw
+import requests
 import requests_cache
 from packaging.version import Version
 
@@ -29,11 +38,113 @@ from shillelagh.filters import (
     Operator,
     Range,
 )
+from shillelagh.http_cache import (
+    BACKENDS,
+    BoundedCache,
+    CacheStats,
+    StatsSession,
+    get_backend,
+)
 from shillelagh.typing import RequestedOrder, Row
 
 DELETED = range(-1, 0)
 CACHE_EXPIRATION = timedelta(minutes=3)
 
+# number of values in each sublist of a ``SortedIntegers``
+SORTED_LIST_LOAD = 1000
+
+# maximum amount of memory (in bytes) used when sorting rows in Python; above that
+# sorted runs are spilled to disk and merged lazily
+SORT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+class SortedIntegers:
+    """
+    A sorted collection of unique integers.
+
+    Values are stored in sorted sublists of at most ``2 * SORTED_LIST_LOAD``
+    elements, together with the maximum of each sublist. Finding a value requires
+    two bisections, and adding or removing one only moves the values of a single
+    sublist, so the cost of each operation stays low even for millions of values:
+
+        >>> values = SortedIntegers([1, 5, 3])
+        >>> values.floor(4)
+        3
+        >>> values.add(4)
+        >>> list(values)
+        [1, 3, 4, 5]
+
+    """
+
+    def __init__(self, values: Iterable[int] = ()):
+        values = sorted(values)
+        self._lists = [
+            values[i : i + SORTED_LIST_LOAD]
+            for i in range(0, len(values), SORTED_LIST_LOAD)
+        ]
+        self._maxes = [sublist[-1] for sublist in self._lists]
+
+    def __iter__(self) -> Iterator[int]:
+        return itertools.chain.from_iterable(self._lists)
+
+    def add(self, value: int) -> None:
+        """
+        Add a value.
+        """
+        if not self._maxes:
+            self._lists.append([value])
+            self._maxes.append(value)
+            return
+
+        i = bisect.bisect_left(self._maxes, value)
+        if i == len(self._maxes):
+            i -= 1
+            self._lists[i].append(value)
+            self._maxes[i] = value
+        else:
+            bisect.insort(self._lists[i], value)
+
+        # split sublists that grow too big
+        sublist = self._lists[i]
+        if len(sublist) > 2 * SORTED_LIST_LOAD:
+            self._lists[i : i + 1] = [
+                sublist[:SORTED_LIST_LOAD],
+                sublist[SORTED_LIST_LOAD:],
+            ]
+            self._maxes[i : i + 1] = [sublist[SORTED_LIST_LOAD - 1], sublist[-1]]
+
+    def remove(self, value: int) -> None:
+        """
+        Remove a value, which must be present.
+        """
+        i = bisect.bisect_left(self._maxes, value)
+        sublist = self._lists[i]
+        del sublist[bisect.bisect_left(sublist, value)]
+        if sublist:
+            self._maxes[i] = sublist[-1]
+        else:
+            del self._lists[i]
+            del self._maxes[i]
+
+    def floor(self, value: int) -> Optional[int]:
+        """
+        Return the largest value that is less than or equal to ``value``.
+        """
+        i = bisect.bisect_left(self._maxes, value)
+        if i < len(self._maxes):
+            sublist = self._lists[i]
+            j = bisect.bisect_right(sublist, value)
+            if j:
+                return sublist[j - 1]
+
+        return self._maxes[i - 1] if i else None
+
+    def last(self) -> Optional[int]:
+        """
+        Return the largest value.
+        """
+        return self._maxes[-1] if self._maxes else None
+
 
 class RowIDManager:
     """
@@ -69,6 +180,7 @@ class RowIDManager:
     To delete data:
 
         >>> manager.delete(data.index("two"))
+        2
         >>> print(data)
         ['zero', 'one', 'two', 'three', 'four']
         >>> for row_id, value in zip(manager, data):
@@ -79,6 +191,11 @@ class RowIDManager:
         3 three
         10 four
 
+    Since the structure is append-only the position of a row never changes. Live
+    row IDs are stored as intervals of consecutive IDs, each one with the position
+    of its first row, and indexed by their first ID in a ``SortedIntegers``. This
+    way row IDs can be checked, inserted, and deleted without scanning all the
+    intervals, even after many scattered deletes.
     """
 
     def __init__(self, ranges: list[range]):
@@ -86,25 +203,90 @@ class RowIDManager:
             # pylint: disable=broad-exception-raised
             raise Exception("Argument ``ranges`` cannot be empty")
 
-        self.ranges = ranges
+        # map from the first row ID of each interval to its stop and position
+        self._intervals: dict[int, tuple[int, int]] = {}
+        self._size = 0
+
+        # first row ID of the interval at the end, which can be extended on inserts
+        self._tail: Optional[int] = None
+
+        for range_ in ranges:
+            if range_ == DELETED:
+                self._size += 1
+                self._tail = None
+            elif range_:
+                self._intervals[range_.start] = (range_.stop, self._size)
+                self._size += len(range_)
+                self._tail = range_.start
 
-    def __iter__(self):
-        yield from itertools.chain(*self.ranges)
+        self._starts = SortedIntegers(self._intervals)
+
+        # intervals sorted by position, computed on demand and reset on changes
+        self._ordered: Optional[list[tuple[range, int]]] = None
+
+    def _ordered_intervals(self) -> list[tuple[range, int]]:
+        """
+        Return the intervals with the position of their first row, in order.
+        """
+        if self._ordered is None:
+            self._ordered = sorted(
+                (
+                    (range(start, stop), position)
+                    for start, (stop, position) in self._intervals.items()
+                ),
+                key=lambda item: item[1],
+            )
+        return self._ordered
+
+    @property
+    def ranges(self) -> list[range]:
+        """
+        Row IDs in the order of the rows, with deleted rows represented by ``DELETED``.
+        """
+        ranges: list[range] = []
+        position = 0
+        for range_, first in self._ordered_intervals():
+            ranges.extend([DELETED] * (first - position))
+            ranges.append(range_)
+            position = first + len(range_)
+        ranges.extend([DELETED] * (self._size - position))
+
+        return ranges
+
+    def __iter__(self) -> Iterator[int]:
+        # rows changed during the iteration are not seen
+        intervals, size = self._ordered_intervals(), self._size
+
+        position = 0
+        for range_, first in intervals:
+            yield from itertools.repeat(-1, first - position)
+            yield from range_
+            position = first + len(range_)
+        yield from itertools.repeat(-1, size - position)
+
+    def _find(self, row_id: int) -> Optional[int]:
+        """
+        Return the first row ID of the interval containing a given row ID.
+        """
+        start = self._starts.floor(row_id)
+        if start is not None and row_id < self._intervals[start][0]:
+            return start
+        return None
 
     def get_max_row_id(self) -> int:
         """
         Find the maximum row ID.
         """
-        return max((r.stop - 1) for r in self.ranges)
+        start = self._starts.last()
+        return -1 if start is None else self._intervals[start][0] - 1
 
     def check_row_id(self, row_id: int) -> None:
         """
         Check if a provided row ID is not being used.
         """
-        for range_ in self.ranges:
-            if range_.start <= row_id < range_.stop:
-                # pylint: disable=broad-exception-raised
-                raise Exception(f"Row ID {row_id} already present")
+        if self._find(row_id) is not None:
+            # pylint: disable=broad-exception-raised
+            raise Exception(f"Row ID {row_id} already present")
 
     def insert(self, row_id: Optional[int] = None) -> int:
         """
@@ -116,34 +298,44 @@ class RowIDManager:
         else:
             self.check_row_id(row_id)
 
-        last = self.ranges[-1]
-        if last.stop == row_id:
-            self.ranges[-1] = range(last.start, row_id + 1)
+        if self._tail is not None and self._intervals[self._tail][0] == row_id:
+            position = self._intervals[self._tail][1]
+            self._intervals[self._tail] = (row_id + 1, position)
         else:
-            self.ranges.append(range(row_id, row_id + 1))
+            self._intervals[row_id] = (row_id + 1, self._size)
+            self._starts.add(row_id)
+            self._tail = row_id
+        self._size += 1
+        self._ordered = None
+
         return row_id
 
-    def delete(self, row_id: int) -> None:
-        """Mark a given row ID as deleted."""
-        for i, range_ in enumerate(self.ranges):
-            if range_.start <= row_id < range_.stop:
-                if range_.start == range_.stop - 1:
-                    self.ranges[i] = DELETED
-                elif row_id == range_.start:
-                    self.ranges[i] = range(range_.start + 1, range_.stop)
-                    self.ranges.insert(i, DELETED)
-                elif row_id == range_.stop - 1:
-                    self.ranges[i] = range(range_.start, range_.stop - 1)
-                    self.ranges.insert(i + 1, DELETED)
-                else:
-                    self.ranges[i] = range(range_.start, row_id)
-                    self.ranges.insert(i + 1, range(row_id + 1, range_.stop))
-                    self.ranges.insert(i + 1, DELETED)
+    def delete(self, row_id: int) -> int:
+        """
+        Mark a given row ID as deleted.
 
-                return
+        Returns the position of the row, ie, the number of row IDs before it.
+        """
+        start = self._find(row_id)
+        if start is None:
+            # pylint: disable=broad-exception-raised
+            raise Exception(f"Row ID {row_id} not found")
+
+        # split the interval around the row ID
+        stop, position = self._intervals.pop(start)
+        if row_id > start:
+            self._intervals[start] = (row_id, position)
+        else:
+            self._starts.remove(start)
+        if row_id + 1 < stop:
+            self._intervals[row_id + 1] = (stop, position + row_id + 1 - start)
+            self._starts.add(row_id + 1)
+
+        if self._tail == start:
+            self._tail = row_id + 1 if row_id + 1 < stop else None
+        self._ordered = None
 
-        # pylint: disable=broad-exception-raised
-        raise Exception(f"Row ID {row_id} not found")
+        return position + row_id - start
 
 
 def analyze(  # pylint: disable=too-many-branches
@@ -403,76 +595,202 @@ def is_not_null(column: Any, _: Any) -> bool:
     return column is not None
 
 
-def filter_data(  # pylint: disable=too-many-arguments, too-many-positional-arguments
-    data: Iterator[Row],
-    bounds: dict[str, Filter],
-    order: list[tuple[str, RequestedOrder]],
-    limit: Optional[int] = None,
-    offset: Optional[int] = None,
-    requested_columns: Optional[set[str]] = None,
-) -> Iterator[Row]:
+def compile_predicate(bounds: dict[str, Filter]) -> Callable[[Row], bool]:
     """
-    Apply filtering and sorting to a stream of rows.
+    Compile a set of filters into a single predicate function.
 
-    This is used mostly as an exercise. It's probably much more efficient to
-    simply declare fields without any filtering/sorting and let the backend
-    (SQLite, eg) handle it.
+    All the filters are combined into a single expression, evaluated in one call
+    per row, and values and ``LIKE`` regular expressions are resolved upfront.
+    This can be used by adapters that need to filter rows locally:
+
+        >>> predicate = compile_predicate({"a": Range(1, 10), "b": Equal("x")})
+        >>> predicate({"a": 5, "b": "x"})
+        True
+        >>> predicate({"a": 5, "b": "y"})
+        False
+
+    Missing columns are treated as ``NULL``.
     """
-    data = (
-        {
-            k: v
-            for k, v in row.items()
-            if requested_columns is None or k in requested_columns
-        }
-        for row in data
-    )
+    namespace: dict[str, Any] = {}
+    conditions: list[str] = []
 
-    for column_name, filter_ in bounds.items():
+    def bind(value: Any) -> str:
+        name = f"arg{len(namespace)}"
+        namespace[name] = value
+        return name
 
-        def apply_filter(
-            data: Iterator[Row],
-            operator_: Callable[[Any, Any], bool],
-            column_name: str,
-            value: Any,
-        ) -> Iterator[Row]:
-            """
-            Apply a given filter to an iterator of rows.
-
-            This method is needed because Python uses lazy bindings in
-            generator expressions, so we need to create a new scope in
-            order to apply several filters that reuse the same variable
-            names.
-            """
-            return (row for row in data if operator_(row[column_name], value))
+    def like(match: Callable[[str], Any]) -> Callable[[Any], bool]:
+        # ``NULL`` and non-string values don't match
+        return lambda value: isinstance(value, str) and match(value) is not None
+
+    for column_name, filter_ in bounds.items():
+        column = f"row.get({column_name!r})"
 
         if isinstance(filter_, Impossible):
-            return
-        if isinstance(filter_, Equal):
-            data = apply_filter(data, operator.eq, column_name, filter_.value)
+            conditions.append("False")
+        elif isinstance(filter_, Equal):
+            conditions.append(f"{column} == {bind(filter_.value)}")
         elif isinstance(filter_, NotEqual):
-            data = apply_filter(data, operator.ne, column_name, filter_.value)
+            conditions.append(f"{column} != {bind(filter_.value)}")
         elif isinstance(filter_, Range):
+            comparisons = []
             if filter_.start is not None:
-                operator_ = operator.ge if filter_.include_start else operator.gt
-                data = apply_filter(data, operator_, column_name, filter_.start)
+                operator_ = "<=" if filter_.include_start else "<"
+                comparisons.append(f"{bind(filter_.start)} {operator_} ")
+            comparisons.append(column)
             if filter_.end is not None:
-                operator_ = operator.le if filter_.include_end else operator.lt
-                data = apply_filter(data, operator_, column_name, filter_.end)
+                operator_ = "<=" if filter_.include_end else "<"
+                comparisons.append(f" {operator_} {bind(filter_.end)}")
+            if len(comparisons) > 1:
+                # a chained comparison reads the column only once
+                conditions.append("".join(comparisons))
+        elif isinstance(filter_, Like):
+            conditions.append(f"{bind(like(filter_.regex.match))}({column})")
         elif isinstance(filter_, IsNull):
-            data = apply_filter(data, is_null, column_name, None)
+            conditions.append(f"{column} is None")
         elif isinstance(filter_, IsNotNull):
-            data = apply_filter(data, is_not_null, column_name, None)
+            conditions.append(f"{column} is not None")
         else:
             raise ProgrammingError(f"Invalid filter: {filter_}")
 
+    expression = " and ".join(f"({condition})" for condition in conditions) or "True"
+
+    # the expression is built only from column names (escaped with ``repr``) and
+    # operators; values are passed through the namespace
+    predicate = eval(f"lambda row: {expression}", namespace)  # pylint: disable=eval-used
+
+    return cast(Callable[[Row], bool], predicate)
+
+
+def import_pyarrow() -> Any:
+    """
+    Import ``pyarrow``.
+
+    This is used by the ``arrow`` engine of the CSV adapter, and by the helpers that
+    evaluate filters on Arrow data (``get_arrow_mask``), which are shared with the
+    Arrow adapter.
+    """
+    # pylint: disable=import-outside-toplevel
+    try:
+        import pyarrow  # type: ignore
+        import pyarrow.compute  # type: ignore
+        import pyarrow.csv  # type: ignore
+    except ImportError as ex:
+        raise ProgrammingError(
+            "The ``arrow`` engine requires the ``pyarrow`` package",
+        ) from ex
+
+    return pyarrow
+
+
+def _get_arrow_value(column: Any, value: Any) -> Any:
+    """
+    Convert a filter value so it can be compared with a ``pyarrow`` column.
+
+    Arrow can't compare timestamps with and without a timezone, so naive timestamps
+    are assumed to be in UTC, like ``DateTime`` does.
+    """
+    pa = import_pyarrow()
+    if not isinstance(value, datetime) or not pa.types.is_timestamp(column.type):
+        return value
+
+    if column.type.tz is None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if column.type.tz is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def get_arrow_mask(batch: Any, bounds: dict[str, Filter]) -> Any:  # pylint: disable=too-many-branches
+    """
+    Evaluate filters on a ``pyarrow`` table or batch of rows.
+
+    Returns a boolean array, or ``None`` if there are no filters. The semantics are
+    the same as ``compile_predicate``.
+    """
+    # pylint: disable=no-member
+    pa = import_pyarrow()
+    pc = pa.compute
+
+    conditions = []
+    for column_name, filter_ in bounds.items():
+        column = batch.column(column_name)
+        try:
+            if isinstance(filter_, Equal):
+                value = _get_arrow_value(column, filter_.value)
+                conditions.append(pc.equal(column, value))
+            elif isinstance(filter_, NotEqual):
+                value = _get_arrow_value(column, filter_.value)
+                conditions.append(
+                    pc.or_kleene(pc.not_equal(column, value), pc.is_null(column)),
+                )
+            elif isinstance(filter_, Range):
+                if filter_.start is not None:
+                    operator_ = pc.less_equal if filter_.include_start else pc.less
+                    start = _get_arrow_value(column, filter_.start)
+                    conditions.append(operator_(start, column))
+                if filter_.end is not None:
+                    operator_ = pc.less_equal if filter_.include_end else pc.less
+                    end = _get_arrow_value(column, filter_.end)
+                    conditions.append(operator_(column, end))
+            elif isinstance(filter_, Like):
+                conditions.append(
+                    pc.match_like(column, filter_.value, ignore_case=True),
+                )
+            elif isinstance(filter_, IsNull):
+                conditions.append(pc.is_null(column))
+            elif isinstance(filter_, IsNotNull):
+                conditions.append(pc.is_valid(column))
+            else:
+                raise ProgrammingError(f"Invalid filter: {filter_}")
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as ex:
+            raise ProgrammingError(
+                f"Invalid filter on column {column_name}: {ex}",
+            ) from ex
+
+    if not conditions:
+        return None
+
+    mask = conditions[0]
+    for condition in conditions[1:]:
+        mask = pc.and_kleene(mask, condition)
+
+    # comparisons with nulls return null
+    return pc.fill_null(mask, False)
+
+
+def filter_data(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    data: Iterator[Row],
+    bounds: dict[str, Filter],
+    order: list[tuple[str, RequestedOrder]],
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    requested_columns: Optional[set[str]] = None,
+    sort_memory_budget: int = SORT_MEMORY_BUDGET,
+) -> Iterator[Row]:
+    """
+    Apply filtering and sorting to a stream of rows.
+
+    This is used mostly as an exercise. It's probably much more efficient to
+    simply declare fields without any filtering/sorting and let the backend
+    (SQLite, eg) handle it.
+
+    Sorting is done in memory, unless the rows exceed ``sort_memory_budget`` bytes,
+    in which case an external merge sort is used (see ``external_sort``).
+    """
+    if any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+        return
+
+    # filter before projecting, so that only rows that pass are copied
+    if bounds:
+        data = filter(compile_predicate(bounds), data)
+    if requested_columns is not None:
+        data = (
+            {k: v for k, v in row.items() if k in requested_columns} for row in data
+        )
+
     if order:
-        # in order to sort we need to consume the iterator and load it into
-        # memory :(
-        rows = list(data)
-        for column_name, requested_order in order:
-            reverse = requested_order == Order.DESCENDING
-            rows.sort(key=operator.itemgetter(column_name), reverse=reverse)
-        data = iter(rows)
+        data = external_sort(data, order, sort_memory_budget)
 
     data = apply_limit_and_offset(data, limit, offset)
 
@@ -482,6 +800,131 @@ def filter_data(  # pylint: disable=too-many-arguments, too-many-positional-argu
 T = TypeVar("T")
 
 
+class ReversedKey:
+    """
+    A wrapper that inverts the comparison of a value.
+
+    Used to build a single sort key for columns sorted in different directions:
+
+        >>> sorted([1, 3, 2], key=ReversedKey)
+        [3, 2, 1]
+
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, ReversedKey):
+            return NotImplemented
+
+        return bool(self.value == other.value)
+
+    def __lt__(self, other: "ReversedKey") -> bool:
+        return bool(other.value < self.value)
+
+
+def get_sort_key(order: list[tuple[str, RequestedOrder]]) -> Callable[[Row], Any]:
+    """
+    Build a key function that sorts rows according to the requested order.
+
+    The first column in ``order`` is the primary key, the second column is used to
+    break ties, and so on.
+    """
+    if all(requested_order == Order.ASCENDING for _, requested_order in order):
+        return operator.itemgetter(*(column_name for column_name, _ in order))
+
+    def key(row: Row) -> tuple[Any, ...]:
+        return tuple(
+            (
+                ReversedKey(row[column_name])
+                if requested_order == Order.DESCENDING
+                else row[column_name]
+            )
+            for column_name, requested_order in order
+        )
+
+    return key
+
+
+def estimate_row_size(row: Row) -> int:
+    """
+    Estimate the memory used by a row, in bytes.
+    """
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+def _write_run(rows: list[Row]) -> IO[bytes]:
+    """
+    Write a sorted run to a temporary file.
+    """
+    run = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+    pickler = pickle.Pickler(run, protocol=pickle.HIGHEST_PROTOCOL)
+    for row in rows:
+        pickler.dump(row)
+        # the pickler memo holds a reference to every row, so it needs to be
+        # cleared in order to keep memory bounded
+        pickler.clear_memo()
+    run.seek(0)
+    return run
+
+
+def _read_run(run: IO[bytes]) -> Iterator[Row]:
+    """
+    Read rows lazily from a sorted run, closing the file when done.
+    """
+    unpickler = pickle.Unpickler(run)
+    try:
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+    finally:
+        run.close()
+
+
+def external_sort(
+    data: Iterator[Row],
+    order: list[tuple[str, RequestedOrder]],
+    memory_budget: int = SORT_MEMORY_BUDGET,
+) -> Iterator[Row]:
+    """
+    Sort a stream of rows using a bounded amount of memory.
+
+    Rows are accumulated until ``memory_budget`` bytes (estimated) are used; each
+    batch is then sorted and written ("spilled") to a temporary file. Once the input
+    is exhausted the sorted runs are lazily merged. If the whole input fits in the
+    budget the rows are sorted in memory and no files are created.
+    """
+    key = get_sort_key(order)
+
+    runs: list[IO[bytes]] = []
+    rows: list[Row] = []
+    size = 0
+    for row in data:
+        rows.append(row)
+        size += estimate_row_size(row)
+        if size > memory_budget:
+            rows.sort(key=key)
+            runs.append(_write_run(rows))
+            rows = []
+            size = 0
+
+    rows.sort(key=key)
+    if not runs:
+        yield from rows
+        return
+
+    if rows:
+        runs.append(_write_run(rows))
+        rows = []
+
+    yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
+
+
 def apply_limit_and_offset(
     rows: Iterator[T],
     limit: Optional[int] = None,
@@ -587,6 +1030,26 @@ def find_adapter(
     raise ProgrammingError(f"Unsupported table: {uri}")
 
 
+def find_variable(name: str, convert: Callable[[Any], Optional[T]]) -> Optional[T]:
+    """
+    Go up the stack, find a variable with a given name.
+
+    In each frame local variables are searched before global variables. The value is
+    passed to ``convert``, and variables where it returns ``None`` are skipped.
+
+    Frames are traversed directly, since building the full stack with
+    ``inspect.stack`` reads the source code of every frame.
+    """
+    frame = inspect.currentframe()
+    while frame is not None:
+        for namespace in (frame.f_locals, frame.f_globals):
+            if name in namespace and (value := convert(namespace[name])) is not None:
+                return value
+        frame = frame.f_back
+
+    return None
+
+
 def flatten(row: Row) -> Row:
     """
     Function that converts JSON to strings, to flatten rows.
@@ -613,26 +1076,246 @@ def create_namespaced_cache_key(cache_name: str) -> str:
     return cache_name
 
 
+class SessionPool:  # pylint: disable=too-many-instance-attributes
+    """
+    A thread-safe registry of HTTP sessions, shared by all adapters.
+
+    Sessions are keyed by cache name, request headers, expiration and cache options,
+    and sessions with the same cache name and backend share a cache, so that each
+    cache is opened only once per process. All sessions use the same transport
+    adapter, so connections to a given host (and their TLS handshakes) are reused
+    across sessions.
+
+    The cache options are:
+
+    - ``backend``: ``sqlite`` (the default), ``memory`` or ``filesystem`` (with
+      compressed responses).
+    - ``max_size``: the maximum size of the cache in bytes, as stored by the backend,
+      evicting expired and then least recently used responses; unbounded by default.
+      A cache shared by sessions with different sizes is bounded by the smallest one.
+    - ``stale_while_revalidate``: number of seconds after a response expires when it
+      can still be returned, while it's refreshed in the background.
+
+    Since headers are part of the key, adapters that send a different token on each
+    instance (or per user) create a new session every time, so at most
+    ``max_sessions`` are kept, discarding the least recently used ones.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        max_sessions: int = 100,
+    ):
+        self.sessions: OrderedDict[tuple[Any, ...], requests_cache.CachedSession] = (
+            OrderedDict()
+        )
+        self.max_sessions = max_sessions
+        self.caches: dict[tuple[Any, ...], BoundedCache] = {}
+        self.stats: dict[str, CacheStats] = {}
+        self.lock = threading.Lock()
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+        self.keep_alive = keep_alive
+        self.cache_options: dict[str, Any] = {
+            "backend": "sqlite",
+            "max_size": None,
+            "stale_while_revalidate": 0,
+        }
+
+    def _mount(self, session: requests.Session) -> None:
+        """
+        Configure a session to use the shared transport adapter.
+        """
+        session.mount("http://", self.adapter)
+        session.mount("https://", self.adapter)
+        if self.keep_alive:
+            session.headers.pop("Connection", None)
+        else:
+            session.headers["Connection"] = "close"
+
+    def configure(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        max_sessions: int = 100,
+    ) -> None:
+        """
+        Change the connection pools used by the sessions.
+
+        ``pool_connections`` is the number of hosts with pooled connections, and
+        ``pool_maxsize`` is the number of connections kept open for each host. When
+        ``keep_alive`` is false connections are closed after each request.
+        ``max_sessions`` is the number of sessions kept in the pool.
+        """
+        with self.lock:
+            self.max_sessions = max_sessions
+            self._evict()
+            previous = self.adapter
+            self.adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+            )
+            self.keep_alive = keep_alive
+            for session in self.sessions.values():
+                self._mount(session)
+
+        previous.close()
+
+    def configure_cache(self, **cache_options: Any) -> None:
+        """
+        Change the default cache options, used by sessions created afterwards.
+        """
+        with self.lock:
+            self.cache_options = self._get_cache_options(cache_options)
+
+    def _get_cache_options(self, cache_options: dict[str, Any]) -> dict[str, Any]:
+        """
+        Combine and validate cache options with the defaults.
+        """
+        invalid = set(cache_options) - set(self.cache_options)
+        if invalid:
+            raise ProgrammingError(
+                "Invalid cache options: " + ", ".join(sorted(invalid)),
+            )
+
+        options = {
+            **self.cache_options,
+            **{k: v for k, v in cache_options.items() if v is not None},
+        }
+        if options["backend"] not in BACKENDS:
+            raise ProgrammingError(
+                f"Invalid cache backend: {options['backend']}. Valid backends are: "
+                + ", ".join(sorted(BACKENDS)),
+            )
+        if options["max_size"] is not None and options["max_size"] < 0:
+            raise ProgrammingError("The maximum cache size must be positive")
+
+        return options
+
+    def _get_cache(self, cache_name: str, options: dict[str, Any]) -> BoundedCache:
+        """
+        Return the backend for a given cache, creating it if needed.
+        """
+        key = (cache_name, options["backend"])
+        if key not in self.caches:
+            self.caches[key] = BoundedCache(
+                get_backend(cache_name, options["backend"]),
+                self.stats.setdefault(cache_name, CacheStats()),
+                options["max_size"],
+                options["stale_while_revalidate"],
+            )
+        else:
+            self.caches[key].set_limits(
+                options["max_size"],
+                options["stale_while_revalidate"],
+            )
+
+        return self.caches[key]
+
+    def get(
+        self,
+        request_headers: dict[str, str],
+        cache_name: str,
+        expire_after: timedelta,
+        **cache_options: Any,
+    ) -> requests_cache.CachedSession:
+        """
+        Return a session, creating it if needed.
+        """
+        with self.lock:
+            options = self._get_cache_options(cache_options)
+            key = (
+                cache_name,
+                tuple(sorted(request_headers.items())),
+                expire_after.total_seconds(),
+                *options.values(),
+            )
+            if key in self.sessions:
+                self.sessions.move_to_end(key)
+            else:
+                session = StatsSession(
+                    backend=self._get_cache(cache_name, options),
+                    expire_after=(
+                        requests_cache.DO_NOT_CACHE
+                        if expire_after == timedelta(seconds=-1)
+                        else expire_after.total_seconds()
+                    ),
+                    stale_while_revalidate=options["stale_while_revalidate"],
+                    stats=self.stats[cache_name],
+                )
+                session.headers.update(request_headers)
+                self._mount(session)
+                self.sessions[key] = session
+                self._evict()
+
+            return self.sessions[key]
+
+    def _evict(self) -> None:
+        """
+        Discard the least recently used sessions, keeping at most ``max_sessions``.
+
+        Evicted sessions are not closed, since their cache and transport adapter are
+        shared with other sessions, and they might still be used by adapters holding
+        a reference to them.
+        """
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        """
+        Return the statistics of each cache: hits, misses, evictions, size, etc.
+        """
+        with self.lock:
+            return {
+                cache_name: stats.as_dict() for cache_name, stats in self.stats.items()
+            }
+
+    def clear(self) -> None:
+        """
+        Close all the sessions, caches and connections.
+        """
+        with self.lock:
+            sessions = list(self.sessions.values())
+            caches = list(self.caches.values())
+            self.sessions.clear()
+            self.caches.clear()
+            self.stats.clear()
+
+        for session in sessions:
+            session.close()
+        for cache in caches:
+            cache.close()
+        self.adapter.close()
+
+
+# sessions shared by all adapters in the process
+session_pool = SessionPool()
+
+
 def get_session(
     request_headers: dict[str, str],
     cache_name: str,
     expire_after: timedelta = CACHE_EXPIRATION,
+    **cache_options: Any,
 ) -> requests_cache.CachedSession:
     """
     Return a cached session.
+
+    Sessions are shared by adapters with the same headers, cache and expiration, so
+    they should not be modified. Options that are not passed (or are ``None``) use
+    the defaults from ``session_pool.configure_cache``.
     """
-    session = requests_cache.CachedSession(
-        cache_name=create_namespaced_cache_key(cache_name),
-        backend="sqlite",
-        expire_after=(
-            requests_cache.DO_NOT_CACHE
-            if expire_after == timedelta(seconds=-1)
-            else expire_after.total_seconds()
-        ),
+    return session_pool.get(
+        request_headers,
+        create_namespaced_cache_key(cache_name),
+        expire_after,
+        **cache_options,
     )
-    session.headers.update(request_headers)
-
-    return session
 
 
 def get_bounds(
@@ -2,15 +2,20 @@
 Test the generic JSON adapter.
 """
 
+import io
+import json
 import re
 
 import pytest
+from pytest_mock import MockerFixture
 from requests_mock.mocker import Mocker
 from yarl import URL
 
-from shillelagh.adapters.api.generic_json import GenericJSONAPI
+from shillelagh import lib
+from shillelagh.adapters.api.generic_json import GenericJSONAPI, JSONArrayReader
 from shillelagh.backends.apsw.db import connect
 from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Order
 from shillelagh.typing import Maybe
 
 baseurl = URL("https://api.stlouisfed.org/fred/series")
@@ -389,3 +394,404 @@ def test_generic_json_string_array(requests_mock: Mocker) -> None:
 
     assert cursor.description
     assert {t[0] for t in cursor.description} == {"col_0"}
+
+
+def test_json_array_reader() -> None:
+    """
+    Test parsing JSON arrays incrementally.
+    """
+    document = (
+        '\ufeff [ {"a": 1, "b": "é"},\n12345 , [true, null], "x", 2.5e3,-1.25E-2,7]'
+    ).encode()
+    expected = [{"a": 1, "b": "é"}, 12345, [True, None], "x", 2500.0, -0.0125, 7]
+
+    # split the document at every position, including inside numbers and
+    # multibyte characters
+    for i in range(len(document)):
+        chunks = [document[:i], document[i:]]
+        assert list(JSONArrayReader(chunks)) == expected
+    assert list(JSONArrayReader(document[i : i + 1] for i in range(len(document)))) == (
+        expected
+    )
+
+    assert list(JSONArrayReader([b"[1, 2.", b"5e3]"])) == [1, 2500.0]
+    assert not list(JSONArrayReader([b"[ ]"]))
+    assert list(JSONArrayReader([b'{"a": 1, "b": 2}'])) == [1, 2]
+    assert not list(JSONArrayReader([b"42"]))
+
+    with pytest.raises(json.JSONDecodeError) as excinfo:
+        list(JSONArrayReader([b"[1 2]"]))
+    assert str(excinfo.value) == "Expecting ',' delimiter: line 1 column 4 (char 3)"
+
+    with pytest.raises(json.JSONDecodeError):
+        list(JSONArrayReader([b"[1, {"]))
+
+
+def test_json_array_reader_large_values() -> None:
+    """
+    Test that large values are not parsed once per chunk.
+    """
+    value = ["x" * 10] * 10_000
+    document = json.dumps([value, value]).encode()
+    chunks = [document[i : i + 100] for i in range(0, len(document), 100)]
+
+    reader = JSONArrayReader(chunks)
+    assert list(reader) == [value, value]
+
+    # the buffer only has the data after the first value
+    assert len(reader.buffer) < len(document) / 2 + 100
+
+
+def test_reuse_and_sample(requests_mock: Mocker, mocker: MockerFixture) -> None:
+    """
+    Test that the schema is inferred from a sample, reused in the first query.
+    """
+    mocker.patch("shillelagh.adapters.api.generic_json.SAMPLE_SIZE", 3)
+
+    url = "https://example.org/data.json"
+    data = requests_mock.get(
+        url,
+        json=[{"a": 1}, {"a": 2}, {"a": 3}, {"a": 4, "b": "x"}],
+    )
+
+    adapter = GenericJSONAPI(url, cache_expiration=-1)
+    assert data.call_count == 1
+    assert adapter.get_columns()["a"].order == Order.NONE
+    assert list(adapter.get_columns()) == ["a"]
+
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+        {"a": 3, "rowid": 2},
+        {"a": 4, "b": "x", "rowid": 3},
+    ]
+    assert data.call_count == 1
+
+    assert list(adapter.get_data({}, [], requested_columns={"b"}))[-1] == {
+        "b": "x",
+        "rowid": 3,
+    }
+    assert data.call_count == 2
+
+    # the order is inferred only when the sample has all the rows
+    data = requests_mock.get(url, json=[{"a": 1}, {"a": 2}])
+    adapter = GenericJSONAPI(url, cache_expiration=-1)
+    assert adapter.get_columns()["a"].order == Order.ASCENDING
+
+    # closing the adapter discards the elements read
+    adapter.close()
+    adapter.close()
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+    ]
+    assert data.call_count == 2
+
+
+def test_streaming_path(requests_mock: Mocker) -> None:
+    """
+    Test paths that are applied to each element of a top-level array.
+    """
+    url = "https://example.org/data.json"
+    requests_mock.get(
+        url,
+        json=[
+            {"data": [{"a": 1}, {"a": 2}]},
+            {"data": [{"a": 3}]},
+            {"other": []},
+        ],
+    )
+
+    adapter = GenericJSONAPI(url, "$[*].data[*]", cache_expiration=-1)
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+        {"a": 3, "rowid": 2},
+    ]
+
+
+def test_streaming_cache(requests_mock: Mocker, mocker: MockerFixture) -> None:
+    """
+    Test that the body is only streamed from the network when the cache is disabled.
+    """
+    mocker.patch("shillelagh.adapters.api.generic_json.SAMPLE_SIZE", 1)
+
+    url = "https://example.org/data.json"
+    document = json.dumps([{"a": i} for i in range(100_000)]).encode()
+
+    body = io.BytesIO(document)
+    requests_mock.get(url, body=body)
+    GenericJSONAPI(url, cache_expiration=-1)
+    assert body.tell() < len(document)
+
+    # the cache reads the whole body before it's parsed; the cache is kept in memory
+    # so that responses cached by previous runs are not used
+    body = io.BytesIO(document)
+    requests_mock.get(url, body=body)
+    GenericJSONAPI(url, cache_options={"backend": "memory"})
+    assert body.tell() == len(document)
+
+
+def test_link_pagination(requests_mock: Mocker) -> None:
+    """
+    Test following ``Link`` headers.
+    """
+    url = "https://example.org/data.json"
+    requests_mock.get(
+        url,
+        json=[{"a": 1}, {"a": 2}],
+        headers={"Link": '</data.json?after=2>; rel="next", </data.json>; rel="first"'},
+        complete_qs=True,
+    )
+    requests_mock.get(f"{url}?after=2", json=[{"a": 3}], complete_qs=True)
+
+    adapter = GenericJSONAPI(url, cache_expiration=-1, pagination={"type": "link"})
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+        {"a": 3, "rowid": 2},
+    ]
+
+
+def test_cursor_pagination(requests_mock: Mocker) -> None:
+    """
+    Test reading cursors from the payload.
+    """
+    url = "https://example.org/data.json?q=1"
+    requests_mock.get(
+        url,
+        json={"data": [{"a": 1}], "next": "abc"},
+        complete_qs=True,
+    )
+    requests_mock.get(
+        f"{url}&cursor=abc",
+        json={"data": [{"a": 2}], "next": None},
+        complete_qs=True,
+    )
+
+    adapter = GenericJSONAPI(
+        url,
+        "$.data[*]",
+        cache_expiration=-1,
+        pagination={"type": "cursor", "path": "$.next", "param": "cursor"},
+    )
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+    ]
+
+    # the cursor can also be the URL of the next page
+    requests_mock.get(
+        url,
+        json={"data": [{"a": 1}], "next": "/data.json?page=2"},
+        complete_qs=True,
+    )
+    requests_mock.get(
+        "https://example.org/data.json?page=2",
+        json={"data": [{"a": 2}]},
+        complete_qs=True,
+    )
+
+    adapter = GenericJSONAPI(
+        url,
+        "$.data[*]",
+        cache_expiration=-1,
+        pagination={"type": "cursor", "path": "$.next"},
+    )
+    assert list(adapter.get_data({}, [])) == [
+        {"a": 1, "rowid": 0},
+        {"a": 2, "rowid": 1},
+    ]
+
+    requests_mock.get(
+        "https://example.org/data.json?page=2",
+        json={"error": {"message": "Invalid cursor"}},
+        status_code=400,
+        complete_qs=True,
+    )
+    with pytest.raises(ProgrammingError) as excinfo:
+        list(adapter.get_data({}, []))
+    assert str(excinfo.value) == "Error: Invalid cursor"
+
+
+def test_offset_pagination(requests_mock: Mocker) -> None:
+    """
+    Test offset pagination, with the page size inferred from the first page.
+    """
+    url = "https://example.org/data.json"
+    pages = [
+        requests_mock.get(
+            f"{url}?offset={offset}",
+            json=[{"a": i} for i in range(offset, min(offset + 2, 5))],
+            complete_qs=True,
+        )
+        for offset in range(0, 6, 2)
+    ]
+
+    adapter = GenericJSONAPI(url, cache_expiration=-1, pagination={"type": "offset"})
+    assert [row["a"] for row in adapter.get_data({}, [])] == [0, 1, 2, 3, 4]
+    assert [page.call_count for page in pages] == [1, 1, 1]
+
+    # pages are only requested when rows are consumed
+    rows = adapter.get_data({}, [])
+    assert [next(rows) for _ in range(3)][-1] == {"a": 2, "rowid": 2}
+    assert [page.call_count for page in pages] == [2, 2, 1]
+
+    # an empty first page
+    requests_mock.get(f"{url}?offset=0", json=[], complete_qs=True)
+    adapter = GenericJSONAPI(url, cache_expiration=-1, pagination={"type": "offset"})
+    assert not list(adapter.get_data({}, []))
+
+
+def test_page_pagination_with_total(requests_mock: Mocker) -> None:
+    """
+    Test page pagination when the number of pages is known.
+    """
+    url = "https://example.org/data.json"
+    pages = [
+        requests_mock.get(
+            f"{url}?p={page}&size=2",
+            json={"total": 3, "data": [{"a": page * 2}, {"a": page * 2 + 1}]},
+            complete_qs=True,
+        )
+        for page in range(0, 3)
+    ]
+
+    pagination = {
+        "type": "page",
+        "param": "p",
+        "start": 0,
+        "size": 2,
+        "size_param": "size",
+        "total_path": "$.total",
+    }
+    adapter = GenericJSONAPI(
+        url,
+        "$.data[*]",
+        cache_expiration=-1,
+        pagination=pagination,
+    )
+    assert [row["a"] for row in adapter.get_data({}, [])] == [0, 1, 2, 3, 4, 5]
+
+    # pages are downloaded concurrently
+    adapter = GenericJSONAPI(
+        url,
+        "$.data[*]",
+        cache_expiration=-1,
+        pagination={**pagination, "prefetch": 4},
+    )
+    assert [row["a"] for row in adapter.get_data({}, [])] == [0, 1, 2, 3, 4, 5]
+    assert [page.call_count for page in pages] == [2, 2, 2]
+
+    # when the total is missing pages are read until a shorter page
+    requests_mock.get(
+        f"{url}?p=2&size=2",
+        json={"data": [{"a": 4}]},
+        complete_qs=True,
+    )
+    requests_mock.get(f"{url}?p=0&size=2", json={"data": [{"a": 0}, {"a": 1}]})
+    adapter = GenericJSONAPI(
+        url,
+        "$.data[*]",
+        cache_expiration=-1,
+        pagination=pagination,
+    )
+    assert [row["a"] for row in adapter.get_data({}, [])] == [0, 1, 2, 3, 4]
+
+
+def test_offset_pagination_with_total(requests_mock: Mocker) -> None:
+    """
+    Test offset pagination when the number of rows is known.
+    """
+    # for datassette and other probing adapters
+    requests_mock.head("https://example.org/-/versions.json", status_code=404)
+
+    url = "https://example.org/data.json"
+    requests_mock.head(url, headers={"content-type": "application/json"})
+    for offset in range(0, 5, 2):
+        requests_mock.get(
+            f"{url}?offset={offset}",
+            json={
+                "count": 5,
+                "data": [{"a": i} for i in range(offset, min(offset + 2, 5))],
+            },
+            complete_qs=True,
+        )
+
+    connection = connect(
+        ":memory:",
+        adapter_kwargs={"genericjsonapi": {"cache_expiration": -1}},
+    )
+    cursor = connection.cursor()
+
+    sql = (
+        f'SELECT SUM(a) FROM "{url}?_s_pagination=(type:offset,total_path:'
+        "'$.count',prefetch:2)#$.data[*]\""
+    )
+    assert cursor.execute(sql).fetchall() == [(10,)]
+
+
+def test_invalid_pagination() -> None:
+    """
+    Test that invalid pagination settings are rejected.
+    """
+    url = "https://example.org/data.json"
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        GenericJSONAPI(url, pagination={"type": "magic"})
+    assert str(excinfo.value) == "Invalid pagination: {'type': 'magic'}"
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        GenericJSONAPI(url, pagination={"type": "cursor"})
+    assert str(excinfo.value) == "Cursor pagination requires a path"
+
+
+def test_supports_pagination_in_url(requests_mock: Mocker) -> None:
+    """
+    Test that the pagination parameter is not sent to the API.
+    """
+    head = requests_mock.head(
+        "https://example.org/data.json",
+        headers={"content-type": "application/json"},
+    )
+
+    assert GenericJSONAPI.supports(
+        "https://example.org/data.json?_s_pagination=(type:link)",
+        fast=False,
+        cache_expiration=-1,
+    )
+    assert head.last_request.url == "https://example.org/data.json"
+
+
+def test_cache_options(requests_mock: Mocker) -> None:
+    """
+    Test configuring the HTTP cache through adapter arguments.
+    """
+    url = "https://example.org/data.json"
+    requests_mock.head(url, headers={"content-type": "application/json"})
+    data = requests_mock.get(url, json=[{"a": 1}, {"a": 2}])
+
+    connection = connect(
+        ":memory:",
+        adapter_kwargs={
+            "genericjsonapi": {
+                "cache_options": {"backend": "memory", "max_size": 1_000_000},
+            },
+        },
+    )
+    cursor = connection.cursor()
+
+    sql = f'SELECT SUM(a) FROM "{url}"'
+    assert cursor.execute(sql).fetchall() == [(3,)]
+    assert cursor.execute(sql).fetchall() == [(3,)]
+    assert data.call_count == 1
+
+    stats = lib.session_pool.get_stats()["generic_json_cache"]
+    assert stats["entries"] == 2
+    assert stats["bytes"] == len(b'[{"a": 1}, {"a": 2}]')
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        GenericJSONAPI(url, cache_options={"backend": "redis"})
+    assert str(excinfo.value) == (
+        "Invalid cache backend: redis. Valid backends are: filesystem, memory, sqlite"
+    )
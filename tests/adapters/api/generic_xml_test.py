@@ -6,10 +6,19 @@ import re
 import xml.etree.ElementTree as ET
 
 import pytest
+from defusedxml import ElementTree as DET
+from defusedxml.common import EntitiesForbidden
 from requests_mock.mocker import Mocker
 from yarl import URL
 
-from shillelagh.adapters.api.generic_xml import element_to_dict
+from shillelagh.adapters.api.generic_xml import (
+    ChunkReader,
+    GenericXMLAPI,
+    element_to_dict,
+    get_steps,
+    iterfind,
+    path_matches,
+)
 from shillelagh.backends.apsw.db import connect
 from shillelagh.exceptions import ProgrammingError
 
@@ -187,3 +196,154 @@ def test_generic_xml(requests_mock: Mocker) -> None:
     with pytest.raises(ProgrammingError) as excinfo:
         list(cursor.execute(sql))
     assert str(excinfo.value) == "Error: Something went wrong"
+
+
+def test_get_steps() -> None:
+    """
+    Test parsing paths into steps.
+    """
+    assert get_steps("*") == [(False, "*")]
+    assert get_steps(".") == []
+    assert get_steps("./bills/bill") == [(False, "bills"), (False, "bill")]
+    assert get_steps(".//bill") == [(True, "bill")]
+    assert get_steps("a/./b") == [(False, "a"), (False, "b")]
+    assert get_steps("a//*") == [(False, "a"), (True, "*")]
+    assert get_steps("{http://example.org/ns}a/b") == [
+        (False, "{http://example.org/ns}a"),
+        (False, "b"),
+    ]
+
+    # paths that need the whole tree, or are invalid
+    assert get_steps(".//bill[type='S']") is None
+    assert get_steps("a/..") is None
+    assert get_steps("{*}a") is None
+    assert get_steps("/a") is None
+    assert get_steps("//a") is None
+    assert get_steps("a/") is None
+    assert get_steps("a//") is None
+
+
+def test_path_matches() -> None:
+    """
+    Test matching steps against the tags of an element and its ancestors.
+    """
+    assert path_matches([], [])
+    assert not path_matches([], ["a"])
+    assert path_matches([(False, "*")], ["a"])
+    assert not path_matches([(False, "a")], ["a", "b"])
+    assert path_matches([(True, "b")], ["a", "c", "b"])
+    assert path_matches([(False, "a"), (True, "b")], ["a", "c", "b"])
+    assert not path_matches([(False, "c"), (True, "b")], ["a", "c", "b"])
+
+
+def test_iterfind() -> None:
+    """
+    Test that streaming returns the same elements as ``findall``.
+    """
+    document = b"""<r xmlns:n="http://example.org/ns">
+    <a><b>1</b><a><b>2</b><c><b>3</b></c></a></a>
+    <b>4</b>
+    <n:a><b>5</b></n:a>
+    <c><a><b>6</b></a></c>
+</r>"""
+    chunks = [document[i : i + 7] for i in range(0, len(document), 7)]
+
+    for path in [
+        ".",
+        "*",
+        "b",
+        "a/b",
+        ".//b",
+        ".//a",
+        ".//a/b",
+        "./a//b",
+        "*/*",
+        "{http://example.org/ns}a/b",
+    ]:
+        steps = get_steps(path)
+        assert steps is not None
+        events = DET.iterparse(ChunkReader(chunks), events=("start", "end"))
+        assert list(iterfind(events, steps)) == [
+            element_to_dict(element)
+            for element in ET.fromstring(document).findall(path)
+        ]
+
+
+def test_iterfind_discards_elements() -> None:
+    """
+    Test that rows are returned before the document is parsed, and then discarded.
+    """
+    chunks = iter(
+        [b"<root><items>", b"<item><a>1</a></item>", b"<item><a>2</a></item>"]
+        + [b"<item><a>3</a></item>", b"</items></root>"],
+    )
+    events = DET.iterparse(ChunkReader(chunks), events=("start", "end"))
+    rows = iterfind(events, [(True, "item")])
+
+    assert next(rows) == {"a": "1"}
+    assert next(chunks) == b"<item><a>2</a></item>"
+
+    root = ET.Element("root")
+    events = iter(
+        [
+            ("start", root),
+            ("start", ET.SubElement(root, "item")),
+            ("end", root[0]),
+            ("start", ET.SubElement(root, "other")),
+            ("end", root[1]),
+            ("end", root),
+        ],
+    )
+    assert list(iterfind(events, [(False, "item")])) == [{}]
+    assert len(root) == 0
+
+
+def test_complex_path(requests_mock: Mocker) -> None:
+    """
+    Test paths that need the whole document.
+    """
+    url = "https://example.org/data.xml"
+    requests_mock.get(
+        url,
+        text="<bills><bill><type>S</type></bill><bill><type>H</type></bill></bills>",
+    )
+
+    adapter = GenericXMLAPI(url, "bill[type='H']", cache_expiration=-1)
+    assert list(adapter.get_data({}, [])) == [{"type": "H", "rowid": 0}]
+
+    adapter = GenericXMLAPI(url, cache_expiration=-1)
+    assert list(adapter.get_data({}, [])) == [
+        {"type": "S", "rowid": 0},
+        {"type": "H", "rowid": 1},
+    ]
+
+
+def test_entities_forbidden(requests_mock: Mocker) -> None:
+    """
+    Test that entity declarations are still rejected when streaming.
+    """
+    url = "https://example.org/data.xml"
+    requests_mock.get(
+        url,
+        text="""<?xml version="1.0"?>
+<!DOCTYPE lolz [<!ENTITY lol "lol"><!ENTITY lol2 "&lol;&lol;&lol;&lol;">]>
+<root><row>&lol2;</row></root>""",
+    )
+
+    with pytest.raises(EntitiesForbidden):
+        GenericXMLAPI(url, cache_expiration=-1)
+
+
+def test_pagination_not_supported() -> None:
+    """
+    Test that pagination is rejected, instead of returning only the first page.
+    """
+    url = "https://example.org/data.xml"
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        GenericXMLAPI(url, pagination={"type": "link"})
+    assert str(excinfo.value) == "Pagination is not supported by GenericXMLAPI"
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        GenericXMLAPI(f"{url}?_s_pagination=(type:link)")
+    assert str(excinfo.value) == "Pagination is not supported by GenericXMLAPI"
@@ -33,6 +33,21 @@ def test_comparison() -> None:
     )
 
 
+def test_hash() -> None:
+    """
+    Test that GSheets fields can be hashed.
+    """
+    assert hash(GSheetsDateTime([], Order.NONE, True)) == hash(
+        GSheetsDateTime([], Order.NONE, True),
+    )
+    fields = {
+        GSheetsDateTime([], Order.NONE, True, "M/d/yyyy H:mm:ss"),
+        GSheetsDateTime([], Order.NONE, True, "M/d/yyyy H:mm:ss"),
+        GSheetsDateTime([], Order.NONE, True, "yyyy-MM-dd HH:mm:ss"),
+    }
+    assert len(fields) == 2
+
+
 def test_GSheetsDateTime() -> None:
     """
     Test ``GSheetsDateTime``.
@@ -1,18 +1,47 @@
-# pylint: disable=c-extension-no-member, invalid-name, unused-argument
+# pylint: disable=c-extension-no-member, invalid-name, unused-argument, too-many-lines
 """
 Tests for shillelagh.adapters.file.csvfile.
 """
 
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
 import apsw
 import pytest
 from freezegun import freeze_time
 from pyfakefs.fake_filesystem import FakeFilesystem
+from pytest_mock import MockerFixture
 from requests_mock.mocker import Mocker
 
-from shillelagh.adapters.file.csvfile import CSVFile, RowTracker
+from shillelagh.adapters.file.csvfile import (
+    BlockIndex,
+    ByteCounter,
+    CSVFile,
+    RowTracker,
+    block_may_match,
+    download,
+    evict_downloads,
+    get_compression,
+    get_download_cache_dir,
+    get_generation,
+    get_metadata_path,
+    get_reader,
+    get_signature,
+    get_tombstones_path,
+    is_csv,
+    open_bytes,
+    scan_chunk,
+)
 from shillelagh.backends.apsw.db import connect
 from shillelagh.backends.apsw.vt import VTModule
 from shillelagh.exceptions import ProgrammingError
@@ -26,6 +55,7 @@ from shillelagh.filters import (
     Operator,
     Range,
 )
+from shillelagh.lib import analyze as analyze_
 from shillelagh.lib import serialize
 
 CONTENTS = """"index","temperature","site"
@@ -141,6 +171,15 @@ def test_csvfile_empty_get_data(fs: FakeFilesystem) -> None:
         list(adapter.get_data({}, []))
     assert str(excinfo.value) == "The file has no rows"
 
+    # compressed files are not reloaded, since they can't be compacted
+    path = fs.create_file("test.csv.gz", contents=gzip.compress(CONTENTS.encode()))
+    adapter = CSVFile("test.csv.gz")
+    path.set_contents(b"")
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        list(adapter.get_data({}, []))
+    assert str(excinfo.value) == "The file has no rows"
+
 
 def test_csvfile_unordered(fs: FakeFilesystem) -> None:
     """
@@ -246,7 +285,7 @@ def test_csvfile(fs: FakeFilesystem) -> None:
     cursor = connection.cursor()
     connection.createmodule("csvfile", VTModule(CSVFile))
     cursor.execute(
-        f"""CREATE VIRTUAL TABLE test USING csvfile('{serialize('test.csv')}')""",
+        f"""CREATE VIRTUAL TABLE test USING csvfile('{serialize("test.csv")}')""",
     )
 
     sql = 'SELECT * FROM test WHERE "index" > 11'
@@ -272,20 +311,16 @@ def test_csvfile(fs: FakeFilesystem) -> None:
         (14.0, 10.1, "New_Site"),
     ]
 
+    generation = get_generation(Path("test.csv"))
     connection.close()
 
-    # test garbage collection
+    # deleted rows are stored in the tombstone log, since there are only a few
     with open("test.csv", encoding="utf-8") as fp:
         updated_contents = fp.read()
-    assert (
-        updated_contents
-        == """"index","temperature","site"
-10.0,15.2,"Diamond_St"
-11.0,13.1,"Blacktail_Loop"
-12.0,13.3,"Platinum_St"
-14.0,10.1,"New_Site"
-"""
-    )
+    assert updated_contents == CONTENTS + '14,10.1,"New_Site"\n'
+    with open(".test.csv.tombstones", encoding="utf-8") as fp:
+        tombstones = fp.read()
+    assert tombstones == json.dumps(generation) + "\n3\n"
 
 
 def test_csvfile_close_not_modified(fs: FakeFilesystem) -> None:
@@ -299,7 +334,7 @@ def test_csvfile_close_not_modified(fs: FakeFilesystem) -> None:
     cursor = connection.cursor()
     connection.createmodule("csvfile", VTModule(CSVFile))
     cursor.execute(
-        f"""CREATE VIRTUAL TABLE test USING csvfile('{serialize('test.csv')}')""",
+        f"""CREATE VIRTUAL TABLE test USING csvfile('{serialize("test.csv")}')""",
     )
 
     sql = 'SELECT * FROM test WHERE "index" > 11'
@@ -339,6 +374,7 @@ def test_drop_table(fs: FakeFilesystem) -> None:
     sql = 'DROP TABLE "test.csv"'
     cursor.execute(sql)
     assert not Path("test.csv").exists()
+    assert not Path(".test.csv.metadata.json").exists()
 
 
 def test_row_tracker() -> None:
@@ -388,10 +424,12 @@ def test_remote_file(fs: FakeFilesystem, requests_mock: Mocker) -> None:
 def test_cleanup(fs: FakeFilesystem, requests_mock: Mocker) -> None:
     """
     Test that local copy is removed when the connection is closed.
+
+    This only happens when downloads are not cached.
     """
     requests_mock.get("https://example.com/test.csv", text=CONTENTS)
 
-    adapter = CSVFile("https://example.com/test.csv")
+    adapter = CSVFile("https://example.com/test.csv", cache_downloads=False)
     assert adapter.path.exists()
     adapter.close()
     assert not adapter.path.exists()
@@ -403,7 +441,7 @@ def test_cleanup_file_deleted(fs: FakeFilesystem, requests_mock: Mocker) -> None
     """
     requests_mock.get("https://example.com/test.csv", text=CONTENTS)
 
-    adapter = CSVFile("https://example.com/test.csv")
+    adapter = CSVFile("https://example.com/test.csv", cache_downloads=False)
     assert adapter.path.exists()
     adapter.path.unlink()
     adapter.close()
@@ -423,6 +461,7 @@ def test_supports(fs: FakeFilesystem, requests_mock: Mocker) -> None:
     assert not CSVFile.supports("invalid.csv")
 
     assert CSVFile.supports("https://example.com/test.csv")
+    assert CSVFile.supports("https://example.com/test.csv.gz")
     assert CSVFile.supports("https://example.com/csv/test") is None
     assert CSVFile.supports("https://example.com/csv/test", fast=False)
 
@@ -456,3 +495,1011 @@ def test_join(fs: FakeFilesystem) -> None:
     """
     data = list(cursor.execute(sql))
     assert data == [("bob", "Italy")]
+
+
+def test_get_signature(fs: FakeFilesystem) -> None:
+    """
+    Test ``get_signature``.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+
+    signature = get_signature(Path("test.csv"))
+    assert signature["size"] == len(CONTENTS)
+    assert (
+        signature["header_hash"]
+        == "43be9f893f6b40ec145c7eebf7e4a68aa1ff748c2f2fb51ccbb2a1254d21212c"
+    )
+
+    # changing the header changes the signature
+    Path("test.csv").write_text(CONTENTS.replace("site", "city"), encoding="utf-8")
+    assert get_signature(Path("test.csv"))["header_hash"] != signature["header_hash"]
+
+
+def test_metadata_cache(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """
+    Test that the metadata is cached and reused.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    analyze = mocker.patch(
+        "shillelagh.adapters.file.csvfile.analyze",
+        wraps=analyze_,
+    )
+
+    adapter = CSVFile("test.csv")
+    assert analyze.call_count == 1
+    assert get_metadata_path(Path("test.csv")) == Path(".test.csv.metadata.json")
+    assert Path(".test.csv.metadata.json").exists()
+
+    cached = CSVFile("test.csv")
+    assert analyze.call_count == 1
+    assert cached.get_columns() == adapter.get_columns()
+    assert cached.num_rows == adapter.num_rows == 4
+    assert (
+        cached.last_row
+        == adapter.last_row
+        == {
+            "index": 13.0,
+            "temperature": 12.1,
+            "site": "Kodiak_Trail",
+        }
+    )
+    assert list(cached.get_data({}, [])) == list(adapter.get_data({}, []))
+
+    # modifying the file invalidates the cache
+    with open("test.csv", "a", encoding="utf-8") as fp:
+        fp.write('9,10.1,"New_Site"\n')
+    adapter = CSVFile("test.csv")
+    assert analyze.call_count == 2
+    assert adapter.num_rows == 5
+    assert adapter.get_columns()["index"].order == Order.NONE
+
+    # corrupted metadata is ignored
+    Path(".test.csv.metadata.json").write_text("{", encoding="utf-8")
+    CSVFile("test.csv")
+    assert analyze.call_count == 3
+
+    # cache can be disabled
+    Path(".test.csv.metadata.json").unlink()
+    CSVFile("test.csv", cache_metadata=False)
+    assert analyze.call_count == 4
+    assert not Path(".test.csv.metadata.json").exists()
+
+
+def test_metadata_cache_dml(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """
+    Test that the cached metadata is updated after DML.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+
+    adapter = CSVFile("test.csv", compaction_threshold=0)
+    adapter.insert_data(
+        {"rowid": None, "index": 14.0, "temperature": 10.1, "site": "New_Site"},
+    )
+    adapter.insert_data(
+        {"rowid": None, "index": 15.0, "temperature": 9.1, "site": "Other_Site"},
+    )
+    adapter.delete_data(5)
+    adapter.close()
+
+    analyze = mocker.patch("shillelagh.adapters.file.csvfile.analyze")
+    adapter = CSVFile("test.csv")
+    analyze.assert_not_called()
+    assert adapter.num_rows == 5
+    assert adapter.last_row == {
+        "index": 14.0,
+        "temperature": 10.1,
+        "site": "New_Site",
+    }
+    assert adapter.get_columns()["index"].order == Order.ASCENDING
+    assert list(adapter.get_data({}, [])) == [
+        {"rowid": 0, "index": 10.0, "temperature": 15.2, "site": "Diamond_St"},
+        {"rowid": 1, "index": 11.0, "temperature": 13.1, "site": "Blacktail_Loop"},
+        {"rowid": 2, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+        {"rowid": 3, "index": 13.0, "temperature": 12.1, "site": "Kodiak_Trail"},
+        {"rowid": 4, "index": 14.0, "temperature": 10.1, "site": "New_Site"},
+    ]
+
+
+def test_metadata_cache_not_writable(
+    mocker: MockerFixture,
+    fs: FakeFilesystem,
+) -> None:
+    """
+    Test that a failure to write the metadata is not fatal.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    mocker.patch(
+        "shillelagh.adapters.file.csvfile.os.replace",
+        side_effect=PermissionError("Permission denied"),
+    )
+    _logger = mocker.patch("shillelagh.adapters.file.csvfile._logger")
+
+    adapter = CSVFile("test.csv")
+    assert adapter.num_rows == 4
+    _logger.warning.assert_called_with(
+        "Unable to write metadata to %s",
+        Path(".test.csv.metadata.json"),
+    )
+
+
+def test_tombstones(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """
+    Test that deleted rows are stored in a log, and compacted above a threshold.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    path = Path("test.csv")
+
+    adapter = CSVFile("test.csv")
+    adapter.delete_data(1)
+    adapter.insert_data(
+        {"rowid": None, "index": 14.0, "temperature": 10.1, "site": "New_Site"},
+    )
+    adapter.close()
+    assert path.read_text(encoding="utf-8") == CONTENTS + '14.0,10.1,"New_Site"\n'
+    assert get_tombstones_path(path).exists()
+
+    analyze = mocker.patch("shillelagh.adapters.file.csvfile.analyze")
+    adapter = CSVFile("test.csv")
+    analyze.assert_not_called()
+    assert adapter.num_rows == 4
+    assert adapter.num_deleted == 1
+    assert list(adapter.get_data({}, [])) == [
+        {"rowid": 0, "index": 10.0, "temperature": 15.2, "site": "Diamond_St"},
+        {"rowid": 2, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+        {"rowid": 3, "index": 13.0, "temperature": 12.1, "site": "Kodiak_Trail"},
+        {"rowid": 4, "index": 14.0, "temperature": 10.1, "site": "New_Site"},
+    ]
+
+    # deleting another row crosses the threshold
+    adapter.delete_data(0)
+    adapter.close()
+    assert not get_tombstones_path(path).exists()
+    assert (
+        path.read_text(encoding="utf-8")
+        == """"index","temperature","site"
+12.0,13.3,"Platinum_St"
+13.0,12.1,"Kodiak_Trail"
+14.0,10.1,"New_Site"
+"""
+    )
+
+    adapter = CSVFile("test.csv")
+    assert adapter.num_rows == 3
+    assert adapter.num_deleted == 0
+    assert [row["rowid"] for row in adapter.get_data({}, [])] == [0, 1, 2]
+
+
+def test_buffered_writes(fs: FakeFilesystem) -> None:
+    """
+    Test that inserts and deletes are buffered until the transaction is committed.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    path = Path("test.csv")
+
+    connection = apsw.Connection(":memory:")
+    cursor = connection.cursor()
+    connection.createmodule("csvfile", VTModule(CSVFile))
+    cursor.execute(
+        f"""CREATE VIRTUAL TABLE test USING csvfile('{serialize("test.csv")}')""",
+    )
+
+    cursor.execute("BEGIN")
+    cursor.execute("DELETE FROM test WHERE site = 'Diamond_St'")
+    cursor.executemany(
+        """INSERT INTO test ("index", temperature, site) VALUES (?, ?, ?)""",
+        [(14, 10.1, "New_Site"), (15, 9.1, "Other_Site")],
+    )
+    assert path.read_text(encoding="utf-8") == CONTENTS
+    assert not get_tombstones_path(path).exists()
+
+    cursor.execute("COMMIT")
+    assert path.read_text(encoding="utf-8") == (
+        CONTENTS + '14,10.1,"New_Site"\n15,9.1,"Other_Site"\n'
+    )
+    assert get_tombstones_path(path).read_text(encoding="utf-8").endswith("\n0\n")
+
+    # rows are written before being read
+    cursor.execute("BEGIN")
+    cursor.execute(
+        """INSERT INTO test ("index", temperature, site) VALUES (16, 8.1, 'Last')""",
+    )
+    assert list(cursor.execute('SELECT "index" FROM test WHERE "index" > 14')) == [
+        (15.0,),
+        (16.0,),
+    ]
+    assert path.read_text(encoding="utf-8").endswith('16,8.1,"Last"\n')
+    cursor.execute("COMMIT")
+    connection.close()
+
+
+def test_tombstones_invalid(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """
+    Test that incomplete, corrupted, or stale tombstones are ignored.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    path = Path("test.csv")
+    tombstones_path = get_tombstones_path(path)
+    _logger = mocker.patch("shillelagh.adapters.file.csvfile._logger")
+
+    adapter = CSVFile("test.csv", cache_metadata=False, compaction_threshold=0.5)
+    adapter.delete_data(1)
+    adapter.close()
+    assert not get_metadata_path(path).exists()
+    with open(tombstones_path, "a", encoding="utf-8") as fp:
+        fp.write("2")
+    adapter = CSVFile("test.csv")
+    assert adapter.num_deleted == 1
+    assert [row["rowid"] for row in adapter.get_data({}, [])] == [0, 2, 3]
+
+    # rows that don't exist are ignored
+    generation = json.dumps(get_generation(path))
+    tombstones_path.write_text(f"{generation}\n1\n99\n", encoding="utf-8")
+    adapter = CSVFile("test.csv")
+    assert adapter.num_deleted == 1
+
+    tombstones_path.write_text("invalid\n1\n", encoding="utf-8")
+    adapter = CSVFile("test.csv")
+    assert adapter.num_deleted == 0
+    _logger.warning.assert_called_with(
+        "Ignoring stale tombstones in %s",
+        tombstones_path,
+    )
+    assert not tombstones_path.exists()
+
+    # replacing the file invalidates the log
+    adapter.delete_data(1)
+    adapter.commit()
+    path.unlink()
+    fs.create_file("test.csv", contents=CONTENTS)
+    adapter = CSVFile("test.csv")
+    assert adapter.num_deleted == 0
+    assert not tombstones_path.exists()
+
+
+def test_vacuum(mocker: MockerFixture, fs: FakeFilesystem) -> None:
+    """
+    Test compacting a file explicitly.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+    _logger = mocker.patch("shillelagh.adapters.file.csvfile._logger")
+
+    adapter = CSVFile("test.csv", cache_metadata=False)
+    adapter.delete_data(3)
+    adapter.commit()
+
+    connection = connect(":memory:", ["csvfile"])
+    cursor = connection.cursor()
+    cursor.execute("SELECT vacuum('test.csv')")
+    assert (
+        Path("test.csv").read_text(encoding="utf-8")
+        == """"index","temperature","site"
+10.0,15.2,"Diamond_St"
+11.0,13.1,"Blacktail_Loop"
+12.0,13.3,"Platinum_St"
+"""
+    )
+    assert not Path(".test.csv.tombstones").exists()
+
+    # the adapter is now stale, and can no longer compact the file
+    adapter.vacuum()
+    adapter.close()
+    _logger.warning.assert_called_with(
+        "File %s was rewritten since it was opened",
+        Path("test.csv"),
+    )
+    assert Path("test.csv").read_text(encoding="utf-8").count("\n") == 4
+
+    # nothing to do
+    adapter = CSVFile("test.csv")
+    adapter.vacuum()
+    assert adapter.num_rows == 3
+
+
+def test_vacuum_open_table(fs: FakeFilesystem) -> None:
+    """
+    Test that tables already open are reloaded after the file is compacted.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+
+    connection = connect(":memory:", ["csvfile"])
+    cursor = connection.cursor()
+    cursor.execute("""DELETE FROM "test.csv" WHERE "index" < 12""")
+    cursor.execute("SELECT vacuum('test.csv')")
+    assert list(cursor.execute('SELECT * FROM "test.csv"')) == [
+        (12.0, 13.3, "Platinum_St"),
+        (13.0, 12.1, "Kodiak_Trail"),
+    ]
+
+    cursor.execute("""DELETE FROM "test.csv" WHERE "index" = 13""")
+    connection.close()
+    adapter = CSVFile("test.csv")
+    assert list(adapter.get_data({}, [])) == [
+        {"rowid": 0, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+    ]
+
+
+def test_vacuum_open_adapter(fs: FakeFilesystem) -> None:
+    """
+    Test DML on an adapter after the file is compacted by another adapter.
+    """
+    fs.create_file("test.csv", contents=CONTENTS)
+
+    adapter = CSVFile("test.csv", cache_metadata=False)
+    other = CSVFile("test.csv", cache_metadata=False)
+    other.delete_data(0)
+    other.vacuum()
+
+    # the file is analyzed again, since its metadata is not cached
+    adapter.delete_data(0)
+    adapter.commit()
+    assert adapter.num_rows == 2
+    assert [row["index"] for row in adapter.get_data({}, [])] == [12.0, 13.0]
+
+    # uncommitted changes would be lost
+    adapter.insert_data({"rowid": None, "index": 14, "temperature": 1.0, "site": "A"})
+    other = CSVFile("test.csv", cache_metadata=False)
+    other.delete_data(2)
+    other.vacuum()
+    with pytest.raises(ProgrammingError) as excinfo:
+        list(adapter.get_data({}, []))
+    assert str(excinfo.value) == (
+        "File test.csv was rewritten while it had uncommitted changes"
+    )
+
+
+def test_block_index() -> None:
+    """
+    Test ``BlockIndex``.
+    """
+    index = BlockIndex(3)
+    index.add(10, [1.0, "a", 1.0])
+    index.add(20, [2.0, "c", float("nan")])
+    index.add(30, [3.0, "b", 2.0])
+    index.add(40, [5.0, 1.0, None])
+    index.add(50, [6.0, "d"])
+    index.end = 60
+
+    assert index.num_rows == 5
+    assert index.blocks == [
+        {"offset": 10, "min": [1.0, "a", None], "max": [3.0, "c", None]},
+        {"offset": 40, "min": [5.0, None, None], "max": [6.0, None, None]},
+    ]
+    assert BlockIndex.from_dict(index.to_dict()).to_dict() == index.to_dict()
+
+    columns = ["a", "b", "c"]
+    assert index.get_segments({}, columns, 5) == ([(0, 10, None)], 0)
+    assert index.get_segments({"a": Range(3.5, 5.5, True, True)}, columns, 5) == (
+        [(3, 40, None)],
+        0,
+    )
+    assert index.get_segments({"a": Equal(2.0)}, columns, 5) == (
+        [(0, 10, 3), (5, 60, None)],
+        0,
+    )
+    assert index.get_segments({"a": Equal(0.0)}, columns, 5) == (
+        [(5, 60, None)],
+        0,
+    )
+
+    # skip offset
+    assert index.get_segments({}, columns, 5, 3, iter([0, 1, 2, 3, 4, 5])) == (
+        [(3, 40, None)],
+        0,
+    )
+    assert index.get_segments({}, columns, 5, 3, iter([-1, 1, 2, 3, 4, 5])) == (
+        [(3, 40, None)],
+        1,
+    )
+
+    # disabled index
+    index = BlockIndex(0)
+    index.add(10, [1.0])
+    assert index.blocks == []
+    assert index.get_segments({"a": Equal(0.0)}, columns, 5) == ([(0, 5, None)], 0)
+
+
+def test_block_may_match() -> None:
+    """
+    Test ``block_may_match``.
+    """
+    block = {"offset": 0, "min": [1.0, None, "b"], "max": [3.0, None, "d"]}
+    positions = {"a": 0, "b": 1, "c": 2}
+
+    assert block_may_match(block, {}, positions)
+    assert block_may_match(block, {"a": Equal(2.0)}, positions)
+    assert not block_may_match(block, {"a": Equal(4.0)}, positions)
+    assert block_may_match(block, {"b": Equal(4.0)}, positions)
+    assert block_may_match(block, {"c": Equal("c")}, positions)
+    assert not block_may_match(block, {"c": Equal("a")}, positions)
+    assert block_may_match(block, {"c": Equal(1.0)}, positions)
+    assert block_may_match(block, {"d": Equal(1.0)}, positions)
+    assert block_may_match(block, {"a": IsNull()}, positions)
+
+    assert block_may_match(block, {"a": NotEqual(2.0)}, positions)
+    assert not block_may_match(
+        {"offset": 0, "min": [1.0], "max": [1.0]},
+        {"a": NotEqual(1.0)},
+        positions,
+    )
+
+    assert block_may_match(block, {"a": Range(3.0, None, True, False)}, positions)
+    assert not block_may_match(block, {"a": Range(3.0, None, False, False)}, positions)
+    assert not block_may_match(block, {"a": Range(4.0, None, True, False)}, positions)
+    assert block_may_match(block, {"a": Range(None, 1.0, False, True)}, positions)
+    assert not block_may_match(block, {"a": Range(None, 1.0, False, False)}, positions)
+    assert not block_may_match(block, {"a": Range(None, 0.0, False, True)}, positions)
+
+
+def test_open_bytes(tmp_path: Path) -> None:
+    """
+    Test ``open_bytes`` with real files, which are memory-mapped.
+    """
+    path = tmp_path / "test.csv"
+    path.write_text(CONTENTS, encoding="utf-8")
+    with open_bytes(path) as fp:
+        assert fp.__class__.__name__ == "mmap"
+        reader = get_reader(fp)
+        assert next(reader) == ["index", "temperature", "site"]
+        offset = fp.tell()
+        assert next(reader) == [10.0, 15.2, "Diamond_St"]
+        fp.seek(offset)
+        assert next(reader) == [10.0, 15.2, "Diamond_St"]
+
+    # empty files can't be mapped
+    path.write_text("", encoding="utf-8")
+    with open_bytes(path) as fp:
+        assert fp.read() == b""
+
+
+def test_byte_counter(fs: FakeFilesystem) -> None:
+    """
+    Test ``ByteCounter``.
+    """
+    with open("test.csv", "wb") as fp:
+        counter = ByteCounter(fp)
+        assert counter.write("ação") == 6
+        assert counter.position == 6
+
+
+def test_csvfile_index(tmp_path: Path) -> None:
+    """
+    Test that the index is used to read data.
+    """
+    rows = "".join(f'{i},{i % 7},"name_{i % 3}"\n' for i in range(100))
+    path = tmp_path / "test.csv"
+    path.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+    copy = tmp_path / "copy.csv"
+    copy.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+
+    adapter = CSVFile(str(path), block_size=10, compaction_threshold=0)
+    baseline = CSVFile(
+        str(copy),
+        cache_metadata=False,
+        block_size=0,
+        compaction_threshold=0,
+    )
+    assert len(adapter.index.blocks) == 10
+    assert baseline.index.blocks == []
+
+    for adapter_ in (adapter, baseline):
+        adapter_.delete_data(15)
+        adapter_.delete_data(55)
+        adapter_.insert_data({"rowid": None, "a": 200, "b": 200, "c": "new"})
+
+    for bounds, limit, offset in [
+        ({}, None, None),
+        ({}, 5, 50),
+        ({}, None, 98),
+        ({"a": Range(50.0, 60.0, True, False)}, None, None),
+        ({"a": Equal(42.0)}, None, None),
+        ({"a": Range(99.0, None, False, False)}, None, None),
+        ({"c": Equal("new")}, None, None),
+        ({"b": Equal(6.0)}, 2, 3),
+    ]:
+        assert list(adapter.get_data(bounds, [], limit, offset)) == list(
+            baseline.get_data(bounds, [], limit, offset),
+        )
+    assert list(adapter.get_data({}, [], 2, 50)) == [
+        {"rowid": 51, "a": 51.0, "b": 2.0, "c": "name_0"},
+        {"rowid": 52, "a": 52.0, "b": 3.0, "c": "name_1"},
+    ]
+
+    # the index is rebuilt when the file is garbage collected
+    adapter.close()
+    baseline.close()
+    assert not get_metadata_path(copy).exists()
+    assert adapter.index.num_rows == 99
+    assert adapter.index.blocks[1]["min"] == [10.0, 0.0, "name_0"]
+    assert adapter.index.blocks[1]["max"] == [20.0, 6.0, "name_2"]
+    assert adapter.index.end == path.stat().st_size
+
+    # and stored with the metadata
+    adapter = CSVFile(str(path), block_size=10)
+    assert adapter.index.num_rows == 99
+    assert list(adapter.get_data({"a": Equal(200.0)}, [])) == [
+        {"rowid": 98, "a": 200.0, "b": 200.0, "c": "new"},
+    ]
+
+
+def test_block_index_split() -> None:
+    """
+    Test ``BlockIndex.split``.
+    """
+    index = BlockIndex(
+        10,
+        [{"offset": 100 * i, "min": [], "max": []} for i in range(10)],
+        95,
+        1000,
+    )
+
+    assert index.split([(0, 0, None)], 30) == [
+        (0, 0, 30),
+        (30, 300, 60),
+        (60, 600, 90),
+        (90, 900, None),
+    ]
+    assert index.split([(10, 100, 40), (60, 600, 70), (95, 1000, None)], 25) == [
+        (10, 100, 30),
+        (30, 300, 40),
+        (60, 600, 70),
+        (95, 1000, None),
+    ]
+    assert index.split([(0, 0, 20)], 5) == [(0, 0, 10), (10, 100, 20)]
+
+
+def test_scan_chunk(tmp_path: Path) -> None:
+    """
+    Test ``scan_chunk``.
+    """
+    path = tmp_path / "test.csv"
+    path.write_text(CONTENTS, encoding="utf-8")
+    column_names = ["index", "temperature", "site"]
+    offset = len(CONTENTS.split("\n", maxsplit=1)[0]) + 1
+
+    assert scan_chunk(path, column_names, (0, offset, None), {}, ["site"]) == (
+        [0, 1, 2, 3],
+        [["Diamond_St", "Blacktail_Loop", "Platinum_St", "Kodiak_Trail"]],
+    )
+    assert scan_chunk(
+        path,
+        column_names,
+        (0, offset, 3),
+        {"index": Range(11.0, None, True, False)},
+        ["index", "site"],
+    ) == ([1, 2], [[11.0, 12.0], ["Blacktail_Loop", "Platinum_St"]])
+
+
+def test_csvfile_parallel(tmp_path: Path) -> None:
+    """
+    Test parallel scans.
+    """
+    rows = "".join(f'{i},{i % 7},"name_{i % 3}"\n' for i in range(100))
+    path = tmp_path / "test.csv"
+    path.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+    copy = tmp_path / "copy.csv"
+    copy.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+
+    adapter = CSVFile(str(path), block_size=10, workers=2, chunk_size=20)
+    baseline = CSVFile(str(copy), cache_metadata=False)
+    assert adapter.workers == 2
+
+    for adapter_ in (adapter, baseline):
+        adapter_.delete_data(15)
+        adapter_.delete_data(55)
+        adapter_.insert_data({"rowid": None, "a": 200, "b": 200, "c": "new"})
+
+    for bounds, order, limit, offset, requested_columns in [
+        ({}, [], None, None, None),
+        ({}, [], 5, 50, None),
+        ({"a": Range(50.0, 60.0, True, False)}, [], None, None, {"c"}),
+        ({"c": Equal("new")}, [], None, None, None),
+        ({"b": Equal(6.0)}, [("a", Order.DESCENDING)], 2, 3, {"a"}),
+        ({"b": Impossible()}, [], None, None, None),
+    ]:
+        assert list(
+            adapter.get_data(bounds, order, limit, offset, requested_columns),
+        ) == list(baseline.get_data(bounds, order, limit, offset, requested_columns))
+
+    assert CSVFile(str(path), workers=0).workers >= 1
+
+
+def test_csvfile_parallel_bounded(tmp_path: Path, mocker: MockerFixture) -> None:
+    """
+    Test that parallel scans only parse a few chunks ahead of the rows consumed.
+    """
+    rows = "".join(f'{i},"name_{i}"\n' for i in range(200))
+    path = tmp_path / "test.csv"
+    path.write_text(f'"a","b"\n{rows}', encoding="utf-8")
+    submit = mocker.spy(ProcessPoolExecutor, "submit")
+
+    adapter = CSVFile(str(path), block_size=10, workers=2, chunk_size=20)
+    rows_ = adapter.get_data({}, [])
+    assert next(rows_) == {"rowid": 0, "a": 0.0, "b": "name_0"}
+    assert submit.call_count == 3
+
+    # closing the generator stops the scan
+    rows_.close()
+    assert submit.call_count == 3
+    adapter.close()
+
+
+def test_csvfile_arrow(tmp_path: Path) -> None:
+    """
+    Test scans with the ``arrow`` engine.
+    """
+    rows = "".join(f'{i},{i % 7},"name_{i % 3}"\n' for i in range(100))
+    path = tmp_path / "test.csv"
+    path.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+    copy = tmp_path / "copy.csv"
+    copy.write_text(f'"a","b","c"\n{rows}', encoding="utf-8")
+
+    adapter = CSVFile(str(path), block_size=10, engine="arrow")
+    baseline = CSVFile(str(copy), block_size=10)
+
+    for adapter_ in (adapter, baseline):
+        adapter_.delete_data(15)
+        adapter_.delete_data(55)
+        adapter_.insert_data({"rowid": None, "a": 200, "b": 200, "c": "new"})
+
+    for bounds, order, limit, offset, requested_columns in [
+        ({}, [], None, None, None),
+        ({}, [], 5, 50, None),
+        ({"a": Range(50.0, 60.0, True, False)}, [], None, None, {"c"}),
+        ({"a": Range(None, 20.0, False, True)}, [], None, None, {"rowid"}),
+        ({"a": Range(95.0, None, False, False)}, [], None, None, None),
+        ({"a": NotEqual(3.0), "c": Equal("new")}, [], None, None, None),
+        ({"c": NotEqual("name_1")}, [("a", Order.DESCENDING)], 2, 3, {"a"}),
+        ({"a": Impossible()}, [], None, None, None),
+    ]:
+        assert list(
+            adapter.get_data(bounds, order, limit, offset, requested_columns),
+        ) == list(baseline.get_data(bounds, order, limit, offset, requested_columns))
+
+    # unquoted empty values are read as nulls
+    rows = "".join(f"{i},{'' if i % 10 == 0 else f'{i % 7}'}\n" for i in range(30))
+    path = tmp_path / "nulls.csv"
+    path.write_text(f'"a","b"\n{rows}', encoding="utf-8")
+    adapter = CSVFile(str(path), block_size=10, engine="arrow")
+    assert list(adapter.get_data({"b": IsNull()}, [])) == [
+        {"rowid": 0, "a": 0.0, "b": None},
+        {"rowid": 10, "a": 10.0, "b": None},
+        {"rowid": 20, "a": 20.0, "b": None},
+    ]
+    assert len(list(adapter.get_data({"b": IsNotNull()}, []))) == 27
+    assert len(list(adapter.get_data({"b": NotEqual("1")}, []))) == 25
+    assert list(adapter.get_data({"a": Range(None, 1.0, False, False)}, [])) == [
+        {"rowid": 0, "a": 0.0, "b": None},
+    ]
+
+
+def test_csvfile_arrow_compressed(tmp_path: Path) -> None:
+    """
+    Test scans of compressed files with the ``arrow`` engine.
+    """
+    path = tmp_path / "test.csv.gz"
+    path.write_bytes(gzip.compress(CONTENTS.encode()))
+
+    adapter = CSVFile(str(path), block_size=2, engine="arrow")
+    assert list(adapter.get_data({}, [], 2, 1)) == [
+        {"rowid": 1, "index": 11.0, "temperature": 13.1, "site": "Blacktail_Loop"},
+        {"rowid": 2, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+    ]
+    assert list(adapter.get_data({"index": Range(11.5, None, False, False)}, [])) == [
+        {"rowid": 2, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+        {"rowid": 3, "index": 13.0, "temperature": 12.1, "site": "Kodiak_Trail"},
+    ]
+    assert list(adapter.get_data({"index": Range(None, 11.0, False, False)}, [])) == [
+        {"rowid": 0, "index": 10.0, "temperature": 15.2, "site": "Diamond_St"},
+    ]
+
+
+def test_csvfile_arrow_invalid(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """
+    Test invalid engines.
+    """
+    path = tmp_path / "test.csv"
+    path.write_text(CONTENTS, encoding="utf-8")
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        CSVFile(str(path), engine="polars")
+    assert str(excinfo.value) == "Invalid engine: polars"
+
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ProgrammingError) as excinfo:
+        CSVFile(str(path), engine="arrow")
+    assert str(excinfo.value) == "The ``arrow`` engine requires the ``pyarrow`` package"
+
+
+def test_download(fs: FakeFilesystem, requests_mock: Mocker) -> None:
+    """
+    Test downloading remote files to the cache.
+    """
+    cache_dir = get_download_cache_dir()
+    assert cache_dir == Path(tempfile.gettempdir()) / "shillelagh" / "downloads"
+    assert get_download_cache_dir("/path/to/cache") == Path("/path/to/cache")
+
+    requests_mock.get(
+        "https://example.com/test.csv",
+        text=CONTENTS,
+        headers={"ETag": '"abc"', "Last-Modified": "Sat, 01 Jan 2022 00:00:00 GMT"},
+    )
+    path = download("https://example.com/test.csv", cache_dir)
+    assert path.read_text(encoding="utf-8") == CONTENTS
+    assert "If-None-Match" not in requests_mock.last_request.headers
+
+    # cached file is revalidated
+    requests_mock.get("https://example.com/test.csv", status_code=304)
+    assert download("https://example.com/test.csv", cache_dir) == path
+    assert requests_mock.last_request.headers["If-None-Match"] == '"abc"'
+    assert (
+        requests_mock.last_request.headers["If-Modified-Since"]
+        == "Sat, 01 Jan 2022 00:00:00 GMT"
+    )
+    assert path.read_text(encoding="utf-8") == CONTENTS
+
+    # file changed
+    requests_mock.get(
+        "https://example.com/test.csv",
+        text=CONTENTS.replace("Diamond_St", "Gold_St"),
+        headers={"ETag": '"def"'},
+    )
+    download("https://example.com/test.csv", cache_dir)
+    assert "Gold_St" in path.read_text(encoding="utf-8")
+
+    requests_mock.get("https://example.com/test.csv", status_code=304)
+    download("https://example.com/test.csv", cache_dir)
+    assert requests_mock.last_request.headers["If-None-Match"] == '"def"'
+    assert "If-Modified-Since" not in requests_mock.last_request.headers
+
+
+def test_download_resume(fs: FakeFilesystem, requests_mock: Mocker) -> None:
+    """
+    Test that interrupted downloads are resumed.
+    """
+    cache_dir = get_download_cache_dir()
+    requests_mock.get(
+        "https://example.com/test.csv",
+        status_code=500,
+        headers={"Last-Modified": "Sat, 01 Jan 2022 00:00:00 GMT"},
+    )
+    with pytest.raises(ProgrammingError) as excinfo:
+        download("https://example.com/test.csv", cache_dir)
+    assert str(excinfo.value) == "Unable to download https://example.com/test.csv: 500"
+
+    # simulate a partial download
+    partial_path = next(cache_dir.glob("*.csv.part"))
+    partial_path.write_text(CONTENTS[:10], encoding="utf-8")
+
+    requests_mock.get(
+        "https://example.com/test.csv",
+        status_code=206,
+        text=CONTENTS[10:],
+    )
+    path = download("https://example.com/test.csv", cache_dir)
+    assert requests_mock.last_request.headers["Range"] == "bytes=10-"
+    assert (
+        requests_mock.last_request.headers["If-Range"]
+        == "Sat, 01 Jan 2022 00:00:00 GMT"
+    )
+    assert path.read_text(encoding="utf-8") == CONTENTS
+    assert not partial_path.exists()
+
+    requests_mock.get("https://example.com/test.csv", status_code=304)
+    download("https://example.com/test.csv", cache_dir)
+    assert "If-None-Match" not in requests_mock.last_request.headers
+    assert (
+        requests_mock.last_request.headers["If-Modified-Since"]
+        == "Sat, 01 Jan 2022 00:00:00 GMT"
+    )
+
+
+def test_download_concurrent(fs: FakeFilesystem, requests_mock: Mocker) -> None:
+    """
+    Test that concurrent downloads don't write to the same file.
+    """
+    cache_dir = get_download_cache_dir()
+    requests_mock.get(
+        "https://example.com/test.csv",
+        status_code=500,
+        headers={"ETag": '"abc"'},
+    )
+    with pytest.raises(ProgrammingError):
+        download("https://example.com/test.csv", cache_dir)
+    partial_path = next(cache_dir.glob("*.csv.part"))
+    partial_path.write_text(CONTENTS[:10], encoding="utf-8")
+
+    # another process claimed the interrupted download, so it's downloaded again
+    os.rename(partial_path, partial_path.with_name("other.part"))
+    requests_mock.get("https://example.com/test.csv", text=CONTENTS)
+    path = download("https://example.com/test.csv", cache_dir)
+    assert "Range" not in requests_mock.last_request.headers
+    assert path.read_text(encoding="utf-8") == CONTENTS
+    assert sorted(path.name for path in cache_dir.glob("*.part")) == ["other.part"]
+
+
+def test_evict_downloads(
+    mocker: MockerFixture,
+    fs: FakeFilesystem,
+    requests_mock: Mocker,
+) -> None:
+    """
+    Test that the least recently used downloads are evicted from the cache.
+    """
+    cache_dir = get_download_cache_dir()
+    paths = []
+    for i in range(3):
+        requests_mock.get(f"https://example.com/{i}.csv", text=CONTENTS)
+        path = download(f"https://example.com/{i}.csv", cache_dir)
+        get_metadata_path(path).write_text("{}", encoding="utf-8")
+        os.utime(path, (i, i))
+        paths.append(path)
+
+    # revalidating a file marks it as used, keeping its modification time
+    requests_mock.get("https://example.com/0.csv", status_code=304)
+    download("https://example.com/0.csv", cache_dir)
+    assert paths[0].stat().st_atime > paths[2].stat().st_atime
+    assert paths[0].stat().st_mtime == 0
+
+    # interrupted downloads expire
+    fs.create_file(cache_dir / "stale.part", contents="stale")
+    os.utime(cache_dir / "stale.part", (0, 0))
+    fs.create_file(cache_dir / "recent.part", contents="recent")
+
+    evict_downloads(cache_dir, 2 * len(CONTENTS), keep=paths[2])
+    assert [path.exists() for path in paths] == [True, False, True]
+    assert not paths[1].with_suffix(".json").exists()
+    assert not get_metadata_path(paths[1]).exists()
+    assert paths[0].with_suffix(".json").exists()
+    assert not (cache_dir / "stale.part").exists()
+    assert (cache_dir / "recent.part").exists()
+
+    # the file being used is never evicted
+    evict_downloads(cache_dir, 0, keep=paths[2])
+    assert [path.exists() for path in paths] == [False, False, True]
+
+    # the cache is bounded after each download
+    requests_mock.get("https://example.com/3.csv", text=CONTENTS)
+    path = download("https://example.com/3.csv", cache_dir, max_cache_size=0)
+    assert sorted(cache_dir.glob("*.csv")) == [path]
+
+    # files removed by another process are ignored
+    mocker.patch.object(
+        type(cache_dir),
+        "iterdir",
+        return_value=iter([cache_dir / "missing.csv", path]),
+    )
+    evict_downloads(cache_dir, 0, keep=path)
+    assert path.exists()
+
+
+def test_csvfile_cached_download(
+    mocker: MockerFixture,
+    fs: FakeFilesystem,
+    requests_mock: Mocker,
+) -> None:
+    """
+    Test that remote files and their metadata are cached.
+    """
+    requests_mock.get(
+        "https://example.com/test.csv",
+        text=CONTENTS,
+        headers={"ETag": '"abc"'},
+    )
+    adapter = CSVFile("https://example.com/test.csv", cache_dir="/cache")
+    assert adapter.path.parent == Path("/cache")
+    assert adapter.cache_metadata
+    adapter.close()
+    assert adapter.path.exists()
+
+    requests_mock.get("https://example.com/test.csv", status_code=304)
+    analyze = mocker.patch("shillelagh.adapters.file.csvfile.analyze")
+    adapter = CSVFile("https://example.com/test.csv", cache_dir="/cache")
+    analyze.assert_not_called()
+    assert list(adapter.get_data({"index": Equal(10.0)}, [])) == [
+        {"rowid": 0, "index": 10.0, "temperature": 15.2, "site": "Diamond_St"},
+    ]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        adapter.delete_data(0)
+    assert str(excinfo.value) == "Cannot apply DML to a remote file"
+
+
+def test_is_csv() -> None:
+    """
+    Test ``is_csv``.
+    """
+    assert is_csv(Path("test.csv"))
+    assert is_csv(Path("test.2024.csv"))
+    assert is_csv(Path("test.csv.gz"))
+    assert is_csv(Path("test.csv.bz2"))
+    assert is_csv(Path("test.csv.xz"))
+    assert is_csv(Path("test.csv.zst"))
+    assert not is_csv(Path("test"))
+    assert not is_csv(Path("test.gz"))
+    assert not is_csv(Path("test.csv.zip"))
+    assert not is_csv(Path("test.json"))
+
+
+@pytest.mark.parametrize(
+    "extension,compress",
+    [(".gz", gzip.compress), (".bz2", bz2.compress), (".xz", lzma.compress)],
+)
+def test_compressed(
+    fs: FakeFilesystem,
+    extension: str,
+    compress: Any,
+) -> None:
+    """
+    Test reading compressed files.
+    """
+    fs.create_file("test.csv")
+    fs.create_file(f"test.csv{extension}", contents=compress(CONTENTS.encode()))
+    assert get_compression(Path("test.csv")) is None
+    assert get_compression(Path(f"test.csv{extension}")) == extension
+    assert CSVFile.supports(f"test.csv{extension}")
+
+    adapter = CSVFile(f"test.csv{extension}", block_size=2)
+    assert adapter.num_rows == 4
+    assert adapter.index.blocks[1]["min"] == [12.0, 12.1, "Kodiak_Trail"]
+    assert list(adapter.get_data({}, [], 1, 2)) == [
+        {"rowid": 2, "index": 12.0, "temperature": 13.3, "site": "Platinum_St"},
+    ]
+    assert list(adapter.get_data({"index": Range(12.5, None, False, False)}, [])) == [
+        {"rowid": 3, "index": 13.0, "temperature": 12.1, "site": "Kodiak_Trail"},
+    ]
+
+    # metadata is cached
+    assert CSVFile(f"test.csv{extension}").get_columns() == adapter.get_columns()
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        adapter.insert_data({"rowid": None, "index": 14, "temperature": 1, "site": ""})
+    assert str(excinfo.value) == "Cannot apply DML to a compressed file"
+    with pytest.raises(ProgrammingError) as excinfo:
+        adapter.delete_data(0)
+    assert str(excinfo.value) == "Cannot apply DML to a compressed file"
+
+
+def test_compressed_parallel(tmp_path: Path) -> None:
+    """
+    Test that compressed files are not scanned in parallel.
+    """
+    path = tmp_path / "test.csv.gz"
+    path.write_bytes(gzip.compress(CONTENTS.encode()))
+
+    adapter = CSVFile(str(path), block_size=2, workers=2)
+    assert list(adapter.get_data({"index": Equal(11.0)}, [])) == [
+        {"rowid": 1, "index": 11.0, "temperature": 13.1, "site": "Blacktail_Loop"},
+    ]
+
+
+def test_compressed_zstd(
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    fs: FakeFilesystem,
+) -> None:
+    """
+    Test reading Zstandard files.
+    """
+    fs.create_file("test.csv.zst", contents=b"\x28\xb5\x2f\xfd")
+    zstandard = mocker.MagicMock()
+    zstandard.ZstdDecompressor().stream_reader.side_effect = lambda fp: io.BytesIO(
+        CONTENTS.encode(),
+    )
+    monkeypatch.setitem(sys.modules, "zstandard", zstandard)
+
+    adapter = CSVFile("test.csv.zst")
+    assert adapter.compression == ".zst"
+    assert list(adapter.get_data({"index": Equal(11.0)}, [])) == [
+        {"rowid": 1, "index": 11.0, "temperature": 13.1, "site": "Blacktail_Loop"},
+    ]
+
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ProgrammingError) as excinfo:
+        CSVFile("test.csv.zst", cache_metadata=False)
+    assert (
+        str(excinfo.value)
+        == "Reading Zstandard files requires the ``zstandard`` package"
+    )
@@ -0,0 +1,356 @@
+# pylint: disable=redefined-outer-name, unused-argument
+"""
+Tests for shillelagh.adapters.file.csvglob.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from pyfakefs.fake_filesystem import FakeFilesystem
+from pytest_mock import MockerFixture
+
+from shillelagh.adapters.file.csvfile import CSVFile
+from shillelagh.adapters.file.csvglob import (
+    CSVGlob,
+    get_partitions,
+    get_paths,
+    value_may_match,
+)
+from shillelagh.adapters.registry import AdapterLoader
+from shillelagh.backends.apsw.db import connect
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Float, Order, String
+from shillelagh.filters import (
+    Equal,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    NotEqual,
+    Operator,
+    Range,
+)
+
+
+@pytest.fixture
+def events(fs: FakeFilesystem) -> FakeFilesystem:
+    """
+    Create a directory with CSV files partitioned by day.
+    """
+    fs.create_file(
+        "/events/day=2024-05-01/events.csv",
+        contents=""""index","temperature","site"
+10,15.2,"Diamond_St"
+11,13.1,"Blacktail_Loop"
+12,13.3,"Platinum_St"
+""",
+    )
+    fs.create_file(
+        "/events/day=2024-05-02/events.csv",
+        contents=""""index","temperature","site","note"
+13,12.1,"Kodiak_Trail","windy"
+14,11.0,"Diamond_St","rain"
+""",
+    )
+    fs.create_file(
+        "/events/day=2024-05-03/events.csv",
+        contents=""""index","temperature","site"
+15,10.5,1
+""",
+    )
+    fs.create_file("/events/day=2024-05-03/.events.csv.bak")
+    fs.create_file("/events/README.md")
+    return fs
+
+
+def test_get_paths(events: FakeFilesystem) -> None:
+    """
+    Test ``get_paths``.
+    """
+    assert get_paths("/events") == [
+        Path("/events/day=2024-05-01/events.csv"),
+        Path("/events/day=2024-05-02/events.csv"),
+        Path("/events/day=2024-05-03/events.csv"),
+    ]
+    assert get_paths("/events/day=2024-05-0[12]/*.csv") == [
+        Path("/events/day=2024-05-01/events.csv"),
+        Path("/events/day=2024-05-02/events.csv"),
+    ]
+    assert get_paths("/events/**/*") == get_paths("/events")
+    assert get_paths("/events/day=2024-05-01/events.csv") == []
+    assert get_paths("/missing/*.csv") == []
+    assert get_paths("/missing") == []
+
+
+def test_get_partitions() -> None:
+    """
+    Test ``get_partitions``.
+    """
+    assert get_partitions(Path("/events/events.csv")) == {}
+    assert get_partitions(Path("/events/day=2024-05-01/site=Diamond%20St/a.csv")) == {
+        "day": "2024-05-01",
+        "site": "Diamond St",
+    }
+
+
+def test_value_may_match() -> None:
+    """
+    Test ``value_may_match``.
+    """
+    assert value_may_match(Equal("2024-05-01"), "2024-05-01")
+    assert not value_may_match(Equal("2024-05-01"), "2024-05-02")
+    assert value_may_match(Range("2024-05-01", None, True, False), "2024-05-01")
+    assert value_may_match(IsNull(), None)
+    assert value_may_match(NotEqual("a"), None)
+    assert not value_may_match(Range(1, None, True, False), None)
+
+
+def test_csvglob(events: FakeFilesystem) -> None:
+    """
+    Test querying multiple files.
+    """
+    assert CSVGlob.supports("/events")
+    assert CSVGlob.supports("/events/*/*.csv")
+    assert not CSVGlob.supports("/events/day=2024-05-01/events.csv")
+    assert CSVGlob.parse_uri("/events") == ("/events",)
+
+    adapter = CSVGlob("/events", workers=2)
+    assert adapter.workers == 2
+    assert adapter.offsets == [0, 4, 7, 9]
+    assert adapter.get_columns() == {
+        "index": Float(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.NONE,
+            exact=True,
+        ),
+        "temperature": Float(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.NONE,
+            exact=True,
+        ),
+        "site": String(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.NONE,
+            exact=False,
+        ),
+        "note": String(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.NONE,
+            exact=True,
+        ),
+        "day": String(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.NONE,
+            exact=True,
+        ),
+    }
+    assert adapter.get_cost([], []) == 0
+    assert (
+        adapter.get_cost([("day", Operator.EQ)], [("index", Order.ASCENDING)]) == 11000
+    )
+
+    assert list(adapter.get_data({}, [])) == [
+        {
+            "rowid": 0,
+            "index": 10.0,
+            "temperature": 15.2,
+            "site": "Diamond_St",
+            "note": None,
+            "day": "2024-05-01",
+        },
+        {
+            "rowid": 1,
+            "index": 11.0,
+            "temperature": 13.1,
+            "site": "Blacktail_Loop",
+            "note": None,
+            "day": "2024-05-01",
+        },
+        {
+            "rowid": 2,
+            "index": 12.0,
+            "temperature": 13.3,
+            "site": "Platinum_St",
+            "note": None,
+            "day": "2024-05-01",
+        },
+        {
+            "rowid": 4,
+            "index": 13.0,
+            "temperature": 12.1,
+            "site": "Kodiak_Trail",
+            "note": "windy",
+            "day": "2024-05-02",
+        },
+        {
+            "rowid": 5,
+            "index": 14.0,
+            "temperature": 11.0,
+            "site": "Diamond_St",
+            "note": "rain",
+            "day": "2024-05-02",
+        },
+        {
+            "rowid": 7,
+            "index": 15.0,
+            "temperature": 10.5,
+            "site": 1.0,
+            "note": None,
+            "day": "2024-05-03",
+        },
+    ]
+
+    assert list(adapter.get_data({}, [], 2, 2, {"index"})) == [
+        {"rowid": 2, "index": 12.0},
+        {"rowid": 4, "index": 13.0},
+    ]
+    assert list(
+        adapter.get_data({"day": Equal("2024-05-02")}, [], None, None, {"day"})
+    ) == [
+        {"rowid": 4, "day": "2024-05-02"},
+        {"rowid": 5, "day": "2024-05-02"},
+    ]
+    assert list(adapter.get_data({"note": IsNull()}, [], None, None, {"index"})) == [
+        {"rowid": 0, "index": 10.0},
+        {"rowid": 1, "index": 11.0},
+        {"rowid": 2, "index": 12.0},
+        {"rowid": 7, "index": 15.0},
+    ]
+    # the filter is not applied to the file where the column has a different type
+    assert list(
+        adapter.get_data({"site": Equal("Diamond_St")}, [], None, None, {"index"}),
+    ) == [
+        {"rowid": 0, "index": 10.0},
+        {"rowid": 5, "index": 14.0},
+        {"rowid": 7, "index": 15.0},
+    ]
+    assert list(
+        adapter.get_data(
+            {"index": Range(12.0, None, False, False)},
+            [("index", Order.DESCENDING)],
+            1,
+            None,
+            {"index"},
+        ),
+    ) == [{"rowid": 7, "index": 15.0}]
+    assert not list(adapter.get_data({"index": Impossible()}, []))
+
+    adapter.close()
+
+
+def test_csvglob_pruning(events: FakeFilesystem, mocker: MockerFixture) -> None:
+    """
+    Test that files that can't have matching rows are not read.
+    """
+    adapter = CSVGlob("/events/*/*.csv", block_size=2, workers=1)
+    get_data = mocker.spy(CSVFile, "get_data")
+
+    assert list(
+        adapter.get_data(
+            {"index": Range(12.5, 14.0, False, True)},
+            [],
+            requested_columns={"index"},
+        ),
+    ) == [{"rowid": 4, "index": 13.0}, {"rowid": 5, "index": 14.0}]
+    assert [call.args[0].path for call in get_data.call_args_list] == [
+        Path("/events/day=2024-05-02/events.csv"),
+    ]
+
+    get_data.reset_mock()
+    assert not list(
+        adapter.get_data({"day": Range("2024-06-01", None, True, False)}, [])
+    )
+    assert not list(adapter.get_data({"note": Equal("hail")}, []))
+    assert not get_data.called
+
+    # stop reading after the limit
+    assert list(adapter.get_data({}, [], 1, None, {"index"})) == [
+        {"rowid": 0, "index": 10.0},
+    ]
+
+
+def test_csvglob_bounded(events: FakeFilesystem, mocker: MockerFixture) -> None:
+    """
+    Test that files are read in bounded batches, and stopped when the scan is closed.
+    """
+    mocker.patch("shillelagh.adapters.file.csvglob.BATCH_SIZE", 1)
+    mocker.patch("shillelagh.adapters.file.csvglob.MAX_BATCHES", 1)
+    mocker.patch("shillelagh.adapters.file.csvglob.POLL_INTERVAL", 0.01)
+    threads = threading.active_count()
+
+    adapter = CSVGlob("/events", workers=2)
+    rows = adapter.get_data({}, [])
+    assert next(rows)["index"] == 10
+
+    # give the threads time to fill their buffers
+    time.sleep(0.1)
+    rows.close()
+
+    # the threads blocked on full buffers stop
+    for _ in range(100):
+        if threading.active_count() == threads:
+            break
+        time.sleep(0.01)
+    assert threading.active_count() == threads
+
+    # the rows are the same with batches
+    assert [row["index"] for row in adapter.get_data({}, [])] == [
+        10,
+        11,
+        12,
+        13,
+        14,
+        15,
+    ]
+
+
+def test_csvglob_invalid(fs: FakeFilesystem) -> None:
+    """
+    Test that at least one file is needed.
+    """
+    fs.create_dir("/events")
+    with pytest.raises(ProgrammingError) as excinfo:
+        CSVGlob("/events")
+    assert str(excinfo.value) == "No CSV files found in /events"
+
+    assert CSVGlob.supports("/events") is False
+
+
+def test_csvglob_invalid_file(events: FakeFilesystem, mocker: MockerFixture) -> None:
+    """
+    Test that the adapter can be closed when one of the files can't be opened.
+    """
+    register = mocker.patch("shillelagh.adapters.base.atexit.register")
+    events.create_file("/events/day=2024-05-04/events.csv", contents="")
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        CSVGlob("/events")
+    assert str(excinfo.value) == "The file has no rows"
+
+    # the callbacks registered by the glob adapter and the files it opened
+    for call in register.call_args_list:
+        call.args[0]()
+
+
+def test_csvglob_sql(events: FakeFilesystem, registry: AdapterLoader) -> None:
+    """
+    Test querying multiple files with SQL.
+    """
+    registry.add("csvglob", CSVGlob)
+
+    connection = connect(":memory:", ["csvglob"])
+    cursor = connection.cursor()
+    sql = """
+        SELECT day, COUNT(*), MAX(temperature)
+        FROM "/events"
+        WHERE day >= '2024-05-02'
+        GROUP BY day
+    """
+    assert cursor.execute(sql).fetchall() == [
+        ("2024-05-02", 2, 12.1),
+        ("2024-05-03", 1, 10.5),
+    ]
+
+    sql = """SELECT "index" FROM "/events" WHERE site = '1.0'"""
+    assert cursor.execute(sql).fetchall() == [(15.0,)]
@@ -0,0 +1,345 @@
+# pylint: disable=too-few-public-methods
+"""
+Test the Arrow in-memory adapter.
+"""
+
+import datetime
+import decimal
+import sys
+
+import pyarrow as pa
+import pytest
+from pytest_mock import MockerFixture
+
+from shillelagh.adapters.memory.arrow import (
+    ArrowMemory,
+    find_table,
+    get_columns_from_table,
+    get_sort_indices,
+    get_table,
+    get_table_data,
+    register_table,
+    unregister_table,
+)
+from shillelagh.adapters.registry import AdapterLoader
+from shillelagh.backends.apsw.db import connect
+from shillelagh.exceptions import NotSupportedError, ProgrammingError
+from shillelagh.fields import (
+    Blob,
+    Boolean,
+    Date,
+    DateTime,
+    Decimal,
+    Duration,
+    Float,
+    Integer,
+    Order,
+    String,
+    Time,
+)
+from shillelagh.filters import (
+    Equal,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    Like,
+    NotEqual,
+    Range,
+)
+
+outer_table = pa.table({"a": [1]})
+
+
+def test_arrow(registry: AdapterLoader) -> None:
+    """
+    Test basic operations with a table.
+    """
+    registry.add("arrowmemory", ArrowMemory)
+
+    mytable = pa.table(  # noqa: F841  pylint: disable=unused-variable
+        {
+            "index": [10, 11, 12, 13, None],
+            "temperature": [15.2, 13.1, 13.3, 12.1, 11.0],
+            "site": [
+                "Diamond_St",
+                "Blacktail_Loop",
+                "Platinum_St",
+                "Kodiak_Trail",
+                None,
+            ],
+        },
+    )
+
+    connection = connect(":memory:", ["arrowmemory"])
+    cursor = connection.cursor()
+
+    sql = "SELECT * FROM mytable"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [
+        (10, 15.2, "Diamond_St"),
+        (11, 13.1, "Blacktail_Loop"),
+        (12, 13.3, "Platinum_St"),
+        (13, 12.1, "Kodiak_Trail"),
+        (None, 11.0, None),
+    ]
+
+    sql = "SELECT site FROM mytable WHERE temperature > 13 ORDER BY site DESC"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [("Platinum_St",), ("Diamond_St",), ("Blacktail_Loop",)]
+
+    sql = "SELECT site FROM mytable WHERE site LIKE '%_st'"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [("Diamond_St",), ("Platinum_St",)]
+
+    sql = 'SELECT "index" FROM mytable ORDER BY "index" LIMIT 2 OFFSET 1'
+    cursor.execute(sql)
+    assert cursor.fetchall() == [(10,), (11,)]
+
+    sql = "SELECT COUNT(*) FROM mytable WHERE site IS NOT NULL"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [(4,)]
+
+    sql = 'INSERT INTO mytable ("index") VALUES (14)'
+    with pytest.raises(NotSupportedError):
+        cursor.execute(sql)
+
+
+def test_arrow_timestamps(registry: AdapterLoader) -> None:
+    """
+    Test filtering timestamps without a timezone using values with one.
+    """
+    registry.add("arrowmemory", ArrowMemory)
+
+    mytable = pa.table(  # noqa: F841  pylint: disable=unused-variable
+        {
+            "d": [
+                datetime.datetime(2024, 1, 2),
+                datetime.datetime(2024, 1, 3),
+                datetime.datetime(2024, 1, 4),
+            ],
+        },
+    )
+
+    connection = connect(":memory:", ["arrowmemory"])
+    cursor = connection.cursor()
+
+    sql = "SELECT COUNT(*) FROM mytable WHERE d >= '2024-01-03T00:00:00+00:00'"
+    assert cursor.execute(sql).fetchall() == [(2,)]
+
+    sql = "SELECT COUNT(*) FROM mytable WHERE d < '2024-01-03T02:00:00+01:00'"
+    assert cursor.execute(sql).fetchall() == [(2,)]
+
+
+def test_adapter(mocker: MockerFixture) -> None:
+    """
+    Test the adapter methods.
+    """
+    mytable = pa.table({"a": [1, 2, 3], "b": [["x"], ["y"], []]})
+    mocker.patch(
+        "shillelagh.adapters.memory.arrow.find_table",
+        side_effect=[mytable, None, mytable],
+    )
+
+    assert ArrowMemory.supports("mytable")
+    assert not ArrowMemory.supports("mytable")
+    assert ArrowMemory.parse_uri("mytable") == ("mytable",)
+
+    adapter = ArrowMemory("mytable")
+    assert adapter.get_columns() == {
+        "a": Integer(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.ANY,
+            exact=True,
+        ),
+    }
+    assert adapter.get_cost([], []) == 0
+    assert list(adapter.get_data({"a": Range(1, None, False, False)}, [])) == [
+        {"rowid": 1, "a": 2},
+        {"rowid": 2, "a": 3},
+    ]
+
+
+def test_register_table(registry: AdapterLoader) -> None:
+    """
+    Test registering tables instead of finding them in the stack.
+    """
+    registry.add("arrowmemory", ArrowMemory)
+
+    register_table("numbers", pa.record_batch({"a": [1, 2, 3]}))
+    assert ArrowMemory.supports("numbers")
+
+    connection = connect(":memory:", ["arrowmemory"])
+    cursor = connection.cursor()
+
+    sql = "SELECT SUM(a) FROM numbers WHERE a > 1"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [(5,)]
+
+    unregister_table("numbers")
+    assert not ArrowMemory.supports("numbers")
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        register_table("numbers", [1, 2, 3])
+    assert str(excinfo.value) == "Not a table: [1, 2, 3]"
+
+
+def test_adapter_not_found(mocker: MockerFixture) -> None:
+    """
+    Test that an error is raised when the table can't be found.
+    """
+    mocker.patch("shillelagh.adapters.memory.arrow.find_table", return_value=None)
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        ArrowMemory("mytable")
+    assert str(excinfo.value) == "Could not find table"
+
+
+def test_get_columns_from_table() -> None:
+    """
+    Test converting Arrow types to fields.
+    """
+    table = pa.table(
+        {
+            "boolean": pa.array([True], pa.bool_()),
+            "integer": pa.array([1], pa.int32()),
+            "float": pa.array([1.0], pa.float32()),
+            "decimal": pa.array([decimal.Decimal("1.0")], pa.decimal128(5, 2)),
+            "string": pa.array(["a"], pa.string()),
+            "large_string": pa.array(["a"], pa.large_string()),
+            "binary": pa.array([b"a"], pa.binary()),
+            "large_binary": pa.array([b"a"], pa.large_binary()),
+            "timestamp": pa.array([datetime.datetime(2024, 1, 1)], pa.timestamp("us")),
+            "date": pa.array([datetime.date(2024, 1, 1)], pa.date32()),
+            "time": pa.array([datetime.time(12, 0)], pa.time64("us")),
+            "duration": pa.array([datetime.timedelta(1)], pa.duration("s")),
+            "list": pa.array([[1]], pa.list_(pa.int64())),
+        },
+    )
+    columns = get_columns_from_table(table)
+    assert {column_name: type(field) for column_name, field in columns.items()} == {
+        "boolean": Boolean,
+        "integer": Integer,
+        "float": Float,
+        "decimal": Decimal,
+        "string": String,
+        "large_string": String,
+        "binary": Blob,
+        "large_binary": Blob,
+        "timestamp": DateTime,
+        "date": Date,
+        "time": Time,
+        "duration": Duration,
+    }
+    assert Like in columns["string"].filters
+    assert Range not in columns["binary"].filters
+
+
+def test_get_table_data() -> None:
+    """
+    Test filtering, sorting and slicing a table.
+    """
+    table = pa.table(
+        {
+            "a": [3, None, 1, 2, 5],
+            "b": ["x", "y", None, "Xy", "z"],
+        },
+    )
+    columns = get_columns_from_table(table)
+
+    assert list(get_table_data(table, columns, {}, [], chunk_size=2)) == [
+        {"rowid": 0, "a": 3, "b": "x"},
+        {"rowid": 1, "a": None, "b": "y"},
+        {"rowid": 2, "a": 1, "b": None},
+        {"rowid": 3, "a": 2, "b": "Xy"},
+        {"rowid": 4, "a": 5, "b": "z"},
+    ]
+    assert list(
+        get_table_data(
+            table,
+            columns,
+            {"b": Like("x%")},
+            [("b", Order.ASCENDING)],
+            requested_columns={"a"},
+        ),
+    ) == [{"rowid": 3, "a": 2}, {"rowid": 0, "a": 3}]
+    assert list(
+        get_table_data(
+            table,
+            columns,
+            {"a": NotEqual(2)},
+            [("a", Order.DESCENDING)],
+            limit=2,
+            offset=1,
+            requested_columns={"b"},
+            chunk_size=1,
+        ),
+    ) == [{"rowid": 0, "b": "x"}, {"rowid": 2, "b": None}]
+    assert list(
+        get_table_data(
+            table, columns, {}, [], limit=2, offset=2, requested_columns=set()
+        ),
+    ) == [{"rowid": 2}, {"rowid": 3}]
+    assert not list(get_table_data(table, columns, {}, [], offset=10))
+    assert not list(get_table_data(table, columns, {"a": Impossible()}, []))
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        list(get_table_data(table, columns, {"a": [1, 2, 3]}, []))  # type: ignore
+    assert str(excinfo.value) == "Invalid filter: [1, 2, 3]"
+
+
+def test_get_sort_indices() -> None:
+    """
+    Test that nulls are sorted like in SQLite.
+    """
+    table = pa.table({"a": [2, None, 1, 1], "b": ["x", "y", None, "z"]})
+
+    assert get_sort_indices(table, [("a", Order.ASCENDING)]).to_pylist() == [
+        1,
+        2,
+        3,
+        0,
+    ]
+    assert get_sort_indices(
+        table,
+        [("a", Order.DESCENDING), ("b", Order.ASCENDING)],
+    ).to_pylist() == [0, 2, 3, 1]
+
+
+def test_get_table(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test ``get_table`` with different objects.
+    """
+    table = pa.table({"a": [1, 2, 3]})
+    assert get_table(table) is table
+    assert get_table(pa.record_batch({"a": [1, 2, 3]})) == table
+    assert get_table([1, 2, 3]) is None
+
+    class DataFrame:
+        """
+        A fake Polars dataframe.
+        """
+
+        def to_arrow(self) -> pa.Table:
+            """
+            Convert the dataframe to Arrow.
+            """
+            return table
+
+    polars = type(sys)("polars")
+    polars.DataFrame = DataFrame  # type: ignore
+    monkeypatch.setitem(sys.modules, "polars", polars)
+    assert get_table(DataFrame()) is table
+
+
+def test_find_table() -> None:
+    """
+    Test that the table is found in the stack.
+    """
+    mytable = pa.table({"a": []})
+
+    def inner_scope() -> pa.Table:
+        return find_table("mytable")
+
+    assert inner_scope() is mytable
+    assert find_table("outer_table") is outer_table
+    assert find_table("pa") is None
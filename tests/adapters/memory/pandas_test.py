@@ -2,15 +2,35 @@
 Test the Pandas in-memory adapter.
 """
 
+import numpy as np
 import pandas as pd
 import pytest
 from pytest_mock import MockerFixture
 
-from shillelagh.adapters.memory.pandas import PandasMemory, find_dataframe
+from shillelagh.adapters.memory.pandas import (
+    DataFrameIndex,
+    PandasMemory,
+    copy_on_write,
+    find_dataframe,
+    get_df_data,
+    get_like_regex,
+    register_dataframe,
+    registered_dataframes,
+    unregister_dataframe,
+)
 from shillelagh.backends.apsw.db import connect
 from shillelagh.exceptions import ProgrammingError
 from shillelagh.fields import Order
-from shillelagh.filters import Equal, IsNotNull, IsNull, NotEqual, Operator
+from shillelagh.filters import (
+    Equal,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    Like,
+    NotEqual,
+    Operator,
+    Range,
+)
 
 
 def test_pandas() -> None:
@@ -62,6 +82,10 @@ def test_pandas() -> None:
         (12, 13.3, "Platinum_St"),
     ]
 
+    sql = "SELECT site FROM mydf WHERE site LIKE 'd%'"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [("Diamond_St",)]
+
     sql = """INSERT INTO mydf ("index", temperature, site) VALUES (14, 10.1, 'New_Site')"""
     cursor.execute(sql)
     sql = 'SELECT * FROM mydf WHERE "index" > 11'
@@ -165,6 +189,137 @@ def test_adapter(mocker: MockerFixture) -> None:
     assert str(excinfo.value) == "Invalid filter: [1, 2, 3]"
 
 
+def test_adapter_buffered_changes(mocker: MockerFixture) -> None:
+    """
+    Test that changes are buffered and applied to the dataframe in bulk.
+    """
+    mydf = pd.DataFrame(
+        [
+            {"index": 10, "temperature": 15.2, "site": "Diamond_St"},
+            {"index": 11, "temperature": 13.1, "site": "Blacktail_Loop"},
+        ],
+    )
+    mock_find_dataframe = mocker.patch(
+        "shillelagh.adapters.memory.pandas.find_dataframe",
+    )
+    mock_find_dataframe.return_value = mydf
+
+    adapter = PandasMemory("mydf")
+    drop = mocker.spy(pd.DataFrame, "drop")
+    concat = mocker.spy(pd, "concat")
+    for i in range(3):
+        assert (
+            adapter.insert_data(
+                {"rowid": None, "index": 12 + i, "temperature": 10.0, "site": "A"},
+            )
+            == 2 + i
+        )
+    adapter.update_data(
+        0,
+        {"rowid": 0, "index": 10, "temperature": 16.0, "site": "Diamond_St"},
+    )
+    adapter.update_data(
+        1,
+        {"rowid": 1, "index": 11, "temperature": 14.0, "site": "Blacktail_Loop"},
+    )
+    adapter.delete_data(1)
+    assert len(mydf) == 2
+
+    adapter.commit()
+    drop.assert_called_once_with(mydf, [1], inplace=True)
+    concat.assert_called_once()
+    assert adapter.df.to_dict(orient="index") == {
+        0: {"index": 10, "temperature": 16.0, "site": "Diamond_St"},
+        2: {"index": 12, "temperature": 10.0, "site": "A"},
+        3: {"index": 13, "temperature": 10.0, "site": "A"},
+        4: {"index": 14, "temperature": 10.0, "site": "A"},
+    }
+    assert adapter.df["index"].dtype == np.int64
+
+    # inserted rows are added to a new dataframe
+    assert mydf.to_dict(orient="index") == {
+        0: {"index": 10, "temperature": 16.0, "site": "Diamond_St"},
+    }
+
+    # changes to buffered rows flush the buffer first
+    assert adapter.insert_data({"rowid": None, "index": None, "site": "B"}) == 5
+    adapter.update_data(5, {"rowid": 5, "index": None, "temperature": 1.0, "site": "B"})
+    assert adapter.insert_data({"rowid": 9, "index": 16, "site": "C"}) == 9
+    adapter.delete_data(9)
+    assert adapter.insert_data({"rowid": None, "index": 17, "site": "D"}) == 10
+    adapter.close()
+    assert adapter.df.fillna(-1).to_dict(orient="index") == {
+        0: {"index": 10, "temperature": 16.0, "site": "Diamond_St"},
+        2: {"index": 12, "temperature": 10.0, "site": "A"},
+        3: {"index": 13, "temperature": 10.0, "site": "A"},
+        4: {"index": 14, "temperature": 10.0, "site": "A"},
+        5: {"index": -1, "temperature": 1.0, "site": "B"},
+        10: {"index": 17, "temperature": -1, "site": "D"},
+    }
+    assert drop.call_count == 2
+
+
+def test_adapter_empty_insert(mocker: MockerFixture) -> None:
+    """
+    Test inserting rows into an empty dataframe.
+    """
+    mydf = pd.DataFrame({"a": pd.Series([], dtype=np.float64)})
+    mock_find_dataframe = mocker.patch(
+        "shillelagh.adapters.memory.pandas.find_dataframe",
+    )
+    mock_find_dataframe.return_value = mydf
+
+    adapter = PandasMemory("mydf")
+    assert adapter.insert_data({"rowid": None, "a": 1.0}) == 0
+    assert adapter.insert_data({"rowid": None, "a": None}) == 1
+    rows = list(adapter.get_data({}, []))
+    assert rows[0] == {"rowid": 0, "a": 1.0}
+    assert rows[1]["a"] != rows[1]["a"]  # NaN
+    assert adapter.df["a"].dtype == np.float64
+
+    # columns that can't be cast back keep the upcast dtype
+    mydf = pd.DataFrame({"a": [1, 2]})
+    mock_find_dataframe.return_value = mydf
+    adapter = PandasMemory("mydf")
+    adapter.insert_data({"rowid": None, "a": None})
+    adapter.commit()
+    assert adapter.df["a"].fillna(-1).tolist() == [1, 2, -1]
+
+
+def test_insert_multiple_rows() -> None:
+    """
+    Test inserting multiple rows into a registered dataframe in one statement.
+    """
+    mydf = pd.DataFrame(
+        {"a": [1, 2], "b": [1.5, 2.5], "c": ["x", "y"]},
+        index=[10, 20],
+    )
+    register_dataframe("mytable", mydf)
+
+    connection = connect(":memory:")
+    cursor = connection.cursor()
+    cursor.execute(
+        "INSERT INTO mytable (a, b, c) VALUES (3, 3.5, 'z'), (4, NULL, 'w'), (5, 5.5, NULL)",
+    )
+    connection.commit()
+
+    df = registered_dataframes["mytable"]
+    assert df is not mydf
+    assert df.index.tolist() == [10, 20, 21, 22, 23]
+    assert df.dtypes.tolist() == mydf.dtypes.tolist()
+    assert df.fillna(-1).to_dict(orient="list") == {
+        "a": [1, 2, 3, 4, 5],
+        "b": [1.5, 2.5, 3.5, -1, 5.5],
+        "c": ["x", "y", "z", "w", -1],
+    }
+
+    # other connections see the inserted rows
+    assert connect(":memory:").execute("SELECT COUNT(*) FROM mytable").fetchall() == [
+        (5,),
+    ]
+    unregister_dataframe("mytable")
+
+
 def test_adapter_nulls(mocker: MockerFixture) -> None:
     """
     Test operations with nulls on the adapter.
@@ -193,6 +348,288 @@ def test_adapter_nulls(mocker: MockerFixture) -> None:
     assert row["rowid"] == 1
 
 
+def test_get_df_data(mocker: MockerFixture) -> None:
+    """
+    Test filtering, projecting and slicing a dataframe.
+    """
+    mydf = pd.DataFrame(
+        [
+            {"index": 10, "temperature": 15.2, "site": "Diamond_St"},
+            {"index": 11, "temperature": 13.1, "site": "Blacktail_Loop"},
+            {"index": 12, "temperature": 13.3, "site": "Platinum_St"},
+            {"index": 13, "temperature": 12.1, "site": "Kodiak_Trail"},
+            {"index": 14, "temperature": None, "site": None},
+        ],
+    )
+
+    mock_find_dataframe = mocker.patch(
+        "shillelagh.adapters.memory.pandas.find_dataframe",
+    )
+    mock_find_dataframe.return_value = mydf
+
+    adapter = PandasMemory("mydf")
+    columns = adapter.get_columns()
+    assert columns["site"].filters == [
+        Range,
+        Equal,
+        NotEqual,
+        Like,
+        IsNull,
+        IsNotNull,
+    ]
+
+    assert list(
+        adapter.get_data(
+            {"site": Like("%_st"), "temperature": Range(13, 15.2, False, True)},
+            [],
+            requested_columns={"site"},
+        ),
+    ) == [
+        {"rowid": 0, "site": "Diamond_St"},
+        {"rowid": 2, "site": "Platinum_St"},
+    ]
+    assert list(adapter.get_data({"site": Like("diamond")}, [])) == []
+    assert list(
+        adapter.get_data({"site": Like("d%")}, [], requested_columns=set())
+    ) == [{"rowid": 0}]
+    assert list(
+        adapter.get_data({"site": IsNotNull()}, [], 2, 1, {"index"}),
+    ) == [{"rowid": 1, "index": 11}, {"rowid": 2, "index": 12}]
+    assert list(
+        adapter.get_data(
+            {"temperature": Range(None, 14, False, False)},
+            [("temperature", Order.DESCENDING)],
+            1,
+            1,
+            {"index"},
+        ),
+    ) == [{"rowid": 1, "index": 11}]
+    assert list(adapter.get_data({"index": Impossible()}, [])) == []
+
+    # rows are built in chunks
+    assert list(get_df_data(mydf, columns, {}, [], None, 3, {"index"}, 1)) == [
+        {"rowid": 3, "index": 13},
+        {"rowid": 4, "index": 14},
+    ]
+
+
+def test_dataframe_index() -> None:
+    """
+    Test the sort order and hash indexes of dataframe columns.
+    """
+    mydf = pd.DataFrame(
+        {
+            "a": [1, 2, 2, 3, 5],
+            "b": [5.0, 4.0, 3.0, 2.0, 1.0],
+            "c": ["x", "y", "x", "z", "x"],
+            "d": [1.0, None, 2.0, 3.0, 4.0],
+        },
+    )
+    index = DataFrameIndex(mydf, ["c"])
+
+    assert index.get_order("a") == Order.ASCENDING
+    assert index.get_order("b") == Order.DESCENDING
+    assert index.get_order("c") == Order.NONE
+    assert index.get_order("d") == Order.NONE
+
+    assert index.search("a", Equal(2)) == (1, 3)
+    assert index.search("a", Range(2, 5, False, False)) == (3, 4)
+    assert index.search("a", Range(None, 2, False, True)) == (0, 3)
+    assert index.search("b", Range(2.0, None, True, False)) == (0, 4)
+    assert index.search("b", Range(1.5, 4.0, False, False)) == (2, 4)
+    assert index.search("a", Equal("2")) is None
+    assert index.search("a", NotEqual(2)) is None
+    assert index.search("c", Equal("x")) is None
+    assert DataFrameIndex(mydf.iloc[:0]).search("a", Equal(1)) == (0, 0)
+
+    assert index.get_index("a") is None
+    assert index.get_index("c")["x"].tolist() == [0, 2, 4]
+
+    mydf.loc[5] = [0, 0.0, "x", 5.0]
+    index.reset()
+    assert index.get_order("a") == Order.NONE
+    assert index.get_index("c")["x"].tolist() == [0, 2, 4, 5]
+
+
+def test_get_df_data_index(mocker: MockerFixture) -> None:
+    """
+    Test that sorted and indexed columns are used by ``get_df_data``.
+    """
+    mydf = pd.DataFrame(
+        {
+            "a": [1, 2, 2, 3, 5],
+            "b": [5.0, 4.0, 3.0, 2.0, 1.0],
+            "c": ["x", "y", "x", "z", "x"],
+        },
+    )
+    mock_find_dataframe = mocker.patch(
+        "shillelagh.adapters.memory.pandas.find_dataframe",
+    )
+    mock_find_dataframe.return_value = mydf
+
+    adapter = PandasMemory("mydf", indexes=["c"])
+    search = mocker.spy(adapter.index, "search")
+
+    assert list(
+        adapter.get_data(
+            {"a": Range(2, None, True, False), "c": Equal("x")},
+            [],
+            requested_columns={"a"},
+        ),
+    ) == [{"rowid": 2, "a": 2}, {"rowid": 4, "a": 5}]
+    search.assert_called_once()
+    assert list(
+        adapter.get_data(
+            {"c": Equal("x"), "b": Range(None, 3.0, False, False)},
+            [],
+            requested_columns={"a"},
+        ),
+    ) == [{"rowid": 4, "a": 5}]
+    assert (
+        list(
+            adapter.get_data({"c": Equal("w")}, [], requested_columns={"a"}),
+        )
+        == []
+    )
+
+    # sorting on sorted columns
+    sort_values = mocker.spy(pd.DataFrame, "sort_values")
+    assert list(
+        adapter.get_data(
+            {"c": NotEqual("y")},
+            [("b", Order.ASCENDING)],
+            2,
+            None,
+            {"a"},
+        ),
+    ) == [{"rowid": 4, "a": 5}, {"rowid": 3, "a": 3}]
+    assert list(
+        adapter.get_data({}, [("a", Order.ASCENDING)], 2, 1, {"a"}),
+    ) == [{"rowid": 1, "a": 2}, {"rowid": 2, "a": 2}]
+    sort_values.assert_not_called()
+    assert list(
+        adapter.get_data({}, [("c", Order.DESCENDING)], 1, None, {"c"}),
+    ) == [{"rowid": 3, "c": "z"}]
+    sort_values.assert_called_once()
+
+    # the index is reset after changes
+    adapter.insert_data({"rowid": None, "a": 0, "b": 0.0, "c": "x"})
+    assert list(
+        adapter.get_data({"c": Equal("x")}, [("a", Order.ASCENDING)], 1, None, {"a"}),
+    ) == [{"rowid": 5, "a": 0}]
+    adapter.update_data(5, {"rowid": 5, "a": 6, "b": 0.0, "c": "x"})
+    adapter.commit()
+    assert adapter.index.get_order("a") == Order.ASCENDING
+    adapter.delete_data(5)
+    adapter.commit()
+    assert adapter.index.get_order("b") == Order.DESCENDING
+
+    # without the index the column is masked
+    adapter = PandasMemory("mydf")
+    assert list(
+        adapter.get_data({"c": Equal("x")}, [], requested_columns={"a"}),
+    ) == [{"rowid": 0, "a": 1}, {"rowid": 2, "a": 2}, {"rowid": 4, "a": 5}]
+
+
+def test_get_df_data_index_modified(mocker: MockerFixture) -> None:
+    """
+    Test that changes to the dataframe between queries invalidate the index.
+    """
+    mydf = pd.DataFrame(
+        {
+            "a": [1, 2, 3, 4],
+            "b": ["x", "y", "x", "z"],
+            "c": [1.0, 2.0, 3.0, 4.0],
+        },
+    )
+    mocker.patch(
+        "shillelagh.adapters.memory.pandas.find_dataframe",
+        return_value=mydf,
+    )
+    adapter = PandasMemory("mydf", indexes=["b"])
+
+    assert list(
+        adapter.get_data({"a": Range(3, None, True, False)}, [], None, None, {"a"}),
+    ) == [{"rowid": 2, "a": 3}, {"rowid": 3, "a": 4}]
+    assert list(adapter.get_data({"b": Equal("x")}, [], None, None, {"a"})) == [
+        {"rowid": 0, "a": 1},
+        {"rowid": 2, "a": 3},
+    ]
+    assert list(adapter.get_data({}, [("c", Order.ASCENDING)], 1, None, {"c"})) == [
+        {"rowid": 0, "c": 1.0},
+    ]
+
+    mydf["a"] = [4, 3, 2, 1]
+    mydf.loc[1, "b"] = "x"
+    mydf.loc[0, "c"] = 5.0
+
+    assert list(
+        adapter.get_data({"a": Range(3, None, True, False)}, [], None, None, {"a"}),
+    ) == [{"rowid": 0, "a": 4}, {"rowid": 1, "a": 3}]
+    assert list(adapter.get_data({"b": Equal("x")}, [], None, None, {"a"})) == [
+        {"rowid": 0, "a": 4},
+        {"rowid": 1, "a": 3},
+        {"rowid": 2, "a": 2},
+    ]
+    assert list(adapter.get_data({}, [("c", Order.ASCENDING)], 1, None, {"c"})) == [
+        {"rowid": 1, "c": 2.0},
+    ]
+
+    # columns that are removed are discarded from the index
+    del mydf["a"]
+    adapter.index.validate()
+    assert adapter.index.get_order("c") == Order.NONE
+
+
+def test_dataframe_index_without_copy_on_write(mocker: MockerFixture) -> None:
+    """
+    Test that the index is not kept across queries without copy-on-write.
+    """
+    mocker.patch(
+        "shillelagh.adapters.memory.pandas.copy_on_write",
+        return_value=False,
+    )
+    mydf = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "x"]})
+    index = DataFrameIndex(mydf, ["b"])
+
+    assert index.get_order("a") == Order.ASCENDING
+    assert index.get_index("b") is None
+
+    mydf.loc[0, "a"] = 5
+    index.validate()
+    assert index.get_order("a") == Order.NONE
+
+
+def test_copy_on_write(mocker: MockerFixture) -> None:
+    """
+    Test ``copy_on_write``.
+    """
+    mocker.patch.object(pd, "__version__", "3.0.0")
+    assert copy_on_write()
+
+    mocker.patch.object(pd, "__version__", "2.2.0")
+    mocker.patch.object(pd, "options", mocker.MagicMock())
+    pd.options.mode.copy_on_write = True
+    assert copy_on_write()
+    pd.options.mode.copy_on_write = "warn"
+    assert not copy_on_write()
+
+    # Pandas 1 doesn't have the option
+    pd.options.mode = object()
+    assert not copy_on_write()
+
+
+def test_get_like_regex() -> None:
+    """
+    Test converting ``LIKE`` patterns to regular expressions.
+    """
+    regex = get_like_regex("a_c%.")
+    assert regex.fullmatch("ABC.")
+    assert regex.fullmatch("abcdef.")
+    assert not regex.fullmatch("abcdef")
+    assert not regex.fullmatch("ac.")
+
+
 outer_df = pd.DataFrame()
 
 
@@ -215,6 +652,33 @@ def test_find_dataframe() -> None:
     assert str(excinfo.value) == "Could not find dataframe"
 
 
+def test_register_dataframe() -> None:
+    """
+    Test registering dataframes instead of finding them in the stack.
+    """
+    register_dataframe("numbers", pd.DataFrame({"a": [1, 2, 3]}))
+    assert PandasMemory.supports("numbers")
+
+    connection = connect(":memory:", ["pandasmemory"])
+    cursor = connection.cursor()
+
+    sql = "SELECT SUM(a) FROM numbers WHERE a > 1"
+    cursor.execute(sql)
+    assert cursor.fetchall() == [(5,)]
+
+    # registered dataframes take precedence over variables
+    numbers = pd.DataFrame({"a": [4]})  # noqa: F841  pylint: disable=unused-variable
+    assert find_dataframe("numbers")["a"].tolist() == [1, 2, 3]
+
+    unregister_dataframe("numbers")
+    unregister_dataframe("numbers")
+    assert find_dataframe("numbers")["a"].tolist() == [4]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        register_dataframe("numbers", [1, 2, 3])  # type: ignore
+    assert str(excinfo.value) == "Not a dataframe: [1, 2, 3]"
+
+
 def test_get_cost(mocker: MockerFixture) -> None:
     """
     Test cost estimation.
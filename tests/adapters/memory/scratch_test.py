@@ -0,0 +1,490 @@
+# pylint: disable=redefined-outer-name, unused-argument
+"""
+Test the scratch in-memory adapter.
+"""
+
+import datetime
+from collections.abc import Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from shillelagh.adapters.memory import scratch
+from shillelagh.adapters.memory.scratch import (
+    Column,
+    HashIndex,
+    ScratchMemory,
+    ScratchTable,
+    SortedIndex,
+    get_predicate,
+)
+from shillelagh.adapters.registry import AdapterLoader
+from shillelagh.backends.apsw.db import connect
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Boolean, Integer, Order, String
+from shillelagh.filters import (
+    Equal,
+    Filter,
+    Impossible,
+    IsNotNull,
+    IsNull,
+    Like,
+    NotEqual,
+    Operator,
+    Range,
+)
+
+
+@pytest.fixture(autouse=True)
+def tables(mocker: MockerFixture) -> Iterator[dict[str, ScratchTable]]:
+    """
+    Use a new registry of tables in each test.
+    """
+    tables: dict[str, ScratchTable] = {}
+    mocker.patch.object(scratch, "tables", tables)
+    yield tables
+
+
+@pytest.fixture
+def table() -> ScratchTable:
+    """
+    A table with a few rows and indexes.
+    """
+    table = ScratchTable({"id": "int", "site": "str", "temperature": "float"})
+    table.add_index("id", "sorted")
+    table.add_index("site", "hash")
+    for row in [
+        {"id": 3, "site": "Diamond_St", "temperature": 15.2},
+        {"id": 1, "site": "Blacktail_Loop", "temperature": None},
+        {"id": 2, "site": None, "temperature": 13.3},
+        {"id": None, "site": "Diamond_St", "temperature": 12.1},
+    ]:
+        table.insert(row)
+    return table
+
+
+def test_scratch(registry: AdapterLoader) -> None:
+    """
+    Test using a table from different connections.
+    """
+    registry.add("scratchmemory", ScratchMemory)
+
+    connection = connect(":memory:", ["scratchmemory"])
+    cursor = connection.cursor()
+
+    sql = """
+        INSERT INTO "scratch://staging?cols=id:int,site:str,temperature:float&sorted=id&hash=site"
+        (id, site, temperature)
+        VALUES
+            (10, 'Diamond_St', 15.2),
+            (11, 'Blacktail_Loop', 13.1),
+            (12, 'Platinum_St', 13.3),
+            (13, 'Kodiak_Trail', NULL)
+    """
+    cursor.execute(sql)
+
+    sql = """SELECT id FROM "scratch://staging" WHERE site = 'Platinum_St'"""
+    assert cursor.execute(sql).fetchall() == [(12,)]
+
+    sql = """SELECT site FROM "scratch://staging" WHERE site LIKE '%_st'"""
+    assert cursor.execute(sql).fetchall() == [("Diamond_St",), ("Platinum_St",)]
+
+    sql = """UPDATE "scratch://staging" SET temperature = 12.0 WHERE id = 13"""
+    cursor.execute(sql)
+    sql = """DELETE FROM "scratch://staging" WHERE id = 10"""
+    cursor.execute(sql)
+
+    # changes are visible to other connections immediately
+    other = connect(":memory:", ["scratchmemory"]).cursor()
+    sql = """
+        SELECT id, temperature
+        FROM "scratch://staging"
+        WHERE id > 10
+        ORDER BY id DESC
+        LIMIT 2
+    """
+    assert other.execute(sql).fetchall() == [(13, 12.0), (12, 13.3)]
+
+    sql = 'DROP TABLE "scratch://staging"'
+    other.execute(sql)
+    assert not scratch.tables
+
+
+def test_column() -> None:
+    """
+    Test storing values in typed columns.
+    """
+    column = Column("a", "bool")
+    for value in [True, None, False]:
+        column.check(value)
+        column.append(value)
+    assert column.take([0, 1, 2]) == [True, None, False]
+    column.set(1, True)
+    column.set(0, None)
+    assert column.get(0) is None
+    column.compact([1, 2])
+    assert column.take([0, 1]) == [True, False]
+
+    column = Column("b", "float")
+    column.append(1)
+    assert column.take([0]) == [1.0]
+
+    column = Column("c", "str")
+    column.append("x")
+    column.append(None)
+    column.compact([1])
+    assert column.take([0]) == [None]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        Column("c", "str").check(1)
+    assert str(excinfo.value) == "Invalid value for column c: 1"
+    with pytest.raises(ProgrammingError) as excinfo:
+        Column("a", "int").check("1")
+    assert str(excinfo.value) == "Invalid value for column a: '1'"
+    with pytest.raises(ProgrammingError) as excinfo:
+        Column("a", "int").check(2**64)
+    assert str(excinfo.value) == f"Invalid value for column a: {2**64}"
+
+
+def test_hash_index() -> None:
+    """
+    Test ``HashIndex``.
+    """
+    index = HashIndex()
+    for position, value in enumerate(["a", "b", None, "a"]):
+        index.add(value, position)
+
+    assert index.search(Equal("a")) == [0, 3]
+    assert index.search(Equal("c")) == []
+    assert index.search(Equal(["a"])) is None
+    assert index.search(NotEqual("a")) is None
+
+    index.remove("b", 1)
+    index.remove("a", 0)
+    index.remove(None, 2)
+    assert index.positions == {"a": {3}}
+
+
+def test_sorted_index() -> None:
+    """
+    Test ``SortedIndex``.
+    """
+    index = SortedIndex()
+    for position, value in enumerate([3, 1, None, 2, 3]):
+        index.add(value, position)
+
+    assert index.search(Equal(3)) == [0, 4]
+    assert index.search(Range(1, 3, False, False)) == [3]
+    assert index.search(Range(1, 3, True, True)) == [1, 3, 0, 4]
+    assert index.search(Range(2, None, True, False)) == [3, 0, 4]
+    assert index.search(Range(None, 2, False, False)) == [1]
+    assert index.search(Equal("a")) is None
+    assert index.search(IsNull()) is None
+
+    assert index.ordered(descending=False) == [2, 1, 3, 0, 4]
+    assert index.ordered(descending=True) == [4, 0, 3, 1, 2]
+
+    index.remove(3, 0)
+    index.remove(None, 2)
+    assert index.ordered(descending=False) == [1, 3, 4]
+
+
+@pytest.mark.parametrize(
+    "filter_,expected",
+    [
+        (Equal(2), [False, False, True, False]),
+        (NotEqual(2), [False, True, False, True]),
+        (Range(1, 2, False, True), [False, False, True, False]),
+        (Range(None, None, False, False), [False, True, True, True]),
+        (IsNull(), [True, False, False, False]),
+        (IsNotNull(), [False, True, True, True]),
+    ],
+)
+def test_get_predicate(filter_: Filter, expected: list[bool]) -> None:
+    """
+    Test ``get_predicate``.
+    """
+    predicate = get_predicate(filter_)
+    assert [predicate(value) for value in [None, 1, 2, "a"]] == expected
+
+
+def test_get_predicate_like() -> None:
+    """
+    Test ``get_predicate`` with ``LIKE``.
+    """
+    predicate = get_predicate(Like("a%"))
+    assert [predicate(value) for value in [None, "ab", "ba", 1]] == [
+        False,
+        True,
+        False,
+        False,
+    ]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_predicate(Impossible())
+    assert str(excinfo.value) == "Invalid filter: 1 = 0"
+
+
+def test_scratch_table(table: ScratchTable) -> None:
+    """
+    Test inserting, updating and deleting rows.
+    """
+    assert len(table) == 4
+    assert table.types == {"id": "int", "site": "str", "temperature": "float"}
+    assert table.select({}, []) == [0, 1, 2, 3]
+
+    # invalid rows are not inserted
+    with pytest.raises(ProgrammingError) as excinfo:
+        table.insert({"id": 5, "site": "Kodiak_Trail", "temperature": "hot"})
+    assert str(excinfo.value) == "Invalid value for column temperature: 'hot'"
+    with pytest.raises(ProgrammingError) as excinfo:
+        table.insert({"rowid": 0, "id": 5})
+    assert str(excinfo.value) == "Row ID 0 already exists"
+    assert len(table.row_ids) == len(table.columns["id"].values) == 4
+
+    assert table.insert({"rowid": 10, "id": 5}) == 10
+    assert table.insert({"id": 6}) == 11
+
+    table.update(1, {"id": 1, "site": "Kodiak_Trail", "temperature": None})
+    with pytest.raises(ProgrammingError):
+        table.update(1, {"id": "one"})
+    assert table.select({"site": Equal("Kodiak_Trail")}, []) == [1]
+    assert not table.select({"site": Equal("Blacktail_Loop")}, [])
+
+    table.delete(0)
+    assert table.select({"site": Equal("Diamond_St")}, []) == [3]
+    assert table.select({"id": Range(3, None, True, False)}, []) == [10, 11]
+
+    table.compact()
+    assert table.row_ids.tolist() == [1, 2, 3, 10, 11]
+    assert table.positions == {1: 0, 2: 1, 3: 2, 10: 3, 11: 4}
+    assert table.select({"id": Range(3, None, True, False)}, []) == [10, 11]
+    assert table.select({"site": Equal("Diamond_St")}, []) == [3]
+
+
+def test_scratch_table_compaction(table: ScratchTable, mocker: MockerFixture) -> None:
+    """
+    Test that deleted rows are removed when they outnumber live rows.
+    """
+    mocker.patch.object(scratch, "COMPACTION_THRESHOLD", 1)
+
+    table.delete(0)
+    assert table.deleted == 1
+    table.delete(1)
+    assert table.deleted == 2
+    table.delete(2)
+    assert table.deleted == 0
+    assert table.row_ids.tolist() == [3]
+
+
+def test_scratch_table_invalid() -> None:
+    """
+    Test invalid tables and indexes.
+    """
+    with pytest.raises(ProgrammingError) as excinfo:
+        ScratchTable({"a": "complex"})
+    assert str(excinfo.value) == "Invalid type: complex"
+
+    table = ScratchTable({"a": "int"})
+    with pytest.raises(ProgrammingError) as excinfo:
+        table.add_index("b", "sorted")
+    assert str(excinfo.value) == "Invalid column: b"
+    with pytest.raises(ProgrammingError) as excinfo:
+        table.add_index("a", "btree")
+    assert str(excinfo.value) == "Invalid index type: btree"
+
+    table.add_index("a", "hash")
+    index = table.hash_indexes["a"]
+    table.add_index("a", "hash")
+    assert table.hash_indexes["a"] is index
+
+
+def test_scratch_table_select(table: ScratchTable, mocker: MockerFixture) -> None:
+    """
+    Test filtering and sorting rows.
+    """
+    sort = mocker.spy(ScratchTable, "_sort")
+
+    # sorted index
+    assert table.select({}, [("id", Order.ASCENDING)]) == [3, 1, 2, 0]
+    assert table.select({}, [("id", Order.DESCENDING)]) == [0, 2, 1, 3]
+    assert table.select(
+        {"id": Range(1, None, False, False), "temperature": IsNotNull()},
+        [("id", Order.DESCENDING)],
+    ) == [0, 2]
+    assert table.select(
+        {"id": Range(1, None, True, False)},
+        [("id", Order.ASCENDING)],
+    ) == [1, 2, 0]
+    assert table.select({"id": IsNull()}, [("id", Order.ASCENDING)]) == [3]
+    assert not sort.called
+
+    # hash index, then sort
+    assert table.select(
+        {"site": Equal("Diamond_St")},
+        [("temperature", Order.ASCENDING)],
+    ) == [3, 0]
+    assert table.select(
+        {"site": NotEqual("Diamond_St")},
+        [("site", Order.DESCENDING), ("temperature", Order.ASCENDING)],
+    ) == [1]
+    assert table.select(
+        {},
+        [("temperature", Order.DESCENDING), ("site", Order.ASCENDING)],
+    ) == [0, 2, 3, 1]
+    assert table.select({}, [("site", Order.ASCENDING), ("id", Order.DESCENDING)]) == [
+        2,
+        1,
+        0,
+        3,
+    ]
+
+
+def test_scratch_table_get_rows(table: ScratchTable) -> None:
+    """
+    Test reading rows, including rows deleted after the selection.
+    """
+    row_ids = table.select({}, [])
+    table.delete(1)
+
+    assert list(table.get_rows(row_ids, ["site"], chunk_size=2)) == [
+        {"rowid": 0, "site": "Diamond_St"},
+        {"rowid": 2, "site": None},
+        {"rowid": 3, "site": "Diamond_St"},
+    ]
+
+
+def test_adapter(tables: dict[str, ScratchTable]) -> None:
+    """
+    Test the adapter methods.
+    """
+    uri = "scratch://db/staging?cols=id:int,site:str,ok:bool&sorted=id&hash=site,ok"
+    assert ScratchMemory.supports(uri)
+    assert not ScratchMemory.supports("virtual://?cols=id:int")
+    assert ScratchMemory.parse_uri(uri) == (
+        "db/staging",
+        {"id": "int", "site": "str", "ok": "bool"},
+        ["id"],
+        ["site", "ok"],
+    )
+    assert ScratchMemory.parse_uri("scratch://staging") == ("staging", {}, [], [])
+
+    adapter = ScratchMemory(*ScratchMemory.parse_uri(uri))
+    assert tables == {"db/staging": adapter.table}
+    assert adapter.get_columns() == {
+        "id": Integer(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.ANY,
+            exact=True,
+        ),
+        "site": String(
+            filters=[Range, Equal, NotEqual, IsNull, IsNotNull, Like],
+            order=Order.ANY,
+            exact=True,
+        ),
+        "ok": Boolean(
+            filters=[Equal, NotEqual, IsNull, IsNotNull],
+            order=Order.ANY,
+            exact=True,
+        ),
+    }
+
+    assert adapter.insert_data({"rowid": None, "id": 1, "site": "a", "ok": True}) == 0
+    assert adapter.insert_data({"rowid": None, "id": 2, "site": "b", "ok": None}) == 1
+    adapter.update_data(1, {"rowid": 1, "id": 2, "site": "c", "ok": False})
+    adapter.update_data(0, {"rowid": 5, "id": 1, "site": "a", "ok": True})
+    assert list(adapter.get_data({}, [])) == [
+        {"rowid": 1, "id": 2, "site": "c", "ok": False},
+        {"rowid": 5, "id": 1, "site": "a", "ok": True},
+    ]
+    assert list(
+        adapter.get_data(
+            {"ok": Equal(True)},
+            [],
+            requested_columns={"site"},
+        ),
+    ) == [{"rowid": 5, "site": "a"}]
+    assert list(
+        adapter.get_data({}, [("id", Order.ASCENDING)], limit=1, offset=1),
+    ) == [{"rowid": 1, "id": 2, "site": "c", "ok": False}]
+    assert not list(adapter.get_data({"id": Impossible()}, []))
+
+    adapter.delete_data(1)
+    assert adapter.table.deleted == 2
+    adapter.vacuum()
+    assert adapter.table.deleted == 0
+
+    # the table is shared
+    other = ScratchMemory("db/staging", {}, ["site"], [])
+    assert other.table is adapter.table
+    assert "site" in adapter.table.sorted_indexes
+
+    other.drop_table()
+    assert not tables
+
+    # dropping a table that was replaced doesn't remove the new one
+    replacement = ScratchMemory("db/staging", {"a": "int"}, [], [])
+    adapter.drop_table()
+    assert tables == {"db/staging": replacement.table}
+
+
+def test_adapter_invalid() -> None:
+    """
+    Test errors when instantiating the adapter.
+    """
+    with pytest.raises(ProgrammingError) as excinfo:
+        ScratchMemory("staging", {}, [], [])
+    assert str(excinfo.value) == "Table staging does not exist"
+
+    ScratchMemory("staging", {"a": "int"}, [], [])
+    with pytest.raises(ProgrammingError) as excinfo:
+        ScratchMemory("staging", {"a": "str"}, [], [])
+    assert str(excinfo.value) == "Table staging already exists with different columns"
+
+
+def test_get_cost() -> None:
+    """
+    Test that the cost reflects the indexes.
+    """
+    adapter = ScratchMemory("staging", {"a": "int", "b": "str"}, ["a"], ["b"])
+    for i in range(1023):
+        adapter.insert_data({"a": i, "b": str(i)})
+
+    assert adapter.get_cost([], []) == 1023
+    assert adapter.get_cost([("b", Operator.EQ)], []) == 1
+    assert adapter.get_cost([("a", Operator.GT)], []) == 10
+    assert adapter.get_cost([("b", Operator.LIKE)], []) == 1023
+    assert adapter.get_cost([("a", Operator.GT), ("b", Operator.EQ)], []) == 2
+    assert adapter.get_cost([], [("a", Order.DESCENDING)]) == 1023
+    assert adapter.get_cost([("b", Operator.EQ)], [("b", Order.ASCENDING)]) == 10231
+
+    # empty tables
+    assert ScratchMemory("empty", {"a": "int"}, [], []).get_cost([], []) == 1
+
+
+def test_datetime_columns() -> None:
+    """
+    Test columns with dates and times.
+    """
+    adapter = ScratchMemory(
+        "events",
+        {"day": "date", "at": "datetime", "time": "time", "length": "duration"},
+        ["at"],
+        [],
+    )
+    adapter.insert_data(
+        {
+            "day": datetime.date(2024, 1, 1),
+            "at": datetime.datetime(2024, 1, 1, 12, 0),
+            "time": datetime.time(12, 0),
+            "length": datetime.timedelta(hours=1),
+        },
+    )
+
+    assert list(
+        adapter.get_data(
+            {"at": Range(datetime.datetime(2024, 1, 1), None, True, False)},
+            [],
+            requested_columns={"length"},
+        ),
+    ) == [{"rowid": 0, "length": datetime.timedelta(hours=1)}]
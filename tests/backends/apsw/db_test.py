@@ -519,6 +519,31 @@ def test_convert_binding() -> None:
     assert convert_binding({}) == "{}"
 
 
+def test_convert_batches(mocker: MockerFixture) -> None:
+    """
+    Test that rows are converted in batches that start small.
+    """
+    mocker.patch("shillelagh.backends.apsw.db.CONVERT_BATCH_SIZE", 4)
+    connection = connect(":memory:")
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1 AS a")
+
+    consumed = []
+
+    def get_rows() -> Any:
+        for i in range(20):
+            consumed.append(i)
+            yield (i,)
+
+    rows = cursor._convert(get_rows())
+    assert next(rows) == (0,)
+    assert len(consumed) == 1
+    assert next(rows) == (1,)
+    assert len(consumed) == 3
+    assert list(rows) == [(i,) for i in range(2, 20)]
+    assert len(consumed) == 20
+
+
 def test_drop_table(mocker: MockerFixture, registry: AdapterLoader) -> None:
     """
     Test ``drop_table``.
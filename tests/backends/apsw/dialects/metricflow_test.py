@@ -34,21 +34,18 @@ def test_get_sqla_type() -> None:
     assert get_sqla_type(field_timestamp) == sqlalchemy.types.TIMESTAMP
 
     # Create a field with DATE type by mocking
-    field_date = Integer()  # Use as base
-    field_date.type = "DATE"
+    field_date = type("Field", (Integer,), {"type": "DATE"})()  # Use as base
     assert get_sqla_type(field_date) == sqlalchemy.types.DATE
 
     # Create a field with TIME type by mocking
-    field_time = Integer()  # Use as base
-    field_time.type = "TIME"
+    field_time = type("Field", (Integer,), {"type": "TIME"})()  # Use as base
     assert get_sqla_type(field_time) == sqlalchemy.types.TIME
 
     field_text = String()
     assert get_sqla_type(field_text) == sqlalchemy.types.TEXT
 
     # Test unknown type defaults to TEXT
-    field_unknown = Integer()  # Use as base
-    field_unknown.type = "UNKNOWN"
+    field_unknown = type("Field", (Integer,), {"type": "UNKNOWN"})()  # Use as base
     assert get_sqla_type(field_unknown) == sqlalchemy.types.TEXT
 
 
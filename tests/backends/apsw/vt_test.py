@@ -24,7 +24,7 @@ from shillelagh.backends.apsw.vt import (
 )
 from shillelagh.exceptions import ProgrammingError
 from shillelagh.fields import Field, Float, Integer, Order, String
-from shillelagh.filters import Equal, Operator
+from shillelagh.filters import Equal, Like, Operator, Range
 
 from ...fakes import FakeAdapter
 
@@ -59,6 +59,16 @@ class FakeAdapterStaticSort(FakeAdapter):
     pets = Integer()
 
 
+class FakeAdapterLike(FakeAdapter):
+    """
+    An adapter where a column can be filtered with ``LIKE`` or a range.
+    """
+
+    age = Float()
+    name = String(filters=[Like, Range], order=Order.NONE, exact=True)
+    pets = Integer()
+
+
 class FakeAdapterNoColumns(FakeAdapter):
     """
     An adapter without columns.
@@ -227,6 +237,31 @@ def test_virtual_best_index_operator_not_supported() -> None:
     )
 
 
+def test_virtual_best_index_incompatible_operators() -> None:
+    """
+    Test ``BestIndex`` when the operators on a column can't be combined.
+
+    For ``name LIKE 'x%'`` SQLite also passes the range ``name >= 'X' AND name <
+    'y'``, but a column can only have a single filter.
+    """
+    table = VTTable(FakeAdapterLike())
+    result = table.BestIndex(
+        [
+            (1, apsw.SQLITE_INDEX_CONSTRAINT_GE),  # name >=
+            (1, apsw.SQLITE_INDEX_CONSTRAINT_LT),  # name <
+            (1, apsw.SQLITE_INDEX_CONSTRAINT_LIKE),  # name LIKE
+        ],
+        [],
+    )
+    assert result == (
+        [(0, True), (1, True), None],
+        42,
+        json.dumps({"indexes": [[1, 32], [1, 16]], "orderbys_to_process": []}),
+        True,
+        666,
+    )
+
+
 def test_virtual_best_index_order_consumed() -> None:
     """
     Test ``BestIndex`` when the adapter can consume the order.
@@ -257,6 +292,19 @@ def test_virtual_disconnect() -> None:
     table.Disconnect()  # no-op
 
 
+def test_virtual_commit(mocker: MockerFixture) -> None:
+    """
+    Test ``Commit``.
+    """
+    adapter = FakeAdapter()
+    table = VTTable(adapter)
+    table.Commit()  # no-op
+
+    commit = mocker.patch.object(adapter, "commit")
+    table.Commit()
+    commit.assert_called_once()
+
+
 def test_update_insert_row() -> None:
     """
     Test ``UpdateInsertRow``.
@@ -154,6 +154,24 @@ def test_insert(mocker: MockerFixture, registry: AdapterLoader) -> None:
     ]
 
 
+def test_commit(mocker: MockerFixture, registry: AdapterLoader) -> None:
+    """
+    Test the ``commit`` method.
+    """
+    mocker.patch("shillelagh.backends.multicorn.fdw.registry", registry)
+
+    registry.add("dummy", FakeAdapter)
+
+    wrapper = MulticornForeignDataWrapper(
+        {"adapter": "dummy", "args": "qQA="},
+        {},
+    )
+    commit = mocker.patch.object(wrapper.adapter, "commit")
+
+    wrapper.commit()
+    commit.assert_called_once()
+
+
 def test_delete(mocker: MockerFixture, registry: AdapterLoader) -> None:
     """
     Test the ``delete`` method.
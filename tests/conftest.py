@@ -12,6 +12,7 @@ import pytest
 from pytest_mock import MockerFixture
 
 from shillelagh.adapters.registry import AdapterLoader
+from shillelagh.lib import SessionPool
 
 _logger = logging.getLogger(__name__)
 
@@ -44,3 +45,14 @@ def registry(mocker: MockerFixture) -> Iterator[AdapterLoader]:
     mocker.patch("shillelagh.backends.apsw.db.registry", new=custom_registry)
     mocker.patch("shillelagh.backends.sqlglot.db.registry", new=custom_registry)
     yield custom_registry
+
+
+@pytest.fixture(autouse=True)
+def session_pool(mocker: MockerFixture) -> Iterator[SessionPool]:
+    """
+    Use a new HTTP session pool in each test, so that sessions are not shared.
+    """
+    pool = SessionPool()
+    mocker.patch("shillelagh.lib.session_pool", new=pool)
+    yield pool
+    pool.clear()
@@ -8,6 +8,7 @@ import sys
 from typing import Union
 
 import pytest
+from pytest_mock import MockerFixture
 
 from shillelagh.adapters.registry import registry
 from shillelagh.backends.apsw.db import connect
@@ -38,7 +39,7 @@ from shillelagh.fields import (
     Time,
     Unknown,
 )
-from shillelagh.filters import Equal
+from shillelagh.filters import Equal, Range
 from shillelagh.types import BINARY, DATETIME, NUMBER, STRING
 
 from .fakes import FakeAdapter
@@ -63,6 +64,39 @@ def test_comparison() -> None:
     )
 
 
+def test_hash() -> None:
+    """
+    Test hashing fields.
+    """
+    field1 = String(filters=[Equal, Range], order=Order.ASCENDING, exact=True)
+    field2 = String(filters=[Range, Equal], order=Order.ASCENDING, exact=True)
+    field3 = Integer(filters=[Equal, Range], order=Order.ASCENDING, exact=True)
+
+    assert hash(field1) == hash(field2)
+    assert len({field1, field2, field3}) == 2
+    assert not hasattr(field1, "__dict__")
+
+
+def test_shared() -> None:
+    """
+    Test shared instances of fields.
+    """
+    assert Integer.shared() is Integer.shared()
+    assert Integer.shared() == Integer()
+    assert Integer.shared() is not Float.shared()
+    assert String.shared([Equal], Order.ANY, True) is String.shared(
+        [Equal],
+        Order.ANY,
+        True,
+    )
+    assert String.shared([Equal], Order.ANY, True) == String(
+        filters=[Equal],
+        order=Order.ANY,
+        exact=True,
+    )
+    assert String.shared([Equal], Order.ANY, True) is not String.shared()
+
+
 def test_integer() -> None:
     """
     Test ``Integer``.
@@ -575,3 +609,86 @@ def test_unkown() -> None:
     assert Unknown().quote("1") == "'1'"
     assert Unknown().quote(True) == "1"
     assert Unknown().quote(None) == "NULL"
+
+
+def test_parse_many() -> None:
+    """
+    Test ``parse_many`` and ``format_many``.
+    """
+    values = [1, None, 2]
+    assert Integer().parse_many(values) == [1, None, 2]
+    assert Integer().parse_many(values) is not values
+    assert Integer().format_many(iter(values)) == [1, None, 2]
+
+    assert IntBoolean().parse_many([1, 0, None]) == [True, False, None]
+    assert IntBoolean().format_many([True, False, None]) == [1, 0, None]
+
+    assert StringDecimal().parse_many(["1.23", None]) == [
+        decimal.Decimal("1.23"),
+        None,
+    ]
+    assert StringDecimal().format_many([decimal.Decimal("1.23"), None]) == [
+        "1.23",
+        None,
+    ]
+
+
+def test_parse_many_isodatetime(mocker: MockerFixture) -> None:
+    """
+    Test ``parse_many`` in ``ISODateTime`` and ``FastISODateTime``.
+    """
+    values = [
+        "2021-01-01T00:00:00",
+        None,
+        "2021-01-01T03:00:00+03:00",
+        "2021-01-01T00:00:00",
+    ]
+    expected = [
+        datetime.datetime(2021, 1, 1, 0, 0),
+        None,
+        datetime.datetime(2021, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
+        datetime.datetime(2021, 1, 1, 0, 0),
+    ]
+    assert ISODateTime().parse_many(values) == expected
+    assert FastISODateTime().parse_many(values) == expected
+
+    # repeated values are parsed only once
+    datetime_ = mocker.patch("shillelagh.fields.datetime")
+    datetime_.datetime.fromisoformat.return_value = datetime.datetime(2021, 1, 1)
+    ISODateTime().parse_many(["2021-01-01", "2021-01-01", "2021-01-02"])
+    assert datetime_.datetime.fromisoformat.call_count == 2
+
+    # fallback to ``parse`` when ``fromisoformat`` fails
+    datetime_.datetime.fromisoformat.side_effect = ValueError("Invalid")
+    isoparse = mocker.patch("shillelagh.fields.dateutil.parser.isoparse")
+    isoparse.return_value = datetime.datetime(2021, 1, 1)
+    assert ISODateTime().parse_many(["2021-01-01", "2021-01-02", None]) == [
+        datetime.datetime(2021, 1, 1),
+        datetime.datetime(2021, 1, 1),
+        None,
+    ]
+    assert datetime_.datetime.fromisoformat.call_count == 3
+    assert isoparse.call_count == 2
+    with pytest.raises(ProgrammingError) as excinfo:
+        FastISODateTime().parse_many(["invalid"])
+    assert str(excinfo.value) == 'Unable to parse "invalid"'
+
+
+def test_to_array(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test ``to_array``.
+    """
+    array = Integer().to_array([1, 2, 3])
+    assert array.dtype == "int64"
+    assert array.tolist() == [1, 2, 3]
+    assert Float().to_array([1.0, 2.5]).dtype == "float64"
+    assert IntBoolean().to_array([1, 0]).tolist() == [True, False]
+    assert StringBoolean().to_array(["TRUE", "FALSE"]).dtype == "bool"
+
+    # fallback to lists
+    assert Integer().to_array([1, None]) == [1, None]
+    assert Integer().to_array([2**64]) == [2**64]
+    assert String().to_array(["a", "b"]) == ["a", "b"]
+
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    assert Integer().to_array([1, 2, 3]) == [1, 2, 3]
@@ -2,6 +2,8 @@
 Tests for shillelagh.filters.
 """
 
+import pickle
+
 import pytest
 
 from shillelagh.filters import (
@@ -386,3 +388,75 @@ def test_is_not_null() -> None:
     assert IsNotNull.build([]) == IsNotNull()  # type: ignore
     assert IsNotNull().check(None) is False
     assert IsNotNull() != 0
+
+
+def test_hash() -> None:
+    """
+    Test that filters can be used as cache keys.
+    """
+    cache = {
+        Equal(10): "equal",
+        NotEqual(10): "not equal",
+        Like("%test%"): "like",
+        Range(1, 10, True, False): "range",
+        IsNull(): "is null",
+    }
+
+    assert cache[Equal(10)] == "equal"
+    assert cache[NotEqual(10)] == "not equal"
+    assert cache[Like("%test%")] == "like"
+    assert cache[Range(1, 10, True, False)] == "range"
+    assert cache[IsNull()] == "is null"
+    assert Range(1, 10, False, False) not in cache
+    assert IsNotNull() not in cache
+
+    # the hash is computed only once
+    filter_ = Range(1, 10, True, False)
+    assert hash(filter_) == hash(filter_) == hash(Range(1, 10, True, False))
+    assert Equal(10) != NotEqual(10)
+
+    assert hash(Endpoint(0, True, Side.LEFT)) == hash(Endpoint(0, True, Side.RIGHT))
+
+
+def test_immutable() -> None:
+    """
+    Test that the attributes of filters can't be modified after they're created.
+    """
+    filter_ = Range(1, 10, True, False)
+    hash_ = hash(filter_)
+
+    with pytest.raises(AttributeError) as excinfo:
+        filter_.start = 5
+    assert str(excinfo.value) == "Cannot modify attribute 'start' of immutable Range"
+
+    with pytest.raises(AttributeError) as excinfo:
+        del filter_.end
+    assert str(excinfo.value) == "Cannot delete attribute 'end' of immutable Range"
+
+    assert hash(filter_) == hash_
+
+    # the cached hash is not pickled, since it can change across processes
+    copy_ = pickle.loads(pickle.dumps(filter_))
+    assert copy_ == filter_
+    assert not hasattr(copy_, "_hash")
+    assert hash(copy_) == hash_
+
+    like = pickle.loads(pickle.dumps(Like("%test%")))
+    assert like.regex.pattern == Like("%test%").regex.pattern
+
+
+def test_slots() -> None:
+    """
+    Test that filters and endpoints have no ``__dict__``.
+    """
+    for instance in [
+        Endpoint(0, True, Side.LEFT),
+        Equal(10),
+        NotEqual(10),
+        Like("%test%"),
+        Range(1, 10),
+        Impossible(),
+        IsNull(),
+        IsNotNull(),
+    ]:
+        assert not hasattr(instance, "__dict__")
@@ -13,7 +13,7 @@ from pytest_mock import MockerFixture
 from shillelagh.adapters.registry import AdapterLoader
 from shillelagh.backends.apsw.db import connect
 from shillelagh.exceptions import ProgrammingError
-from shillelagh.functions import date_trunc, get_metadata, upgrade
+from shillelagh.functions import date_trunc, get_metadata, upgrade, vacuum
 
 from .fakes import FakeAdapter
 
@@ -73,6 +73,19 @@ def test_get_metadata_from_sql(mocker: MockerFixture, registry: AdapterLoader) -
     assert cursor.fetchall() == [('{"hello": "world"}',)]
 
 
+def test_vacuum(mocker: MockerFixture) -> None:
+    """
+    Test ``vacuum``.
+    """
+    close = mocker.patch.object(FakeAdapter, "close")
+    assert vacuum({}, [FakeAdapter], "dummy://") is None
+    close.assert_called()
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        vacuum({}, [FakeAdapter], "invalid://")
+    assert str(excinfo.value) == "Unsupported table: invalid://"
+
+
 def test_version_from_sql() -> None:
     """
     Test calling ``version`` from SQL.
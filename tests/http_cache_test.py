@@ -0,0 +1,274 @@
+"""
+Tests for shillelagh.http_cache.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import requests
+from pytest_mock import MockerFixture
+from requests_cache.backends import BaseCache, FileCache, SQLiteCache
+from requests_mock.mocker import Mocker
+from urllib3.response import HTTPResponse
+
+from shillelagh.http_cache import (
+    BoundedCache,
+    CacheStats,
+    StatsSession,
+    compressed_serializer,
+    get_backend,
+)
+
+
+def get_response(url: str, content: bytes) -> requests.Response:
+    """
+    Build a response for a given URL.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = content  # pylint: disable=protected-access
+    response.raw = HTTPResponse(request_url=url)
+    response.request = requests.Request("GET", url).prepare()
+    return response
+
+
+def test_cache_stats(mocker: MockerFixture) -> None:
+    """
+    Test ``CacheStats``.
+    """
+    stats = CacheStats()
+    stats.record(mocker.MagicMock(from_cache=False))
+    stats.record(mocker.MagicMock(from_cache=True, is_expired=False))
+    stats.record(mocker.MagicMock(from_cache=True, is_expired=True))
+    stats.record(requests.Response())
+
+    assert stats.as_dict() == {
+        "bytes": 0,
+        "entries": 0,
+        "evictions": 0,
+        "hits": 2,
+        "misses": 2,
+        "stale": 1,
+    }
+
+
+def test_bounded_cache() -> None:
+    """
+    Test that ``BoundedCache`` evicts least recently used responses.
+    """
+    stats = CacheStats()
+    cache = BoundedCache(BaseCache("test"), stats, max_size=10)
+
+    cache.save_response(get_response("http://example.com/a", b"aaaa"), "a")
+    cache.save_response(get_response("http://example.com/b", b"bbbb"), "b")
+    assert cache.get_response("a") is not None
+    assert cache.get_response("c") is None
+    cache.save_response(get_response("http://example.com/c", b"cccc"), "c")
+
+    assert list(cache.index) == ["a", "c"]
+    assert cache.size == 8
+    assert "b" not in cache.responses
+    assert stats.as_dict() == {
+        "bytes": 8,
+        "entries": 2,
+        "evictions": 1,
+        "hits": 0,
+        "misses": 0,
+        "stale": 0,
+    }
+
+    # replacing a response updates its size
+    cache.save_response(get_response("http://example.com/a", b"a"), "a")
+    assert cache.size == 5
+    assert stats.entries == 2
+
+    # the key is computed from the request
+    response = get_response("http://example.com/d", b"")
+    cache.save_response(response)
+    assert cache.create_key(response.request) in cache.index
+
+    cache.clear()
+    assert cache.size == 0
+    assert not cache.index
+    assert stats.bytes == stats.entries == 0
+
+
+def test_bounded_cache_expired() -> None:
+    """
+    Test that expired responses are evicted first.
+    """
+    cache = BoundedCache(BaseCache("test"), CacheStats(), max_size=10, grace=60)
+    now = datetime.now(timezone.utc)
+
+    cache.save_response(get_response("http://example.com/a", b"aaaa"), "a")
+    cache.save_response(
+        get_response("http://example.com/b", b"bbbb"),
+        "b",
+        now - timedelta(seconds=120),
+    )
+    cache.save_response(
+        get_response("http://example.com/c", b"cccc"),
+        "c",
+        now - timedelta(seconds=30),
+    )
+
+    # ``c`` has expired, but it can still be served during the grace period
+    assert list(cache.index) == ["a", "c"]
+
+    # responses already removed from the storage are ignored
+    del cache.responses["a"]
+    cache.save_response(get_response("http://example.com/d", b"dddddd"), "d")
+    assert list(cache.index) == ["c", "d"]
+
+    # expired responses are evicted first, followed by the least recently used ones
+    cache = BoundedCache(BaseCache("test"), CacheStats(), max_size=5)
+    cache.save_response(
+        get_response("http://example.com/b", b"bb"),
+        "b",
+        now - timedelta(seconds=120),
+    )
+    cache.save_response(get_response("http://example.com/a", b"aaaaaa"), "a")
+    assert not cache.index
+
+
+def test_bounded_cache_unbounded() -> None:
+    """
+    Test that responses are never evicted without a maximum size.
+    """
+    backend = BaseCache("test")
+    backend.save_response(get_response("http://example.com/", b"x"), "x")
+
+    # responses stored in memory are not indexed
+    cache = BoundedCache(backend, CacheStats())
+    assert cache.get_response("x") is not None
+    assert not cache.index
+
+    for i in range(10):
+        cache.save_response(get_response("http://example.com/", b"x" * 100), str(i))
+    assert cache.size == 1000
+    assert len(cache.responses) == 11
+
+
+def test_bounded_cache_sqlite(tmp_path: Path) -> None:
+    """
+    Test that responses stored in SQLite are loaded and trimmed.
+    """
+    cache_name = str(tmp_path / "test")
+    backend = SQLiteCache(cache_name)
+    backend.save_response(get_response("http://example.com/a", b"a" * 100), "a")
+    backend.save_response(get_response("http://example.com/b", b"b" * 100), "b")
+    backend.close()
+
+    stats = CacheStats()
+    cache = BoundedCache(SQLiteCache(cache_name), stats)
+    assert list(cache.index) == ["a", "b"]
+    assert stats.entries == 2
+    stored_size = cache.size
+    size, _ = cache.index["a"]
+    cache.close()
+
+    cache = BoundedCache(SQLiteCache(cache_name), CacheStats(), stored_size - 1)
+    assert len(cache.index) == 1
+    assert len(cache.responses) == 1
+
+    # new responses are measured the same way as stored ones
+    cache.save_response(get_response("http://example.com/a", b"a" * 100), "a")
+    assert cache.index["a"][0] == size
+    assert len(cache.index) == 1
+    cache.close()
+
+
+def test_bounded_cache_filesystem(tmp_path: Path) -> None:
+    """
+    Test that responses stored in the filesystem are loaded and trimmed.
+    """
+    cache_name = str(tmp_path / "test")
+    backend = FileCache(cache_name, serializer=compressed_serializer)
+    backend.save_response(get_response("http://example.com/a", b"a" * 1000), "a")
+    time.sleep(0.01)
+    backend.save_response(get_response("http://example.com/b", b"b" * 1000), "b")
+
+    # responses are compressed
+    assert sum(path.stat().st_size for path in backend.responses.paths()) < 2000
+
+    cache = BoundedCache(
+        FileCache(cache_name, serializer=compressed_serializer),
+        CacheStats(),
+        max_size=1,
+    )
+    assert not cache.index
+    assert not list(cache.responses.paths())
+
+    cache.max_size = None
+    cache.save_response(get_response("http://example.com/a", b"a" * 1000), "a")
+    assert cache.size == next(cache.responses.paths()).stat().st_size
+
+
+def test_get_backend(tmp_path: Path) -> None:
+    """
+    Test ``get_backend``.
+    """
+    cache_name = str(tmp_path / "test")
+
+    backend = get_backend(cache_name, "sqlite")
+    assert isinstance(backend, SQLiteCache)
+    backend.close()
+
+    assert type(get_backend(cache_name, "memory")) is BaseCache  # pylint: disable=unidiomatic-typecheck
+
+    backend = get_backend(cache_name, "filesystem")
+    assert isinstance(backend, FileCache)
+    assert backend.responses.serializer.name == "pkl_zlib"
+
+
+def test_stats_session(requests_mock: Mocker) -> None:
+    """
+    Test that ``StatsSession`` records hits and misses.
+    """
+    requests_mock.get("http://example.com/", text="hello")
+
+    stats = CacheStats()
+    session = StatsSession(
+        backend=BoundedCache(BaseCache("test"), stats),
+        expire_after=60,
+        stats=stats,
+    )
+    assert session.get("http://example.com/").text == "hello"
+    assert session.get("http://example.com/").text == "hello"
+    assert stats.as_dict() == {
+        "bytes": 5,
+        "entries": 1,
+        "evictions": 0,
+        "hits": 1,
+        "misses": 1,
+        "stale": 0,
+    }
+
+
+def test_stats_session_stale(requests_mock: Mocker, mocker: MockerFixture) -> None:
+    """
+    Test that stale responses are counted.
+    """
+    requests_mock.get("http://example.com/", text="hello")
+
+    stats = CacheStats()
+    session = StatsSession(
+        backend=BoundedCache(BaseCache("test"), stats, grace=60),
+        expire_after=1,
+        stale_while_revalidate=60,
+        stats=stats,
+    )
+    # revalidate synchronously
+    mocker.patch.object(session, "_resend_async", session._send_and_cache)  # pylint: disable=protected-access
+
+    session.get("http://example.com/")
+    key = next(iter(session.cache.responses))
+    cached = session.cache.responses[key]
+    cached.expires = datetime.now(timezone.utc) - timedelta(seconds=10)
+    session.cache.responses[key] = cached
+
+    assert session.get("http://example.com/").text == "hello"
+    assert stats.hits == stats.stale == 1
+    assert requests_mock.call_count == 2
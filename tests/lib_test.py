@@ -1,13 +1,21 @@
+# pylint: disable=too-many-lines
 """
 Tests for shillelagh.lib.
 """
 
+import random
+import tempfile
 from collections.abc import Iterator
-from datetime import timedelta
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
 
 import pytest
+import requests_cache
 from pytest_mock import MockerFixture
+from requests_cache.backends import BaseCache
+from requests_mock.mocker import Mocker
 
 from shillelagh.exceptions import ImpossibleFilterError, ProgrammingError
 from shillelagh.fields import Boolean, Field, Float, Integer, Order, String
@@ -23,17 +31,26 @@ from shillelagh.filters import (
 )
 from shillelagh.lib import (
     DELETED,
+    ReversedKey,
     RowIDManager,
+    SessionPool,
+    SortedIntegers,
     analyze,
     apply_limit_and_offset,
     build_sql,
     combine_args_kwargs,
+    compile_predicate,
     deserialize,
     escape_identifier,
     escape_string,
+    estimate_row_size,
+    external_sort,
     filter_data,
     find_adapter,
+    find_variable,
+    get_arrow_mask,
     get_session,
+    get_sort_key,
     is_not_null,
     is_null,
     serialize,
@@ -76,11 +93,11 @@ def test_row_id_manager() -> None:
         manager.insert(5)
     assert str(excinfo.value) == "Row ID 5 already present"
 
-    manager.delete(9)
+    assert manager.delete(9) == 8
     assert list(manager) == [0, 1, 2, 3, 4, 5, 6, 7, -1]
     assert manager.ranges == [range(0, 8), DELETED]
 
-    manager.delete(4)
+    assert manager.delete(4) == 4
     assert list(manager) == [0, 1, 2, 3, -1, 5, 6, 7, -1]
     assert manager.ranges == [range(0, 4), DELETED, range(5, 8), DELETED]
 
@@ -88,7 +105,7 @@ def test_row_id_manager() -> None:
         manager.delete(9)
     assert str(excinfo.value) == "Row ID 9 not found"
 
-    manager.delete(5)
+    assert manager.delete(5) == 5
     assert list(manager) == [0, 1, 2, 3, -1, -1, 6, 7, -1]
     assert manager.ranges == [
         range(0, 4),
@@ -98,7 +115,7 @@ def test_row_id_manager() -> None:
         DELETED,
     ]
 
-    manager.delete(7)
+    assert manager.delete(7) == 7
     assert list(manager) == [0, 1, 2, 3, -1, -1, 6, -1, -1]
     assert manager.ranges == [
         range(0, 4),
@@ -110,6 +127,119 @@ def test_row_id_manager() -> None:
     ]
 
 
+def test_row_id_manager_ordered_intervals() -> None:
+    """
+    Test that ``RowIDManager`` reuses the sorted intervals until they change.
+    """
+    manager = RowIDManager([range(0, 5), DELETED, range(10, 12)])
+    intervals = manager._ordered_intervals()  # pylint: disable=protected-access
+    assert intervals == [(range(0, 5), 0), (range(10, 12), 6)]
+    assert list(manager) == [0, 1, 2, 3, 4, -1, 10, 11]
+    assert manager._ordered_intervals() is intervals  # pylint: disable=protected-access
+
+    # a scan in progress is not affected by changes
+    iterator = iter(manager)
+    assert next(iterator) == 0
+    manager.delete(3)
+    manager.insert(20)
+    assert list(iterator) == [1, 2, 3, 4, -1, 10, 11]
+
+    assert manager._ordered_intervals() is not intervals  # pylint: disable=protected-access
+    assert list(manager) == [0, 1, 2, -1, 4, -1, 10, 11, 20]
+
+
+def test_row_id_manager_deleted_ranges() -> None:
+    """
+    Test ``RowIDManager`` with ranges of deleted rows.
+    """
+    manager = RowIDManager([DELETED, range(0, 3), range(3, 3), DELETED])
+    assert list(manager) == [-1, 0, 1, 2, -1]
+    assert manager.ranges == [DELETED, range(0, 3), DELETED]
+    assert manager.get_max_row_id() == 2
+
+    # the last row is deleted, so the new row ID starts a new range
+    assert manager.insert() == 3
+    assert manager.ranges == [DELETED, range(0, 3), DELETED, range(3, 4)]
+
+    assert manager.delete(0) == 1
+    assert manager.delete(3) == 5
+    assert manager.insert(3) == 3
+    assert manager.ranges == [
+        DELETED,
+        DELETED,
+        range(1, 3),
+        DELETED,
+        DELETED,
+        range(3, 4),
+    ]
+
+    for row_id in (1, 2, 3):
+        manager.delete(row_id)
+    assert list(manager) == [-1] * 7
+    assert manager.get_max_row_id() == -1
+    assert manager.insert() == 0
+
+    with pytest.raises(Exception) as excinfo:
+        manager.delete(-1)
+    assert str(excinfo.value) == "Row ID -1 not found"
+
+
+def test_row_id_manager_random(mocker: MockerFixture) -> None:
+    """
+    Test ``RowIDManager`` against a list of row IDs.
+    """
+    mocker.patch("shillelagh.lib.SORTED_LIST_LOAD", 4)
+    rng = random.Random(42)
+
+    manager = RowIDManager([range(0, 100)])
+    row_ids = list(range(100))
+    for _ in range(500):
+        live = [row_id for row_id in row_ids if row_id != -1]
+        if live and rng.random() < 0.7:
+            row_id = rng.choice(live)
+            position = row_ids.index(row_id)
+            assert manager.delete(row_id) == position
+            row_ids[position] = -1
+        else:
+            row_id = rng.choice([None, rng.randrange(200)])
+            if row_id in row_ids:
+                continue
+            row_ids.append(manager.insert(row_id))
+        assert list(manager) == row_ids
+
+    assert manager.get_max_row_id() == max(row_ids)
+
+
+def test_sorted_integers(mocker: MockerFixture) -> None:
+    """
+    Test ``SortedIntegers``.
+    """
+    mocker.patch("shillelagh.lib.SORTED_LIST_LOAD", 2)
+
+    values = SortedIntegers()
+    assert values.floor(1) is None
+    assert values.last() is None
+
+    for value in [5, 1, 9, 3, 7, 2]:
+        values.add(value)
+    assert list(values) == [1, 2, 3, 5, 7, 9]
+    assert values.floor(0) is None
+    assert values.floor(4) == 3
+    assert values.floor(5) == 5
+    assert values.floor(100) == 9
+    assert values.last() == 9
+
+    for value in [1, 2, 9]:
+        values.remove(value)
+    assert list(values) == [3, 5, 7]
+    assert values.floor(4) == 3
+    assert values.last() == 7
+
+    values = SortedIntegers(range(10, 0, -1))
+    assert list(values) == list(range(1, 11))
+    assert values.floor(6) == 6
+
+
 def test_analyze() -> None:
     """
     Test ``analyze``.
@@ -239,9 +369,7 @@ def test_build_sql_with_aliases() -> None:
         alias="t",
     )
     assert sql == (
-        "SELECT * FROM some_table AS t "
-        "WHERE t.a = 'b' AND t.b != 1.0 "
-        "ORDER BY t.a"
+        "SELECT * FROM some_table AS t WHERE t.a = 'b' AND t.b != 1.0 ORDER BY t.a"
     )
 
 
@@ -376,6 +504,17 @@ def test_filter_data() -> None:
         {"index": 11, "site": "Blacktail_Loop", "temperature": 13.1},
     ]
 
+    # ``LIKE`` doesn't match ``NULL``
+    bounds = {"site": Like("%_st")}
+    assert list(
+        filter_data(
+            iter([*data, {"index": 14, "temperature": 0, "site": None}]), bounds, []
+        ),
+    ) == [
+        {"index": 10, "temperature": 15.2, "site": "Diamond_St"},
+        {"index": 12, "temperature": 13.3, "site": "Platinum_St"},
+    ]
+
     bounds = {"temperature": Range(13.1, None, False, False)}
     assert list(filter_data(iter(data), bounds, [])) == [
         {"index": 10, "temperature": 15.2, "site": "Diamond_St"},
@@ -423,6 +562,210 @@ def test_filter_data() -> None:
         list(filter_data(iter(data), {"a": [1, 2, 3]}, []))  # type: ignore
     assert str(excinfo.value) == "Invalid filter: [1, 2, 3]"
 
+    data = [
+        {"index": 10, "site": "Diamond_St"},
+        {"index": 11, "site": "Blacktail_Loop"},
+        {"index": 12, "site": "Platinum_St"},
+    ]
+    bounds = {"site": Like("%_St"), "index": Range(10, None, False, False)}
+    assert list(filter_data(iter(data), bounds, [], requested_columns={"site"})) == [
+        {"site": "Platinum_St"},
+    ]
+
+
+def test_compile_predicate() -> None:
+    """
+    Test ``compile_predicate``.
+    """
+    predicate = compile_predicate({})
+    assert predicate({"a": 1})
+
+    predicate = compile_predicate({"a": Impossible()})
+    assert not predicate({"a": 1})
+
+    predicate = compile_predicate(
+        {
+            "a": Range(1, 10, True, False),
+            "b": NotEqual("x"),
+            "it's": IsNull(),
+        },
+    )
+    assert predicate({"a": 1, "b": "y"})
+    assert predicate({"a": 9, "b": "y", "it's": None})
+    assert not predicate({"a": 10, "b": "y"})
+    assert not predicate({"a": 0, "b": "y"})
+    assert not predicate({"a": 5, "b": "x"})
+    assert not predicate({"a": 5, "b": "y", "it's": 1})
+
+    predicate = compile_predicate({"a": Range(None, 10, False, True)})
+    assert predicate({"a": 10})
+    assert not predicate({"a": 11})
+
+    predicate = compile_predicate({"a": Range()})
+    assert predicate({"a": 11})
+
+    predicate = compile_predicate({"a": Like("f_o%"), "b": IsNotNull()})
+    assert predicate({"a": "FOObar", "b": 1})
+    assert not predicate({"a": "bar", "b": 1})
+    assert not predicate({"a": "foo", "b": None})
+    assert not predicate({"a": None, "b": 1})
+    assert not predicate({"b": 1})
+    assert not predicate({"a": 100, "b": 1})
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        compile_predicate({"a": [1, 2, 3]})  # type: ignore
+    assert str(excinfo.value) == "Invalid filter: [1, 2, 3]"
+
+
+def test_get_arrow_mask() -> None:
+    """
+    Test ``get_arrow_mask``.
+    """
+    pa = pytest.importorskip("pyarrow")
+    batch = pa.RecordBatch.from_pydict({"a": [1, 2, None, 4]})
+
+    assert get_arrow_mask(batch, {}) is None
+    assert get_arrow_mask(batch, {"a": Equal(2)}).to_pylist() == [
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert get_arrow_mask(batch, {"a": NotEqual(2)}).to_pylist() == [
+        True,
+        False,
+        True,
+        True,
+    ]
+    assert get_arrow_mask(
+        batch,
+        {"a": Range(1, 4, False, True)},
+    ).to_pylist() == [False, True, False, True]
+    assert get_arrow_mask(batch, {"a": Range(None, None, False, False)}) is None
+
+    assert get_arrow_mask(
+        pa.RecordBatch.from_pydict({"b": ["Xa", "ax", None]}),
+        {"b": Like("x_")},
+    ).to_pylist() == [True, False, False]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_arrow_mask(batch, {"a": [1, 2, 3]})  # type: ignore
+    assert str(excinfo.value) == "Invalid filter: [1, 2, 3]"
+
+
+def test_get_arrow_mask_timestamps() -> None:
+    """
+    Test ``get_arrow_mask`` with timestamps with and without timezones.
+    """
+    pa = pytest.importorskip("pyarrow")
+    naive = [datetime(2024, 1, 2), datetime(2024, 1, 3), datetime(2024, 1, 4)]
+    batch = pa.RecordBatch.from_pydict(
+        {
+            "naive": naive,
+            "aware": [value.replace(tzinfo=timezone.utc) for value in naive],
+        },
+    )
+
+    # naive timestamps are assumed to be in UTC
+    value = datetime(2024, 1, 3, 1, tzinfo=timezone(timedelta(hours=1)))
+    assert get_arrow_mask(batch, {"naive": Equal(value)}).to_pylist() == [
+        False,
+        True,
+        False,
+    ]
+    assert get_arrow_mask(
+        batch,
+        {"naive": Range(value, None, True, False)},
+    ).to_pylist() == [False, True, True]
+    assert get_arrow_mask(
+        batch,
+        {"aware": Range(None, datetime(2024, 1, 3), False, False)},
+    ).to_pylist() == [True, False, False]
+    assert get_arrow_mask(
+        batch,
+        {"aware": NotEqual(datetime(2024, 1, 3, tzinfo=timezone.utc))},
+    ).to_pylist() == [True, False, True]
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_arrow_mask(batch, {"naive": Equal("2024-01-03")})
+    assert str(excinfo.value).startswith(
+        "Invalid filter on column naive: Function 'equal' has no kernel",
+    )
+
+
+def test_filter_data_spill_to_disk(mocker: MockerFixture) -> None:
+    """
+    Test ``filter_data`` when sorting exceeds the memory budget.
+    """
+    data = [{"index": i % 7, "value": i} for i in range(20)]
+    order: list[tuple[str, RequestedOrder]] = [
+        ("index", Order.ASCENDING),
+        ("value", Order.DESCENDING),
+    ]
+    expected = sorted(data, key=lambda row: (row["index"], -row["value"]))
+
+    temporary_file = mocker.patch(
+        "shillelagh.lib.tempfile.TemporaryFile",
+        wraps=tempfile.TemporaryFile,
+    )
+    assert list(filter_data(iter(data), {}, order)) == expected
+    temporary_file.assert_not_called()
+
+    budget = 5 * estimate_row_size(data[0])
+    assert (
+        list(filter_data(iter(data), {}, order, sort_memory_budget=budget)) == expected
+    )
+    assert temporary_file.call_count == 4
+
+    assert list(
+        filter_data(
+            iter(data),
+            {"index": Equal(3)},
+            order,
+            limit=1,
+            offset=1,
+            sort_memory_budget=budget,
+        ),
+    ) == [{"index": 3, "value": 10}]
+
+
+def test_external_sort() -> None:
+    """
+    Test ``external_sort``.
+    """
+    data = [{"a": i % 3, "b": str(i)} for i in range(10)]
+
+    assert list(external_sort(iter(data), [("a", Order.ASCENDING)], 0)) == sorted(
+        data,
+        key=lambda row: row["a"],
+    )
+    assert list(external_sort(iter(data), [("b", Order.DESCENDING)], 0)) == sorted(
+        data,
+        key=lambda row: row["b"],
+        reverse=True,
+    )
+    assert not list(external_sort(iter([]), [("a", Order.ASCENDING)], 0))
+
+
+def test_get_sort_key() -> None:
+    """
+    Test ``get_sort_key``.
+    """
+    row = {"a": 1, "b": 2}
+    assert get_sort_key([("a", Order.ASCENDING)])(row) == 1
+    assert get_sort_key([("a", Order.ASCENDING), ("b", Order.ASCENDING)])(row) == (
+        1,
+        2,
+    )
+    assert get_sort_key([("a", Order.ASCENDING), ("b", Order.DESCENDING)])(row) == (
+        1,
+        ReversedKey(2),
+    )
+
+    assert ReversedKey(1) != 1
+    assert ReversedKey(2) < ReversedKey(1)
+    assert sorted([1, 3, 2], key=ReversedKey) == [3, 2, 1]
+
 
 def test_find_adapter(mocker: MockerFixture) -> None:
     """
@@ -457,6 +800,25 @@ def test_find_adapter(mocker: MockerFixture) -> None:
     assert excinfo.value.args[0] == "Unsupported table: https://example.com/"
 
 
+def test_find_variable() -> None:
+    """
+    Test ``find_variable``.
+    """
+    needle = 42
+
+    def inner_scope() -> Optional[int]:
+        needle = "not an integer"  # noqa: F841  pylint: disable=unused-variable
+        return find_variable(
+            "needle",
+            lambda value: value if isinstance(value, int) else None,
+        )
+
+    assert inner_scope() == needle
+    assert find_variable("needle", lambda value: None) is None
+    assert find_variable("pytest", lambda value: value) is pytest
+    assert find_variable("haystack", lambda value: value) is None
+
+
 def test_is_null() -> None:
     """
     Test ``is_null``.
@@ -494,26 +856,203 @@ def test_get_session(mocker: MockerFixture) -> None:
     """
     Test ``get_session``.
     """
-    requests_cache = mocker.patch("shillelagh.lib.requests_cache")
+    stats_session = mocker.patch("shillelagh.lib.StatsSession")
+    get_backend = mocker.patch("shillelagh.lib.get_backend")
 
-    get_session({}, "test", timedelta(seconds=10))
-    requests_cache.CachedSession.assert_called_once_with(
-        cache_name="test",
-        backend="sqlite",
+    session = get_session({}, "test", timedelta(seconds=10))
+    stats_session.assert_called_once_with(
+        backend=mocker.ANY,
         expire_after=10,
+        stale_while_revalidate=0,
+        stats=mocker.ANY,
     )
+    get_backend.assert_called_once_with("test", "sqlite")
+
+    # sessions are reused
+    assert get_session({}, "test", timedelta(seconds=10)) is session
+    stats_session.assert_called_once()
 
 
 def test_get_session_namespaced(mocker: MockerFixture) -> None:
     """
     Test ``get_session`` with a namespaced cache key.
     """
-    requests_cache = mocker.patch("shillelagh.lib.requests_cache")
+    stats_session = mocker.patch("shillelagh.lib.StatsSession")
+    get_backend = mocker.patch("shillelagh.lib.get_backend")
     mocker.patch("shillelagh.lib.create_namespaced_cache_key", return_value="ns")
 
     get_session({}, "test", timedelta(seconds=10))
-    requests_cache.CachedSession.assert_called_once_with(
-        cache_name="ns",
-        backend="sqlite",
+    stats_session.assert_called_once_with(
+        backend=mocker.ANY,
         expire_after=10,
+        stale_while_revalidate=0,
+        stats=mocker.ANY,
+    )
+    get_backend.assert_called_once_with("ns", "sqlite")
+
+
+def test_get_session_cache_options(mocker: MockerFixture, tmp_path: Path) -> None:
+    """
+    Test passing cache options to ``get_session``.
+    """
+    stats_session = mocker.patch("shillelagh.lib.StatsSession")
+    cache_name = str(tmp_path / "cache")
+
+    get_session(
+        {},
+        cache_name,
+        timedelta(seconds=-1),
+        backend="memory",
+        max_size=1000,
+        stale_while_revalidate=None,
+    )
+    stats_session.assert_called_once_with(
+        backend=mocker.ANY,
+        expire_after=requests_cache.DO_NOT_CACHE,
+        stale_while_revalidate=0,
+        stats=mocker.ANY,
     )
+    backend = stats_session.call_args.kwargs["backend"]
+    assert backend.max_size == 1000
+    assert type(backend.backend) is BaseCache  # pylint: disable=unidiomatic-typecheck
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_session({}, cache_name, backend="redis")
+    assert str(excinfo.value) == (
+        "Invalid cache backend: redis. Valid backends are: filesystem, memory, sqlite"
+    )
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_session({}, cache_name, max_size=-1)
+    assert str(excinfo.value) == "The maximum cache size must be positive"
+
+    with pytest.raises(ProgrammingError) as excinfo:
+        get_session({}, cache_name, size=10)
+    assert str(excinfo.value) == "Invalid cache options: size"
+
+
+def test_session_pool(tmp_path: Path) -> None:
+    """
+    Test that sessions and their connection pools are shared.
+    """
+    pool = SessionPool(pool_connections=2, pool_maxsize=4)
+    cache_name = str(tmp_path / "cache")
+
+    session = pool.get({"a": "1", "b": "2"}, cache_name, timedelta(seconds=10))
+    assert pool.get({"b": "2", "a": "1"}, cache_name, timedelta(seconds=10)) is session
+    assert session.headers["a"] == "1"
+    assert "Connection" not in session.headers
+
+    other = pool.get({}, cache_name, timedelta(seconds=-1))
+    assert other is not session
+    assert other.get_adapter("https://example.org/") is pool.adapter
+    assert session.get_adapter("http://example.org/") is pool.adapter
+    assert pool.adapter._pool_maxsize == 4  # pylint: disable=protected-access
+
+    pool.configure(pool_maxsize=1, keep_alive=False)
+    assert session.get_adapter("https://example.org/") is pool.adapter
+    assert pool.adapter._pool_maxsize == 1  # pylint: disable=protected-access
+    assert session.headers["Connection"] == "close"
+
+    pool.configure()
+    assert "Connection" not in session.headers
+
+    pool.configure_cache(backend="memory", stale_while_revalidate=60)
+    session = pool.get({}, cache_name, timedelta(seconds=10))
+    assert type(session.cache.backend) is BaseCache  # pylint: disable=unidiomatic-typecheck
+    assert session.settings.stale_while_revalidate == 60
+    assert pool.get({}, cache_name, timedelta(seconds=60)).cache is session.cache
+    assert pool.get_stats() == {
+        cache_name: {
+            "bytes": 0,
+            "entries": 0,
+            "evictions": 0,
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+        },
+    }
+
+    pool.clear()
+    assert pool.get({}, cache_name, timedelta(seconds=-1)) is not other
+    pool.clear()
+
+
+def test_session_pool_shared_cache(tmp_path: Path, requests_mock: Mocker) -> None:
+    """
+    Test that sessions with different cache options share the same cache.
+    """
+    requests_mock.get("http://example.com/a", text="a" * 100)
+    requests_mock.get("http://example.com/b", text="b" * 100)
+    pool = SessionPool()
+    cache_name = str(tmp_path / "cache")
+
+    session = pool.get({}, cache_name, timedelta(seconds=10))
+    other = pool.get(
+        {},
+        cache_name,
+        timedelta(seconds=10),
+        max_size=1_000_000,
+        stale_while_revalidate=60,
+    )
+    assert other is not session
+    assert other.cache is session.cache
+    assert session.cache.max_size == 1_000_000
+    assert session.cache.grace == 60
+
+    session.get("http://example.com/a")
+    other.get("http://example.com/b")
+    stats = pool.get_stats()[cache_name]
+    assert stats["entries"] == 2
+    assert stats["bytes"] == session.cache.size
+
+    # the smallest size applies
+    pool.get({}, cache_name, timedelta(seconds=10), max_size=stats["bytes"] - 1)
+    assert pool.get_stats()[cache_name]["entries"] == 1
+    pool.clear()
+
+
+def test_session_pool_max_sessions(tmp_path: Path) -> None:
+    """
+    Test that the least recently used sessions are discarded.
+    """
+    pool = SessionPool(max_sessions=2)
+    cache_name = str(tmp_path / "cache")
+
+    first = pool.get({"Authorization": "Bearer 1"}, cache_name, timedelta(seconds=10))
+    second = pool.get({"Authorization": "Bearer 2"}, cache_name, timedelta(seconds=10))
+    assert (
+        pool.get({"Authorization": "Bearer 1"}, cache_name, timedelta(seconds=10))
+        is first
+    )
+    pool.get({"Authorization": "Bearer 3"}, cache_name, timedelta(seconds=10))
+    assert len(pool.sessions) == 2
+    assert second not in pool.sessions.values()
+    assert first in pool.sessions.values()
+
+    # evicted sessions are not closed, since their cache and adapter are shared
+    assert second.get_adapter("https://example.org/") is pool.adapter
+    assert len(pool.caches) == 1
+
+    pool.configure(max_sessions=1)
+    assert len(pool.sessions) == 1
+    pool.clear()
+
+
+def test_session_pool_threads(tmp_path: Path) -> None:
+    """
+    Test that concurrent requests for a session return the same one.
+    """
+    pool = SessionPool()
+    cache_name = str(tmp_path / "cache")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sessions = list(
+            executor.map(
+                lambda _: pool.get({}, cache_name, timedelta(seconds=10)),
+                range(32),
+            ),
+        )
+
+    assert len({id(session) for session in sessions}) == 1
+    pool.clear()